@@ -0,0 +1,163 @@
+# backend/app/admission.py
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional
+
+from fastapi import HTTPException, Request
+
+
+class AdmissionController:
+    """Per-route concurrency limit with a bounded, deadline-aware wait queue.
+
+    - Up to `max_concurrent` requests run at once.
+    - Up to `max_queue` more wait (on the event loop, not in the threadpool)
+      for at most `max_wait` seconds, or less if the client sent a shorter
+      `X-Request-Timeout` (seconds).
+    - A request is shed immediately when the queue is full, or when the
+      expected wait (queue position x average service time / concurrency)
+      already exceeds its deadline. Rejections are `reject_status` (503)
+      with a Retry-After header derived from the observed service time.
+
+    All state is touched from the event loop thread only, so no locks.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_concurrent: int = 8,
+        max_queue: int = 16,
+        max_wait: float = 5.0,
+        reject_status: int = 503,
+    ):
+        self.name = name
+        self.max_concurrent = max(0, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = float(max_wait)
+        self.reject_status = int(reject_status)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._avg_service = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for f in self._waiters if not f.done())
+
+    def _retry_after(self) -> str:
+        per_slot = self._avg_service / max(1, self.max_concurrent)
+        return str(max(1, math.ceil(per_slot * (self.queued + 1))))
+
+    def _reject(self, detail: str) -> HTTPException:
+        return HTTPException(status_code=self.reject_status, detail=detail, headers={"Retry-After": self._retry_after()})
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        wait_budget = self.max_wait if timeout is None else min(self.max_wait, float(timeout))
+        if self.active < self.max_concurrent and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise self._reject(f"{self.name}: server busy, queue full")
+        expected_wait = self._avg_service * (self.queued + 1) / max(1, self.max_concurrent)
+        if self.max_concurrent == 0 or expected_wait > wait_budget:
+            self.rejected += 1
+            raise self._reject(f"{self.name}: server busy, expected wait exceeds deadline")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=wait_budget)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise self._reject(f"{self.name}: timed out waiting for capacity")
+        except BaseException:
+            # cancelled (e.g. client went away) after a slot was handed over: pass it on
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(fut)
+            except ValueError:
+                pass
+        # slot was handed over by release(); `active` already accounts for it
+        self.admitted += 1
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        if service_seconds is not None:
+            self._avg_service = service_seconds if not self._avg_service else 0.8 * self._avg_service + 0.2 * service_seconds
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active = max(0, self.active - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_ms": round(self._avg_service * 1000.0, 2),
+        }
+
+
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_controller(name: str) -> AdmissionController:
+    """Return the controller for `name`, configured from <NAME>_MAX_CONCURRENCY /
+    <NAME>_MAX_QUEUE / <NAME>_MAX_WAIT environment variables on first use."""
+    ctrl = _controllers.get(name)
+    if ctrl is None:
+        prefix = name.upper()
+        ctrl = _controllers[name] = AdmissionController(
+            name,
+            max_concurrent=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.environ.get(f"{prefix}_MAX_QUEUE", "16")),
+            max_wait=float(os.environ.get(f"{prefix}_MAX_WAIT", "5.0")),
+        )
+    return ctrl
+
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: ctrl.stats() for name, ctrl in sorted(_controllers.items())}
+
+
+def limit_concurrency(name: str) -> Callable[[Request], AsyncIterator[None]]:
+    """FastAPI dependency enforcing the `name` controller around a route.
+
+    Example:
+        @app.post("/rag/answer", dependencies=[Depends(limit_concurrency("rag"))])
+    """
+
+    async def _dependency(request: Request) -> AsyncIterator[None]:
+        ctrl = get_controller(name)
+        timeout: Optional[float] = None
+        raw = request.headers.get("x-request-timeout")
+        if raw:
+            try:
+                timeout = float(raw)
+            except ValueError:
+                timeout = None
+        await ctrl.acquire(timeout)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ctrl.release(time.perf_counter() - start)
+
+    return _dependency
@@ -1,11 +1,20 @@
+import base64
+import hashlib
+import json
+import math
 import os
 import logging
-from typing import Dict, Optional, List, Callable
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, List, Callable, Tuple
 
 from fastapi import Depends, HTTPException, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
 
+from .lazy import require
+
 logger = logging.getLogger("auth")
 
 security = HTTPBearer(auto_error=False)
@@ -71,23 +80,254 @@ class MockCognitoClient(CognitoClientInterface):
         raise HTTPException(status_code=401, detail="Invalid token (mock)")
 
 
-class RealCognitoClient(CognitoClientInterface):
-    """Skeleton for a real Cognito client.
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+_CRYPTO_HINT = "pip install cryptography; needed to verify Cognito tokens"
+
+
+def _rsa_public_key(n: int, e: int) -> Any:
+    """RSA public key for the JWK modulus/exponent (needs the optional `cryptography` package)."""
+    require("cryptography", _CRYPTO_HINT)
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    return rsa.RSAPublicNumbers(e, n).public_key()
+
+
+def _rs256_verify(signing_input: bytes, signature: bytes, key: Any) -> bool:
+    """Verify an RSASSA-PKCS1-v1_5 / SHA-256 signature with an RSA public key."""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
 
-    This is intentionally a minimal placeholder: a full implementation would
-    fetch JWKS, verify JWT signature/claims and map Cognito groups -> roles.
-    For now it raises NotImplementedError unless you wire it to a production
-    library.
+    try:
+        key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+    except InvalidSignature:
+        return False
+    return True
+
+
+class JWKSCache:
+    """Cache of RSA public keys (kid -> key) loaded from a JWKS document.
+
+    - Keys are served from memory; once older than `refresh_interval` a
+      background thread refreshes them while stale keys keep being served.
+    - An unknown `kid` (key rotation) triggers a synchronous refresh, at most
+      once per `min_refresh_interval` so bogus kids cannot hammer the IdP.
+    - Concurrent callers share one synchronous refresh. After a failed fetch
+      no refresh is attempted for an exponentially growing backoff
+      (`initial_backoff` doubling up to `max_backoff`); meanwhile an empty
+      cache raises and an unknown kid is simply not found.
     """
 
-    def __init__(self, user_pool_id: Optional[str] = None, region: Optional[str] = None):
-        # In a complete implementation you would load keys/jwks and cache them.
+    def __init__(
+        self,
+        fetch: Callable[[], Dict[str, Any]],
+        *,
+        refresh_interval: float = 3600.0,
+        min_refresh_interval: float = 30.0,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+    ):
+        self._fetch = fetch
+        self.refresh_interval = float(refresh_interval)
+        self.min_refresh_interval = float(min_refresh_interval)
+        self.initial_backoff = float(initial_backoff)
+        self.max_backoff = float(max_backoff)
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self) -> None:
+        try:
+            doc = self._fetch()
+            keys: Dict[str, Any] = {}
+            for jwk in doc.get("keys", []):
+                if jwk.get("kty") != "RSA" or not jwk.get("kid"):
+                    continue
+                n = int.from_bytes(_b64url_decode(jwk["n"]), "big")
+                e = int.from_bytes(_b64url_decode(jwk["e"]), "big")
+                keys[jwk["kid"]] = _rsa_public_key(n, e)
+        except Exception:
+            with self._lock:
+                self._failures += 1
+                delay = min(self.max_backoff, self.initial_backoff * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + delay
+            raise
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+            self._failures = 0
+            self._retry_at = 0.0
+        logger.info("JWKS refreshed: %d keys", len(keys))
+
+    def _backing_off(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing or self._backing_off():
+                return
+            self._refreshing = True
+
+        def _run() -> None:
+            try:
+                self.refresh()
+            except Exception:
+                logger.warning("Background JWKS refresh failed", exc_info=True)
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_run, name="jwks-refresh", daemon=True).start()
+
+    def _refresh_now(self, seen: float) -> None:
+        """Refresh on the caller's thread unless another caller already did since `seen`."""
+        with self._refresh_lock:
+            if self._fetched_at != seen:
+                return
+            if self._backing_off():
+                raise RuntimeError(f"JWKS unavailable; retrying in {self._retry_at - time.monotonic():.0f}s")
+            self.refresh()
+
+    def get(self, kid: str) -> Optional[Any]:
+        seen = self._fetched_at
+        if not self._keys:
+            self._refresh_now(seen)
+        elif time.monotonic() - seen > self.refresh_interval:
+            self._refresh_in_background()
+        key = self._keys.get(kid)
+        if key is None and not self._backing_off():
+            seen = self._fetched_at
+            if time.monotonic() - seen > self.min_refresh_interval:
+                self._refresh_now(seen)
+                key = self._keys.get(kid)
+        return key
+
+
+class RealCognitoClient(CognitoClientInterface):
+    """Cognito client that verifies RS256 JWTs locally against the pool's JWKS.
+
+    Signature checks use the cached JWKS (see JWKSCache), so the IdP is only
+    contacted on refresh or key rotation. RSA verification is done by the
+    `cryptography` package, imported when this client is created. Successfully verified tokens are
+    kept in a short-TTL LRU keyed by the token hash, so repeat requests with
+    the same bearer token skip the RSA verification entirely.
+    Cognito groups map to roles: membership in "professor" (or "admin")
+    yields role professor, otherwise student.
+    """
+
+    def __init__(
+        self,
+        user_pool_id: Optional[str] = None,
+        region: Optional[str] = None,
+        *,
+        client_id: Optional[str] = None,
+        jwks_fetcher: Optional[Callable[[], Dict[str, Any]]] = None,
+        token_cache_ttl: float = 60.0,
+        token_cache_size: int = 4096,
+    ):
+        require("cryptography", _CRYPTO_HINT)
         self.user_pool_id = user_pool_id
         self.region = region
+        self.client_id = client_id
+        self.issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+        self.jwks = JWKSCache(jwks_fetcher or self._fetch_jwks)
+        self.token_cache_ttl = float(token_cache_ttl)
+        self.token_cache_size = int(token_cache_size)
+        self._verified: "OrderedDict[str, Tuple[float, Dict[str, str]]]" = OrderedDict()
+        self._verified_lock = threading.Lock()
         logger.info("RealCognitoClient initialized user_pool=%s region=%s", user_pool_id, region)
 
+    def _fetch_jwks(self) -> Dict[str, Any]:
+        import urllib.request
+
+        with urllib.request.urlopen(f"{self.issuer}/.well-known/jwks.json", timeout=5) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def _cached(self, cache_key: str) -> Optional[Dict[str, str]]:
+        with self._verified_lock:
+            hit = self._verified.get(cache_key)
+            if hit is None:
+                return None
+            expires_at, info = hit
+            if expires_at <= time.time():
+                del self._verified[cache_key]
+                return None
+            self._verified.move_to_end(cache_key)
+            return info
+
+    def _remember(self, cache_key: str, info: Dict[str, str], exp: float) -> None:
+        with self._verified_lock:
+            self._verified[cache_key] = (min(time.time() + self.token_cache_ttl, exp), info)
+            self._verified.move_to_end(cache_key)
+            while len(self._verified) > self.token_cache_size:
+                self._verified.popitem(last=False)
+
     def verify_token(self, token: str) -> Dict[str, str]:
-        raise HTTPException(status_code=501, detail="Real Cognito verification is not configured in this scaffold")
+        if not token:
+            raise HTTPException(status_code=401, detail="Missing auth token")
+        cache_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        info = self._cached(cache_key)
+        if info is not None:
+            return info
+
+        try:
+            header_b64, payload_b64, sig_b64 = token.split(".")
+            header = json.loads(_b64url_decode(header_b64))
+            claims = json.loads(_b64url_decode(payload_b64))
+            signature = _b64url_decode(sig_b64)
+            if not isinstance(header, dict) or not isinstance(claims, dict):
+                raise ValueError("JWT header and payload must be JSON objects")
+        except Exception:
+            raise HTTPException(status_code=401, detail="Malformed token")
+
+        if header.get("alg") != "RS256":
+            raise HTTPException(status_code=401, detail="Unsupported token algorithm")
+        try:
+            key = self.jwks.get(str(header.get("kid", "")))
+        except Exception:
+            logger.warning("Unable to load JWKS", exc_info=True)
+            raise HTTPException(status_code=503, detail="Signing keys unavailable")
+        if key is None:
+            raise HTTPException(status_code=401, detail="Unknown signing key")
+        if not _rs256_verify(f"{header_b64}.{payload_b64}".encode("ascii"), signature, key):
+            raise HTTPException(status_code=401, detail="Invalid token signature")
+
+        exp, nbf = claims.get("exp"), claims.get("nbf", 0)
+        if not all(isinstance(t, (int, float)) and not isinstance(t, bool) and math.isfinite(t) for t in (exp, nbf)):
+            raise HTTPException(status_code=401, detail="Invalid token time claims")
+        now = time.time()
+        if exp <= now:
+            raise HTTPException(status_code=401, detail="Token expired")
+        if nbf > now:
+            raise HTTPException(status_code=401, detail="Token not yet valid")
+        if claims.get("iss") != self.issuer:
+            raise HTTPException(status_code=401, detail="Invalid token issuer")
+        token_use = claims.get("token_use")
+        if token_use not in ("id", "access"):
+            raise HTTPException(status_code=401, detail="Invalid token_use")
+        if self.client_id:
+            audience = claims.get("aud") if token_use == "id" else claims.get("client_id")
+            if audience != self.client_id:
+                raise HTTPException(status_code=401, detail="Invalid token audience")
+
+        groups = claims.get("cognito:groups")
+        if not isinstance(groups, list):
+            groups = []
+        role = "professor" if ("professor" in groups or "admin" in groups) else "student"
+        info = {
+            "sub": claims.get("sub", ""),
+            "username": claims.get("cognito:username") or claims.get("username") or "",
+            "email": claims.get("email"),
+            "role": role,
+        }
+        self._remember(cache_key, info, exp)
+        return info
 
 
 # Factory for selecting client based on environment
@@ -105,7 +345,11 @@ def get_cognito_client() -> CognitoClientInterface:
     region = os.environ.get("AWS_REGION")
     if user_pool:
         logger.info("Cognito user pool configured; using RealCognitoClient")
-        _cognito_client = RealCognitoClient(user_pool_id=user_pool, region=region)
+        _cognito_client = RealCognitoClient(
+            user_pool_id=user_pool,
+            region=region,
+            client_id=os.environ.get("COGNITO_APP_CLIENT_ID"),
+        )
     else:
         logger.info("No Cognito configuration found; using MockCognitoClient for local dev")
         _cognito_client = MockCognitoClient()
@@ -2,13 +2,30 @@
 from __future__ import annotations
 
 import os
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+
+from .lazy import require
+from .serialization import Representation, representation
+
+
+@lru_cache(maxsize=None)
+def _dynamodb_client(endpoint_url: Optional[str]) -> Any:
+    """Shared DynamoDB client per endpoint (boto3 is imported on first use only)."""
+    boto3 = require("boto3", "needed when USE_IN_MEMORY_DB=0")
+    return boto3.client("dynamodb", endpoint_url=endpoint_url) if endpoint_url else boto3.client("dynamodb")
+
 
 class CourseSyllabusStore:
     """
     In CI we default to in-memory.
+
+    Next to each stored course/syllabus we keep its serialized
+    Representation (body + ETag), computed once at write time, so read
+    endpoints can answer 304s and 200s without re-serializing.
     """
     _mem: Dict[str, Dict[str, Any]] = {}
+    _reprs: Dict[str, Representation] = {}
 
     def __init__(self, table_name: str = "courses"):
         self.table_name = table_name
@@ -16,9 +33,8 @@ class CourseSyllabusStore:
         self.client = None
         if not self.use_memory:
             try:
-                import boto3  # type: ignore
                 endpoint_url = os.environ.get("AWS_ENDPOINT_URL") or os.environ.get("AWS_ENDPOINT_URL_S3")
-                self.client = boto3.client("dynamodb", endpoint_url=endpoint_url) if endpoint_url else boto3.client("dynamodb")
+                self.client = _dynamodb_client(endpoint_url)
             except Exception:
                 self.use_memory = True
 
@@ -30,7 +46,7 @@ class CourseSyllabusStore:
 
     def create_course(self, course_id: str, payload: Dict[str, Any]) -> bool:
         if self.use_memory or not self.client:
-            self._mem[self._course_key(course_id)] = dict(payload)
+            self._store(self._course_key(course_id), payload)
             return True
         # (real Dynamo path omitted in tests)
         return True
@@ -43,11 +59,65 @@ class CourseSyllabusStore:
     # --- Syllabus helpers expected by tests ---
     def create_syllabus(self, course_id: str, payload: Dict[str, Any]) -> bool:
         if self.use_memory or not self.client:
-            self._mem[self._syllabus_key(course_id)] = dict(payload)
+            self._store(self._syllabus_key(course_id), payload)
             return True
         return True
 
     def get_syllabus(self, course_id: str) -> Optional[Dict[str, Any]]:
         if self.use_memory or not self.client:
             return self._mem.get(self._syllabus_key(course_id))
-        return None
\ No newline at end of file
+        return None
+
+    # --- Cached representations (ETags) ---
+    def _store(self, key: str, payload: Dict[str, Any]) -> None:
+        self._mem[key] = dict(payload)
+        self._reprs[key] = representation(self._mem[key])
+
+    def _representation(self, key: str) -> Optional[Representation]:
+        obj = self._mem.get(key)
+        if obj is None:
+            return None
+        rep = self._reprs.get(key)
+        if rep is None:
+            rep = self._reprs[key] = representation(obj)
+        return rep
+
+    def course_representation(self, course_id: str) -> Optional[Representation]:
+        if self.use_memory or not self.client:
+            return self._representation(self._course_key(course_id))
+        return None
+
+    def syllabus_representation(self, course_id: str) -> Optional[Representation]:
+        if self.use_memory or not self.client:
+            return self._representation(self._syllabus_key(course_id))
+        return None
+
+    def derived_representation(
+        self,
+        course_id: str,
+        name: str,
+        build: Callable[[Dict[str, Any]], Any],
+    ) -> Optional[Representation]:
+        """Representation of build(syllabus), rebuilt only when the syllabus changed."""
+        syllabus = self.syllabus_representation(course_id)
+        if syllabus is None:
+            return None
+        key = f"{course_id}#{name}"
+        cached = self._reprs.get(key)
+        if cached is None or cached.source != syllabus.etag:
+            cached = self._reprs[key] = representation(
+                build(self._mem[self._syllabus_key(course_id)]), source=syllabus.etag
+            )
+        return cached
+
+
+# Factory
+
+_course_store: Optional[CourseSyllabusStore] = None
+
+
+def get_course_store() -> CourseSyllabusStore:
+    global _course_store
+    if _course_store is None:
+        _course_store = CourseSyllabusStore()
+    return _course_store
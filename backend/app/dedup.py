@@ -0,0 +1,229 @@
+# backend/app/dedup.py
+"""Near-duplicate chunk detection for ingestion (MinHash + LSH).
+
+Course packs repeat the same slides across PDFs. dedup_chunks() runs after
+chunk_pages. It keeps the first occurrence of each near-duplicate group as
+the canonical chunk. Every later copy becomes a reference, kept by the
+NearDuplicateIndex under the canonical chunk's id and recorded on its
+metadata["duplicates"], so copies are neither embedded nor indexed.
+Candidate lookup uses banded LSH buckets, so each check costs roughly the
+size of the bucket rather than the number of chunks seen.
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Anchors added by ingest.chunk_pages, e.g. "[page=3] [section=INTRO] ".
+_ANCHORS_RE = re.compile(r"^(?:\[[a-z_]+=[^\]]*\]\s*)+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """Hashed word `size`-shingles of `text` (chunk anchors and case ignored)."""
+    tokens = _TOKEN_RE.findall(_ANCHORS_RE.sub("", text or "").lower())
+    if not tokens:
+        return set()
+    grams = [" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))]
+    return {int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little") for g in grams}
+
+
+class MinHasher:
+    """`num_perm` universal hash permutations; signature i is the min over shingles."""
+
+    def __init__(self, num_perm: int = 64, *, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = int(num_perm)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(self.num_perm)]
+
+    def signature(self, hashed_shingles: Iterable[int]) -> Optional[Signature]:
+        hs = list(hashed_shingles)
+        if not hs:
+            return None
+        return tuple(min((a * h + b) % _PRIME for h in hs) & _MAX_HASH for a, b in self._perms)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+@dataclass
+class DedupStats:
+    checked: int = 0
+    duplicates: int = 0
+    candidates: int = 0  # signatures compared, summed over all checks
+
+
+class NearDuplicateIndex:
+    """MinHash signatures bucketed by LSH bands, scoped per course.
+
+    With `bands` bands of num_perm/bands rows, pairs at Jaccard s become
+    candidates with probability 1-(1-s^r)^b. The defaults (64 perms, 16
+    bands of 4 rows) catch nearly all pairs above ~0.7. Candidates are then
+    confirmed against `threshold` using the full signature.
+
+    `references` maps each canonical id to the duplicates found for it over
+    the index's lifetime, including copies seen in later dedup_chunks calls
+    than the canonical chunk itself; attach() copies them onto chunks.
+    """
+
+    def __init__(self, *, num_perm: int = 64, bands: int = 16, threshold: float = 0.8, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.hasher = MinHasher(num_perm, seed=seed)
+        self.bands = int(bands)
+        self.rows = num_perm // bands
+        self.threshold = float(threshold)
+        self.shingle_size = int(shingle_size)
+        self._signatures: Dict[str, Signature] = {}
+        self._scopes: Dict[str, Optional[str]] = {}
+        self._buckets: Dict[Tuple[Optional[str], int, int], List[str]] = {}
+        self.references: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats = DedupStats()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._signatures
+
+    def signature(self, text: str) -> Optional[Signature]:
+        return self.hasher.signature(shingles(text, self.shingle_size))
+
+    def _keys(self, sig: Signature, scope: Optional[str]) -> List[Tuple[Optional[str], int, int]]:
+        r = self.rows
+        return [(scope, band, hash(sig[band * r:(band + 1) * r])) for band in range(self.bands)]
+
+    def query(self, sig: Signature, scope: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Best stored (doc_id, similarity) at or above the threshold, if any."""
+        seen: Set[str] = set()
+        best: Optional[Tuple[str, float]] = None
+        for key in self._keys(sig, scope):
+            for doc_id in self._buckets.get(key, ()):
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                sim = similarity(sig, self._signatures[doc_id])
+                if sim >= self.threshold and (best is None or sim > best[1]):
+                    best = (doc_id, sim)
+        self.stats.candidates += len(seen)
+        return best
+
+    def add(self, doc_id: str, sig: Signature, scope: Optional[str] = None) -> None:
+        self._signatures[doc_id] = sig
+        self._scopes[doc_id] = scope
+        for key in self._keys(sig, scope):
+            self._buckets.setdefault(key, []).append(doc_id)
+
+    def check(self, doc_id: str, text: str, scope: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Return (canonical_id, similarity) if `text` duplicates a stored chunk, else store it."""
+        self.stats.checked += 1
+        sig = self.signature(text)
+        if sig is None:
+            return None
+        if doc_id in self._signatures:
+            return None  # the same chunk ingested again: still canonical
+        hit = self.query(sig, scope)
+        if hit is not None:
+            self.stats.duplicates += 1
+            return hit
+        self.add(doc_id, sig, scope)
+        return None
+
+    def discard(self, doc_ids: Iterable[str]) -> None:
+        """Forget chunks that were checked but never indexed (e.g. a failed ingestion).
+
+        Their signatures are removed, and so are references to or from them.
+        """
+        gone = set(doc_ids)
+        for doc_id in gone:
+            sig = self._signatures.pop(doc_id, None)
+            if sig is None:
+                continue
+            for key in self._keys(sig, self._scopes.pop(doc_id, None)):
+                bucket = self._buckets.get(key)
+                if bucket is not None and doc_id in bucket:
+                    bucket.remove(doc_id)
+                    if not bucket:
+                        del self._buckets[key]
+        for canonical in list(self.references):
+            refs = [ref for ref in self.references[canonical] if ref["id"] not in gone]
+            if canonical in gone or not refs:
+                del self.references[canonical]
+            else:
+                self.references[canonical] = refs
+
+    def attach(self, chunks: Iterable[Dict[str, Any]]) -> None:
+        """Set metadata["duplicates"] of each canonical chunk to all references known for it."""
+        from .indexer import doc_id_for
+
+        for chunk in chunks:
+            refs = self.references.get(doc_id_for(chunk))
+            if refs:
+                chunk.setdefault("metadata", {})["duplicates"] = [
+                    {k: ref[k] for k in ("id", "page", "section", "source", "similarity") if ref[k] is not None}
+                    for ref in refs
+                ]
+
+
+@dataclass
+class DedupResult:
+    unique: List[Dict[str, Any]] = field(default_factory=list)
+    references: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def duplicate_ratio(self) -> float:
+        total = len(self.unique) + len(self.references)
+        return len(self.references) / total if total else 0.0
+
+
+def dedup_chunks(
+    chunks: Iterable[Dict[str, Any]],
+    *,
+    index: Optional[NearDuplicateIndex] = None,
+) -> DedupResult:
+    """Split `chunk_pages` output into canonical chunks and duplicate references.
+
+    Pass the same `index` across calls to dedupe across documents (e.g. every
+    PDF of a course pack). Duplicates are only matched within one course.
+    Each reference ({id, duplicate_of, course_id, page, section, source,
+    similarity}) is returned, stored in index.references under its canonical
+    id, and listed in metadata["duplicates"] of its canonical chunk when that
+    chunk is part of this call. For canonical chunks of earlier calls, use
+    index.attach() (or index.references) before they are written out.
+    """
+    from .indexer import doc_id_for
+
+    index = index if index is not None else NearDuplicateIndex()
+    result = DedupResult()
+    canonical: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunks:
+        meta = chunk.get("metadata") or {}
+        course_id = chunk.get("course_id") or meta.get("course_id")
+        doc_id = doc_id_for(chunk)
+        hit = index.check(doc_id, str(chunk.get("text", "")), scope=course_id)
+        if hit is None:
+            canonical[doc_id] = chunk
+            result.unique.append(chunk)
+            continue
+        ref = {
+            "id": doc_id,
+            "duplicate_of": hit[0],
+            "course_id": course_id,
+            "page": chunk.get("page", meta.get("page")),
+            "section": meta.get("section"),
+            "source": chunk.get("source") or meta.get("source"),
+            "similarity": round(hit[1], 3),
+        }
+        result.references.append(ref)
+        index.references.setdefault(hit[0], []).append(ref)
+    index.attach(canonical.values())
+    return result
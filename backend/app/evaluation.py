@@ -0,0 +1,261 @@
+# backend/app/evaluation.py
+"""Offline retrieval evaluation: recall@k, MRR and latency per retrieval variant.
+
+Usage (from backend/):
+    python -m app.evaluation golden.jsonl --snapshot /path/to/snapshot
+
+golden.jsonl lines: {"question": "...", "course_id": "CS101", "relevant_ids": ["<chunk id>", ...]}
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# A retriever returns ranked chunk ids for (question, course_id, k).
+Retriever = Callable[[str, Optional[str], int], List[str]]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class GoldenItem:
+    question: str
+    course_id: Optional[str]
+    relevant_ids: List[str]
+
+
+@dataclass
+class Variant:
+    name: str
+    retrieve: Retriever
+    k: int = 5
+
+
+@dataclass
+class Report:
+    variant: str
+    k: int
+    recall: float
+    mrr: float
+    p50_ms: float
+    p95_ms: float
+    queries: int
+    latencies_ms: List[float] = field(default_factory=list, repr=False)
+
+
+def load_golden(path: Path) -> List[GoldenItem]:
+    items: List[GoldenItem] = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        items.append(GoldenItem(row["question"], row.get("course_id"), [str(i) for i in row["relevant_ids"]]))
+    return items
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def recall_at_k(ranked: Sequence[str], relevant: Sequence[str], k: int) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(ranked[:k]) & set(relevant)) / len(set(relevant))
+
+
+def reciprocal_rank(ranked: Sequence[str], relevant: Sequence[str]) -> float:
+    rel = set(relevant)
+    for i, doc_id in enumerate(ranked, start=1):
+        if doc_id in rel:
+            return 1.0 / i
+    return 0.0
+
+
+def evaluate(golden: Sequence[GoldenItem], variant: Variant) -> Report:
+    recalls: List[float] = []
+    rrs: List[float] = []
+    latencies: List[float] = []
+    for item in golden:
+        start = time.perf_counter()
+        ranked = variant.retrieve(item.question, item.course_id, variant.k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        recalls.append(recall_at_k(ranked, item.relevant_ids, variant.k))
+        rrs.append(reciprocal_rank(ranked, item.relevant_ids))
+    n = max(1, len(golden))
+    return Report(
+        variant=variant.name,
+        k=variant.k,
+        recall=sum(recalls) / n,
+        mrr=sum(rrs) / n,
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+        queries=len(golden),
+        latencies_ms=latencies,
+    )
+
+
+def run_evaluation(golden: Sequence[GoldenItem], variants: Iterable[Variant]) -> List[Report]:
+    return [evaluate(golden, v) for v in variants]
+
+
+def format_report(reports: Sequence[Report]) -> str:
+    header = f"{'variant':<28} {'k':>3} {'recall@k':>9} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}"
+    lines = [header, "-" * len(header)]
+    for r in reports:
+        lines.append(f"{r.variant:<28} {r.k:>3} {r.recall:>9.3f} {r.mrr:>6.3f} {r.p50_ms:>8.2f} {r.p95_ms:>8.2f}")
+    return "\n".join(lines)
+
+
+# -----------------------------------------------------------------------------
+# Retrieval variants
+# -----------------------------------------------------------------------------
+class LexicalIndex:
+    """Small BM25 index over (id, text, course_id) documents."""
+
+    def __init__(self, docs: Iterable[Dict[str, Any]], *, k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.ids: List[str] = []
+        self.courses: List[Optional[str]] = []
+        self.tfs: List[Counter] = []
+        self.lengths: List[int] = []
+        df: Counter = Counter()
+        for d in docs:
+            toks = _tokens(str(d.get("text", "")))
+            tf = Counter(toks)
+            self.ids.append(str(d["id"]))
+            self.courses.append(d.get("course_id"))
+            self.tfs.append(tf)
+            self.lengths.append(len(toks))
+            df.update(tf.keys())
+        n = max(1, len(self.ids))
+        self.avg_len = (sum(self.lengths) / n) or 1.0
+        self.idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+    def search(self, query: str, *, k: int = 5, course_id: Optional[str] = None) -> List[str]:
+        terms = [t for t in set(_tokens(query)) if t in self.idf]
+        scored = []
+        for i, tf in enumerate(self.tfs):
+            if course_id is not None and self.courses[i] != course_id:
+                continue
+            s = 0.0
+            for t in terms:
+                f = tf.get(t, 0)
+                if f:
+                    s += self.idf[t] * f * (self.k1 + 1) / (f + self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_len))
+            if s > 0:
+                scored.append((s, self.ids[i]))
+        scored.sort(reverse=True)
+        return [doc_id for _, doc_id in scored[:k]]
+
+
+def knn_retriever(index: Any, embedder: Any) -> Retriever:
+    """k-NN over a LocalVectorIndex (same scoring as LocalSearchClient)."""
+    def _retrieve(question: str, course_id: Optional[str], k: int) -> List[str]:
+        vec = embedder.embed([question])[0]
+        return [h["id"] for h in index.search(vec, k=k, course_id=course_id)]
+    return _retrieve
+
+
+def opensearch_retriever(client: Any, embedder: Any, *, index: str) -> Retriever:
+    """k-NN through rag.retrieve against an OpenSearch index."""
+    from .rag import retrieve
+
+    def _retrieve(question: str, course_id: Optional[str], k: int) -> List[str]:
+        vec = embedder.embed([question])[0]
+        return [h.get("id", "") for h in retrieve(client, index=index, vector=vec, top_k=k, course_id=course_id)]
+    return _retrieve
+
+
+def lexical_retriever(lexical: LexicalIndex) -> Retriever:
+    def _retrieve(question: str, course_id: Optional[str], k: int) -> List[str]:
+        return lexical.search(question, k=k, course_id=course_id)
+    return _retrieve
+
+
+def hybrid_retriever(*retrievers: Retriever, depth: int = 20, rrf_k: int = 60) -> Retriever:
+    """Reciprocal-rank fusion of several retrievers, each queried `depth` deep."""
+    def _retrieve(question: str, course_id: Optional[str], k: int) -> List[str]:
+        fused: Dict[str, float] = {}
+        for r in retrievers:
+            for rank, doc_id in enumerate(r(question, course_id, max(k, depth)), start=1):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+        return [d for d, _ in sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]]
+    return _retrieve
+
+
+def reranked(base: Retriever, texts: Dict[str, str], *, candidates: int = 3) -> Retriever:
+    """Fetch k*candidates from `base`, then rerank by query-term overlap (stand-in cross-encoder)."""
+    def _retrieve(question: str, course_id: Optional[str], k: int) -> List[str]:
+        q = set(_tokens(question))
+        pool = base(question, course_id, k * candidates)
+        scored = [(len(q & set(_tokens(texts.get(d, "")))), -i, d) for i, d in enumerate(pool)]
+        scored.sort(reverse=True)
+        return [d for _, _, d in scored[:k]]
+    return _retrieve
+
+
+def standard_variants(
+    indexes: Dict[str, Any],
+    embedder: Any,
+    *,
+    ks: Sequence[int] = (3, 5, 10),
+) -> List[Variant]:
+    """knn / lexical / hybrid, with and without reranking, for every index profile and k.
+
+    `indexes` maps a profile name (e.g. "float32", "int8+pq") to a LocalVectorIndex
+    built with `embedder`. Reranked variants are labelled "+term-rerank": they
+    reorder by query-term overlap (see reranked), not with a cross-encoder.
+    """
+    variants: List[Variant] = []
+    first = next(iter(indexes.values()))
+    docs = [dict(doc, id=doc_id) for doc_id, _, doc in first.items()]
+    texts = {d["id"]: str(d.get("text", "")) for d in docs}
+    lexical = lexical_retriever(LexicalIndex(docs))
+    for k in ks:
+        variants.append(Variant("lexical", lexical, k))
+        for profile, index in indexes.items():
+            knn = knn_retriever(index, embedder)
+            variants.append(Variant(f"knn[{profile}]", knn, k))
+            variants.append(Variant(f"knn[{profile}]+term-rerank", reranked(knn, texts), k))
+            hybrid = hybrid_retriever(knn, lexical)
+            variants.append(Variant(f"hybrid[{profile}]", hybrid, k))
+            variants.append(Variant(f"hybrid[{profile}]+term-rerank", reranked(hybrid, texts), k))
+    return variants
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .snapshot import embedder_for, load_snapshot, resolve_snapshot
+
+    parser = argparse.ArgumentParser(description="Evaluate retrieval variants against a golden set")
+    parser.add_argument("golden", type=Path, help="JSONL golden set")
+    parser.add_argument("--snapshot", type=Path, required=True, help="index snapshot directory or alias root")
+    parser.add_argument("--k", type=int, action="append", help="k values (repeatable; default 3,5,10)")
+    args = parser.parse_args(argv)
+
+    index = load_snapshot(resolve_snapshot(args.snapshot))
+    reports = run_evaluation(
+        load_golden(args.golden),
+        standard_variants({index.encoding: index}, embedder_for(index), ks=args.k or (3, 5, 10)),
+    )
+    print(format_report(reports))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
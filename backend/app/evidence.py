@@ -0,0 +1,90 @@
+# backend/app/evidence.py
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Anchors added by ingest.chunk_pages, e.g. "[page=3] [section=INTRO] ".
+_ANCHORS_RE = re.compile(r"^(?:\[[a-z_]+=[^\]]*\]\s*)+")
+_SENTENCE_RE = re.compile(r"[^.!?\n]+(?:[.!?]+|$)", re.M)
+
+
+@dataclass
+class Span:
+    start: int
+    end: int
+    score: float
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Character offsets (start, end) of the sentences in `text`, skipping chunk anchors."""
+    m = _ANCHORS_RE.match(text)
+    offset = m.end() if m else 0
+    spans: List[Tuple[int, int]] = []
+    for s in _SENTENCE_RE.finditer(text, offset):
+        start, end = s.start(), s.end()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end - start >= 3:
+            spans.append((start, end))
+    return spans
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    na = math.sqrt(sum(x * x for x in a)) or 1.0
+    nb = math.sqrt(sum(x * x for x in b)) or 1.0
+    return sum(x * y for x, y in zip(a, b)) / (na * nb)
+
+
+def select_evidence(
+    question: str,
+    docs: Sequence[Dict[str, Any]],
+    embedder: Any,
+    *,
+    max_sentences: int = 2,
+) -> List[Dict[str, Any]]:
+    """Replace each doc's snippet with its best-matching sentences.
+
+    Sentences of every doc are embedded together with the question in a
+    single `embedder.embed` call, scored by cosine similarity, and the top
+    `max_sentences` per doc are kept in their original order. Each returned
+    doc carries `spans` ([{start, end, score}], offsets into the original
+    snippet) and `snippet_chars` (length of the original snippet).
+    Docs with no more sentences than `max_sentences` are returned unchanged.
+    """
+    per_doc: List[List[Tuple[int, int]]] = []
+    texts: List[str] = [question]
+    for d in docs:
+        snippet = str(d.get("snippet") or "")
+        sents = split_sentences(snippet)
+        if len(sents) <= max_sentences:
+            sents = []
+        per_doc.append(sents)
+        texts.extend(snippet[a:b] for a, b in sents)
+    if len(texts) == 1:
+        return [dict(d) for d in docs]
+
+    vectors = embedder.embed(texts)
+    qvec = vectors[0]
+    pos = 1
+    out: List[Dict[str, Any]] = []
+    for d, sents in zip(docs, per_doc):
+        if not sents:
+            out.append(dict(d))
+            continue
+        scored = [Span(a, b, _cosine(qvec, vectors[pos + i])) for i, (a, b) in enumerate(sents)]
+        pos += len(sents)
+        best = sorted(scored, key=lambda sp: sp.score, reverse=True)[: max(1, int(max_sentences))]
+        best.sort(key=lambda sp: sp.start)
+        snippet = str(d.get("snippet") or "")
+        out.append(dict(
+            d,
+            snippet=" ... ".join(snippet[sp.start:sp.end] for sp in best),
+            spans=[{"start": sp.start, "end": sp.end, "score": round(sp.score, 4)} for sp in best],
+            snippet_chars=len(snippet),
+        ))
+    return out
@@ -0,0 +1,186 @@
+# backend/app/indexer.py
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("indexer")
+
+# Item statuses worth retrying: throttling and transient server errors.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retryable_error(exc: Exception) -> bool:
+    """Whether a bulk request that raised is worth resending: connection errors, timeouts, 429 and 5xx."""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # opensearchpy.TransportError carries the HTTP status; its ConnectionError
+    # and ConnectionTimeout subclasses report "N/A" (no response at all).
+    status = getattr(exc, "status_code", None)
+    return status in RETRYABLE_STATUSES or status == "N/A"
+
+
+def doc_id_for(doc: Dict[str, Any]) -> str:
+    """Stable id for a chunk document so retries and re-ingests are idempotent."""
+    if doc.get("id"):
+        return str(doc["id"])
+    key = f"{doc.get('course_id')}|{doc.get('page')}|{doc.get('text', '')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class BulkStats:
+    indexed: int = 0
+    failed: int = 0
+    retried: int = 0
+    requests: int = 0
+    seconds: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.indexed / self.seconds if self.seconds > 0 else 0.0
+
+
+class BulkIndexer:
+    """Batch chunk documents into OpenSearch `_bulk` requests.
+
+    - Batches are cut at `max_docs` documents or `max_bytes` of NDJSON,
+      whichever comes first.
+    - At most `max_in_flight` bulk requests run concurrently; the producer
+      blocks when that many are outstanding (back-pressure), so memory stays
+      bounded no matter how large the input iterator is.
+    - Partial failures: only the items that failed with a retryable status
+      are resent, with exponential backoff, up to `max_retries` times.
+    - Whole-request failures (connection errors and timeouts, or the request
+      itself rejected with 429/5xx) resend the batch with the same backoff;
+      once retries run out its documents count as failed. Other errors raise.
+
+    `client` only needs a `bulk(body=...)` method returning the standard
+    OpenSearch bulk response ({"errors": bool, "items": [...]}).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        index: str,
+        max_docs: int = 500,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_in_flight: int = 2,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.client = client
+        self.index = index
+        self.max_docs = max(1, int(max_docs))
+        self.max_bytes = max(1, int(max_bytes))
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = float(backoff)
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+
+    def _encode(self, doc: Dict[str, Any]) -> bytes:
+        action = {"index": {"_index": self.index, "_id": doc_id_for(doc)}}
+        source = {k: v for k, v in doc.items() if k != "id"}
+        return (json.dumps(action) + "\n" + json.dumps(source, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def batches(self, docs: Iterable[Dict[str, Any]]) -> Iterator[List[bytes]]:
+        """Yield lists of encoded action/source pairs respecting the size limits."""
+        batch: List[bytes] = []
+        size = 0
+        for doc in docs:
+            line = self._encode(doc)
+            if batch and (len(batch) >= self.max_docs or size + len(line) > self.max_bytes):
+                yield batch
+                batch, size = [], 0
+            batch.append(line)
+            size += len(line)
+        if batch:
+            yield batch
+
+    def _send(self, lines: List[bytes], stats: BulkStats) -> None:
+        pending = lines
+        attempt = 0
+        while pending:
+            try:
+                resp = self.client.bulk(body=b"".join(pending).decode("utf-8"))
+                # {"error": ..., "status": 429} rejects the whole request
+                rejected = resp.get("error") is not None
+                retryable = rejected and resp.get("status") in RETRYABLE_STATUSES
+            except Exception as exc:
+                if not _retryable_error(exc):
+                    raise
+                logger.warning("Bulk request to %s failed (attempt %d): %s", self.index, attempt + 1, exc)
+                resp = {"error": str(exc), "status": getattr(exc, "status_code", None)}
+                rejected = retryable = True
+            with self._stats_lock:
+                stats.requests += 1
+            retry: List[bytes] = []
+            ok = 0
+            failed: List[Tuple[bytes, Dict[str, Any]]] = []
+            if rejected:
+                if retryable and attempt < self.max_retries:
+                    retry = pending
+                else:
+                    failed = [(line, resp) for line in pending]
+                items: List[Dict[str, Any]] = []
+            else:
+                items = resp.get("items", []) if resp.get("errors") else []
+                if not resp.get("errors"):
+                    ok = len(pending)
+                else:
+                    # fewer items than docs sent: the rest cannot be confirmed as indexed
+                    failed = [(line, {"error": "missing from the bulk response", "status": None}) for line in pending[len(items):]]
+            for line, item in zip(pending, items):
+                result = next(iter(item.values()), {})
+                status = int(result.get("status", 500))
+                if status < 300:
+                    ok += 1
+                elif status in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    retry.append(line)
+                else:
+                    failed.append((line, result))
+            with self._stats_lock:
+                stats.indexed += ok
+                stats.failed += len(failed)
+                stats.retried += len(retry)
+                stats.errors.extend(r for _, r in failed)
+            if retry:
+                self._sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+            pending = retry
+
+    def index_all(self, docs: Iterable[Dict[str, Any]]) -> BulkStats:
+        """Index every document and return throughput/failure statistics."""
+        stats = BulkStats()
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        futures: List[Future] = []
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="bulk") as pool:
+            for batch in self.batches(docs):
+                slots.acquire()
+                fut = pool.submit(self._send, batch, stats)
+                fut.add_done_callback(lambda _f: slots.release())
+                futures.append(fut)
+            for fut in futures:
+                fut.result()
+        stats.seconds = time.perf_counter() - start
+        logger.info(
+            "Bulk indexed %d docs into %s (%d failed, %d retried) in %.2fs (%.0f docs/sec)",
+            stats.indexed, self.index, stats.failed, stats.retried, stats.seconds, stats.docs_per_sec,
+        )
+        return stats
+
+
+def bulk_index_chunks(client: Any, chunks: Iterable[Dict[str, Any]], *, index: str, **kwargs: Any) -> BulkStats:
+    """Convenience wrapper: bulk-index `chunk_pages` output into `index`."""
+    return BulkIndexer(client, index=index, **kwargs).index_all(chunks)
@@ -1,10 +1,15 @@
 # backend/app/ingest.py
 from __future__ import annotations
 
+import os
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Iterable, Dict, Any
+from functools import lru_cache
+from typing import List, Iterable, Iterator, Dict, Any, Optional, Union
 import re
 
+from .lazy import optional_import
+
 
 @dataclass
 class Chunk:
@@ -78,31 +83,139 @@ def chunk_pages(pages: Iterable[str], *, course_id: str, max_chars: int = 1000)
     return out
 
 
-def create_opensearch_index(host: str, *, index_name: str, dim: int = 1536) -> Dict[str, Any]:
-    mapping = {
-        "settings": {"index": {"number_of_shards": 1, "number_of_replicas": 0}},
+# Canonical vector field for chunk documents (see rag.retrieve / build_knn_query).
+VECTOR_FIELD = "embedding"
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """Tunable k-NN index settings.
+
+    engine/space_type/m/ef_construction shape the HNSW graph (build cost and
+    memory), ef_search trades recall for query latency, data_type selects
+    vector precision: "float" (fp32), "fp16" (faiss SQ encoder) or "byte".
+    bulk_refresh_interval is applied while bulk loading (see bulk_load_mode).
+    """
+    name: str
+    engine: str = "faiss"
+    space_type: str = "l2"
+    m: int = 16
+    ef_construction: int = 128
+    ef_search: int = 100
+    shards: int = 1
+    replicas: int = 0
+    refresh_interval: str = "1s"
+    bulk_refresh_interval: str = "-1"
+    data_type: str = "float"
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    # Local/dev: single shard, no replicas (the historical default).
+    "dev": IndexProfile(name="dev"),
+    "balanced": IndexProfile(name="balanced", m=16, ef_construction=256, ef_search=100, shards=2, replicas=1),
+    "high_recall": IndexProfile(name="high_recall", m=32, ef_construction=512, ef_search=256, shards=2, replicas=1),
+    "low_latency": IndexProfile(name="low_latency", m=8, ef_construction=128, ef_search=32, shards=2, replicas=1),
+    # Half the vector memory of fp32 with negligible recall loss for most embedders.
+    "compact": IndexProfile(name="compact", data_type="fp16", shards=2, replicas=1),
+    # Quarter the vector memory; vectors must be pre-quantized to int8 by the caller.
+    "compact_byte": IndexProfile(name="compact_byte", engine="lucene", data_type="byte", shards=2, replicas=1),
+}
+
+
+def get_index_profile(profile: Union[str, IndexProfile, None] = None) -> IndexProfile:
+    """Resolve a profile by name (default: OPENSEARCH_INDEX_PROFILE or "dev")."""
+    if isinstance(profile, IndexProfile):
+        return profile
+    name = profile or os.environ.get("OPENSEARCH_INDEX_PROFILE", "dev")
+    try:
+        return INDEX_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown index profile {name!r}; choose one of {sorted(INDEX_PROFILES)}")
+
+
+def build_index_mapping(dim: int, profile: Union[str, IndexProfile, None] = None) -> Dict[str, Any]:
+    p = get_index_profile(profile)
+    method: Dict[str, Any] = {
+        "name": "hnsw",
+        "engine": p.engine,
+        "space_type": p.space_type,
+        "parameters": {"m": p.m, "ef_construction": p.ef_construction},
+    }
+    vector: Dict[str, Any] = {"type": "knn_vector", "dimension": dim, "method": method}
+    if p.data_type == "fp16":
+        method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+    elif p.data_type == "byte":
+        vector["data_type"] = "byte"
+    index_settings: Dict[str, Any] = {
+        "number_of_shards": p.shards,
+        "number_of_replicas": p.replicas,
+        "refresh_interval": p.refresh_interval,
+        "knn": True,
+    }
+    if p.engine != "lucene":
+        index_settings["knn.algo_param.ef_search"] = p.ef_search
+    return {
+        "settings": {"index": index_settings},
         "mappings": {
             "properties": {
                 "text": {"type": "text"},
                 "source": {"type": "keyword"},
                 "course_id": {"type": "keyword"},
                 "page": {"type": "integer"},
-                "vector": {"type": "knn_vector", "dims": dim},
-                "embedding": {"type": "knn_vector", "dimension": dim},
+                "section": {"type": "keyword"},
+                # near-duplicate references (dedup.dedup_chunks): stored, not indexed
+                "duplicates": {"type": "object", "enabled": False},
+                VECTOR_FIELD: vector,
             }
         },
     }
+
+
+@lru_cache(maxsize=8)
+def _opensearch_client(host: str) -> Any:
+    """One OpenSearch client per host; None when opensearch-py is not installed."""
+    opensearchpy = optional_import("opensearchpy")
+    return opensearchpy.OpenSearch(hosts=[host]) if opensearchpy is not None else None
+
+
+def create_opensearch_index(
+    host: str,
+    *,
+    index_name: str,
+    dim: int = 1536,
+    profile: Union[str, IndexProfile, None] = None,
+) -> Dict[str, Any]:
+    mapping = build_index_mapping(dim, profile)
     try:
-        import opensearchpy  # type: ignore
-        client = opensearchpy.OpenSearch(hosts=[host])
-        if not client.indices.exists(index_name):
+        client = _opensearch_client(host)
+        if client is not None and not client.indices.exists(index_name):
             client.indices.create(index_name, body=mapping)
     except Exception:
         pass
     return mapping
 
 
+@contextmanager
+def bulk_load_mode(client: Any, index_name: str, profile: Union[str, IndexProfile, None] = None) -> Iterator[None]:
+    """Disable refresh and replicas while bulk loading, then restore the profile's values."""
+    p = get_index_profile(profile)
+    client.indices.put_settings(
+        index=index_name,
+        body={"index": {"refresh_interval": p.bulk_refresh_interval, "number_of_replicas": 0}},
+    )
+    try:
+        yield
+    finally:
+        client.indices.put_settings(
+            index=index_name,
+            body={"index": {"refresh_interval": p.refresh_interval, "number_of_replicas": p.replicas}},
+        )
+        client.indices.refresh(index=index_name)
+
+
 class StubEmbeddings:
+    name = "stub"
+
     def __init__(self, dims: int = 16):
         self.dims = int(dims)
 
@@ -118,4 +231,25 @@ class StubEmbeddings:
         return vec
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        return [self._encode_one(t) for t in texts]
\ No newline at end of file
+        return [self._encode_one(t) for t in texts]
+
+
+class EmbedderMismatchError(RuntimeError):
+    """The configured embedder is not the one an index was built with."""
+
+
+# Embedding providers by EMBEDDING_PROVIDER name; each takes dims=.
+EMBEDDERS: Dict[str, Any] = {"stub": StubEmbeddings}
+
+
+def get_embedder(name: Optional[str] = None, *, dims: Optional[int] = None) -> Any:
+    """Embedder selected by EMBEDDING_PROVIDER (default "stub") with EMBEDDING_DIMS dims (default 16)."""
+    name = (name or os.environ.get("EMBEDDING_PROVIDER", "stub")).lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER {name!r}; expected one of {sorted(EMBEDDERS)}")
+    return EMBEDDERS[name](dims=int(dims or os.environ.get("EMBEDDING_DIMS", "16")))
+
+
+def embedder_info(embedder: Any) -> Dict[str, Any]:
+    """Identity of an embedder as recorded in index manifests: {"name", "dims"}."""
+    return {"name": getattr(embedder, "name", type(embedder).__name__), "dims": int(getattr(embedder, "dims", 0))}
@@ -0,0 +1,506 @@
+# backend/app/jobs.py
+"""Background ingestion jobs: extract -> chunk -> embed -> index off the request path.
+
+POST /ingest/jobs spools the uploaded document to disk and returns a job id
+immediately. A small pool of worker threads then processes jobs in priority
+order. Lower numbers run first. Small uploads default to a higher priority
+than large ones, and while more than one worker is configured, at least one
+worker is always kept free of large jobs. So a short handout never waits
+behind a 1,000-page textbook.
+
+Job state is appended to a JSONL journal in the spool directory as it
+changes (throttled during progress). On startup recover() reads it back:
+jobs that were queued or running when the process stopped are requeued if
+their spooled document is still there, and finished jobs stay listable.
+PDF pages are checkpointed (pdf.PageCheckpoint), so a resumed job skips
+extraction of pages it already did.
+
+Chunks go through a per-course dedup.NearDuplicateIndex before embedding,
+so slides repeated across a course's uploads are embedded and indexed once.
+
+Cancellation is cooperative and checked between pages and embedding
+batches. A job's vectors are handed to the index in a single add_chunks()
+call after embedding has finished, so a cancelled or failed job leaves
+nothing half-indexed. The served index is reindex.LiveSnapshotWriter (see
+get_job_manager).
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .dedup import NearDuplicateIndex, dedup_chunks
+from .indexer import doc_id_for
+from .ingest import chunk_pages
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATES = frozenset({"succeeded", "failed", "cancelled"})
+
+# Default priorities (lower runs first); callers may pass any int.
+PRIORITY_SMALL = 0
+PRIORITY_LARGE = 10
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class IngestJob:
+    id: str
+    course_id: str
+    source: str
+    kind: str  # "pdf" or "text" (pages separated by form feeds)
+    size: int
+    priority: int
+    large: bool = False
+    path: str = ""  # spooled document
+    status: str = "queued"
+    stage: Optional[str] = None  # extract | embed | index
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    chunks: int = 0
+    vectors_written: int = 0
+    error: Optional[str] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IngestJob":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+
+class JobJournal:
+    """Append-only JSONL of job states; the last line written for an id wins."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def append(self, job: IngestJob) -> None:
+        line = json.dumps(job.to_dict(), separators=(",", ":")) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+    def load(self) -> Dict[str, IngestJob]:
+        jobs: Dict[str, IngestJob] = {}
+        if not self.path.exists():
+            return jobs
+        with self._lock, self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    job = IngestJob.from_dict(json.loads(line))
+                except (ValueError, TypeError):
+                    continue  # torn last line after a crash
+                jobs[job.id] = job
+        return jobs
+
+    def compact(self, jobs: Iterable[IngestJob]) -> None:
+        """Rewrite the journal with one line per job."""
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with self._lock:
+            with tmp.open("w", encoding="utf-8") as f:
+                for job in jobs:
+                    f.write(json.dumps(job.to_dict(), separators=(",", ":")) + "\n")
+            os.replace(tmp, self.path)
+
+
+class JobManager:
+    """Priority queue of IngestJobs served by `workers` daemon threads.
+
+    `index` needs add_chunks(chunks, vectors) (e.g. LocalVectorIndex or
+    reindex.LiveSnapshotWriter) and `embedder` needs embed(texts). Large jobs
+    (size > small_bytes) may occupy at most workers - 1 threads when
+    workers > 1. Finished jobs are kept, in memory and in the journal, for
+    `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        *,
+        index: Any,
+        embedder: Any,
+        workers: int = 2,
+        spool_dir: Optional[Path] = None,
+        small_bytes: int = 2 * 1024 * 1024,
+        embed_batch: int = 64,
+        pdf_workers: int = 1,
+        persist_interval: float = 0.5,
+        retention: float = 7 * 24 * 3600.0,
+    ):
+        self.index = index
+        self.embedder = embedder
+        self.workers = max(1, int(workers))
+        self.spool_dir = Path(spool_dir or Path(tempfile.gettempdir()) / "ragedu-ingest")
+        self.small_bytes = int(small_bytes)
+        self.embed_batch = max(1, int(embed_batch))
+        self.pdf_workers = int(pdf_workers)
+        self.persist_interval = float(persist_interval)
+        self.retention = float(retention)
+        self.max_large = max(1, self.workers - 1)
+        self.journal = JobJournal(self.spool_dir / "jobs.jsonl")
+
+        self._jobs: Dict[str, IngestJob] = {}
+        self._history: Dict[str, IngestJob] = {}  # finished jobs of earlier runs
+        self._cancel: Dict[str, threading.Event] = {}
+        self._done: Dict[str, threading.Event] = {}
+        self._persisted_at: Dict[str, float] = {}
+        self._dedup: Dict[str, NearDuplicateIndex] = {}
+        self._dedup_lock = threading.Lock()
+        self._queue: List[Tuple[int, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._large_running = 0
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    # -- lifecycle ------------------------------------------------------------
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for n in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"ingest-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        if wait:
+            for t in threads:
+                t.join()
+
+    def recover(self) -> int:
+        """Reload the journal and requeue jobs that never finished; returns how many were requeued.
+
+        The journal is compacted to one line per job, dropping finished jobs
+        older than `retention`. Partial uploads left by submit_file callers
+        are deleted.
+        """
+        for part in self.spool_dir.glob("upload-*.part"):
+            try:
+                part.unlink()
+            except OSError:
+                pass
+        requeued: List[IngestJob] = []
+        cutoff = time.time() - self.retention
+        kept: List[IngestJob] = []
+        for job in self.journal.load().values():
+            if job.id in self._jobs:
+                continue
+            if job.status in FINAL_STATES:
+                if (job.finished_at or 0.0) >= cutoff:
+                    self._history[job.id] = job
+                    kept.append(job)
+                continue
+            if not job.path or not Path(job.path).exists():
+                job.status, job.stage = "failed", None
+                job.error, job.finished_at = "interrupted: spooled document is gone", time.time()
+                self._history[job.id] = job
+                kept.append(job)
+                continue
+            job.status, job.stage = "queued", None
+            job.pages_done = job.chunks = job.vectors_written = 0
+            requeued.append(job)
+        if self.journal.path.exists():
+            self.journal.compact(kept + requeued + list(self._jobs.values()))
+        for job in requeued:
+            self._enqueue(job)
+        if requeued:
+            self.start()
+        return len(requeued)
+
+    # -- public API -------------------------------------------------------------
+    def submit(
+        self,
+        course_id: str,
+        data: bytes,
+        *,
+        source: str,
+        kind: str = "pdf",
+        priority: Optional[int] = None,
+    ) -> IngestJob:
+        if kind not in ("pdf", "text"):
+            raise ValueError(f"unsupported document kind {kind!r}")
+        part = self.upload_path()
+        part.write_bytes(data)
+        return self.submit_file(course_id, part, source=source, kind=kind, priority=priority)
+
+    def upload_path(self) -> Path:
+        """A new file in the spool directory to stream an upload into before submit_file()."""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        return self.spool_dir / f"upload-{uuid.uuid4().hex}.part"
+
+    def submit_file(
+        self,
+        course_id: str,
+        path: Path,
+        *,
+        source: str,
+        kind: str = "pdf",
+        priority: Optional[int] = None,
+    ) -> IngestJob:
+        """Queue a document already written to `path`, which is moved into the spool."""
+        if kind not in ("pdf", "text"):
+            raise ValueError(f"unsupported document kind {kind!r}")
+        job_id = uuid.uuid4().hex
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        spooled = self.spool_dir / f"{job_id}.{'pdf' if kind == 'pdf' else 'txt'}"
+        os.replace(path, spooled)
+        size = spooled.stat().st_size
+        large = size > self.small_bytes
+        job = IngestJob(
+            id=job_id,
+            course_id=course_id,
+            source=source,
+            kind=kind,
+            size=size,
+            priority=int(priority) if priority is not None else (PRIORITY_LARGE if large else PRIORITY_SMALL),
+            large=large,
+            path=str(spooled),
+            created_at=time.time(),
+        )
+        self._enqueue(job)
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self._jobs.get(job_id) or self._history.get(job_id)
+
+    def list(self, course_id: Optional[str] = None) -> List[IngestJob]:
+        jobs = dict(self._history)
+        jobs.update(self._jobs)
+        return sorted(
+            (j for j in jobs.values() if course_id is None or j.course_id == course_id),
+            key=lambda j: j.created_at,
+        )
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Request cancellation. Queued jobs stop at once; running ones at the next checkpoint."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINAL_STATES:
+                return job or self.get(job_id)
+            self._cancel[job_id].set()
+            if job.status == "queued":
+                self._queue = [e for e in self._queue if e[2] != job_id]
+                heapq.heapify(self._queue)
+                self._finish(job, "cancelled")
+        return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        done = self._done.get(job_id)
+        return done.wait(timeout) if done is not None else True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {"workers": self.workers, "queued": len(self._queue), "large_running": self._large_running, "jobs": by_status}
+
+    # -- internals --------------------------------------------------------------
+    def _enqueue(self, job: IngestJob) -> None:
+        with self._cond:
+            self._jobs[job.id] = job
+            self._cancel[job.id] = threading.Event()
+            self._done[job.id] = threading.Event()
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job.id))
+            self._persist(job, force=True)
+            self._cond.notify()
+
+    def _next(self) -> Optional[IngestJob]:
+        with self._cond:
+            while not self._stopping:
+                for entry in sorted(self._queue):
+                    job = self._jobs[entry[2]]
+                    if job.large and self._large_running >= self.max_large and self.workers > 1:
+                        continue  # keep a worker for small jobs
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    if job.large:
+                        self._large_running += 1
+                    job.status, job.started_at = "running", time.time()
+                    self._persist(job, force=True)
+                    return job
+                self._cond.wait()
+            return None
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            try:
+                self._process(job)
+                self._finish(job, "succeeded")
+            except JobCancelled:
+                self._finish(job, "cancelled")
+            except Exception as exc:
+                logger.exception("Ingest job %s failed", job.id)
+                self._finish(job, "failed", f"{type(exc).__name__}: {exc}")
+            finally:
+                with self._cond:
+                    if job.large:
+                        self._large_running -= 1
+                    self._cond.notify_all()
+
+    def _finish(self, job: IngestJob, status: str, error: Optional[str] = None) -> None:
+        job.status, job.error, job.finished_at = status, error, time.time()
+        self._persist(job, force=True)
+        for p in (Path(job.path), Path(job.path + ".pages.jsonl")):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        self._done[job.id].set()
+        self._prune()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than `retention`."""
+        cutoff = time.time() - self.retention
+        with self._cond:
+            for jobs in (self._jobs, self._history):
+                for job_id in [j.id for j in jobs.values() if j.status in FINAL_STATES and (j.finished_at or 0.0) < cutoff]:
+                    del jobs[job_id]
+                    self._cancel.pop(job_id, None)
+                    self._done.pop(job_id, None)
+                    self._persisted_at.pop(job_id, None)
+
+    def _persist(self, job: IngestJob, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if force or now - self._persisted_at.get(job.id, 0.0) >= self.persist_interval:
+            self._persisted_at[job.id] = now
+            self.journal.append(job)
+
+    def _check(self, job: IngestJob) -> None:
+        if self._cancel[job.id].is_set():
+            raise JobCancelled(job.id)
+        self._persist(job)
+
+    def _pages(self, job: IngestJob) -> Iterator[str]:
+        if job.kind == "text":
+            pages = Path(job.path).read_text(encoding="utf-8", errors="replace").split("\f")
+            job.pages_total = len(pages)
+            texts: Iterator[str] = iter(pages)
+        else:
+            from .pdf import extract_pages
+
+            texts = self._pdf_texts(job, extract_pages(job.path, workers=self.pdf_workers, checkpoint=job.path + ".pages.jsonl"))
+        for text in texts:
+            self._check(job)
+            yield text
+            job.pages_done += 1
+
+    @staticmethod
+    def _pdf_texts(job: IngestJob, pages: Iterable[Any]) -> Iterator[str]:
+        for page in pages:
+            job.pages_total = page.total
+            yield page.text
+
+    def _process(self, job: IngestJob) -> None:
+        job.stage = "extract"
+        chunks = chunk_pages(self._pages(job), course_id=job.course_id)
+        for chunk in chunks:
+            chunk["source"] = job.source
+            chunk["metadata"]["source"] = job.source
+        with self._dedup_lock:
+            dedup = self._dedup.setdefault(job.course_id, NearDuplicateIndex())
+            ids = [doc_id_for(c) for c in chunks]
+            new_ids = [i for i in ids if i not in dedup]
+            chunks = dedup_chunks(chunks, index=dedup).unique
+        job.chunks = len(chunks)
+        try:
+            self._embed_and_index(job, chunks)
+        except BaseException:
+            with self._dedup_lock:
+                dedup.discard(new_ids)  # never indexed: later uploads must not count as their copies
+            raise
+
+    def _embed_and_index(self, job: IngestJob, chunks: List[Dict[str, Any]]) -> None:
+        job.stage = "embed"
+        vectors: List[Any] = []
+        for start in range(0, len(chunks), self.embed_batch):
+            self._check(job)
+            vectors.extend(self.embedder.embed([c["text"] for c in chunks[start:start + self.embed_batch]]))
+        self._check(job)
+
+        # not cancellable: the job's vectors become visible all together
+        job.stage = "index"
+        self._persist(job, force=True)
+        job.vectors_written = self.index.add_chunks(chunks, vectors)
+        job.stage = None
+
+
+# Factory
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Process-wide JobManager configured from INGEST_* env vars.
+
+    Jobs write through a reindex.LiveSnapshotWriter on INDEX_SNAPSHOT_PATH,
+    the same alias-aware snapshot root that retrieval reads, so ingested
+    documents are served after the job's swap and survive restarts. Raises
+    RuntimeError when INDEX_SNAPSHOT_PATH is not set, and
+    ingest.EmbedderMismatchError when the configured embedder is not the one
+    the served snapshot was built with.
+    """
+    global _job_manager
+    if _job_manager is None:
+        from .ingest import get_embedder
+        from .reindex import LiveSnapshotWriter
+        from .snapshot import embedder_for, get_snapshot_index
+
+        root = os.environ.get("INDEX_SNAPSHOT_PATH")
+        if not root:
+            raise RuntimeError("Ingestion jobs need INDEX_SNAPSHOT_PATH (the index that retrieval serves)")
+        live = get_snapshot_index()
+        # the served index's model, or EMBEDDING_PROVIDER/EMBEDDING_DIMS for a new root
+        embedder = embedder_for(live) if live is not None else get_embedder()
+        writer = LiveSnapshotWriter(root, dim=embedder.dims, embedder=embedder)
+        spool = os.environ.get("INGEST_SPOOL_DIR")
+        _job_manager = JobManager(
+            index=writer,
+            embedder=embedder,
+            workers=int(os.environ.get("INGEST_WORKERS", "2")),
+            spool_dir=Path(spool) if spool else None,
+            small_bytes=int(os.environ.get("INGEST_SMALL_BYTES", str(2 * 1024 * 1024))),
+        )
+        _job_manager.recover()
+    return _job_manager
+
+
+def shutdown_job_manager() -> None:
+    """Stop the process-wide JobManager's workers, if one was created.
+
+    Running jobs are not waited for: they stay "running" in the journal and
+    recover() requeues them on the next start.
+    """
+    global _job_manager
+    mgr, _job_manager = _job_manager, None
+    if mgr is not None:
+        mgr.shutdown(wait=False)
@@ -0,0 +1,36 @@
+# backend/app/lazy.py
+"""Lazy, cached imports for optional heavy dependencies.
+
+Cloud SDKs (boto3, opensearchpy), NumPy and optional engines (tiktoken) must
+not be imported at module top level: `import app.main` has to stay cheap for
+scale-to-zero cold starts. Call optional_import()/require() at the point of
+use instead. The first caller pays for the import and later calls are a
+dict lookup.
+"""
+from __future__ import annotations
+
+import importlib
+from functools import lru_cache
+from types import ModuleType
+from typing import Optional
+
+# Modules that must stay out of sys.modules after `import app.main`
+# (enforced by tests/test_import_time.py).
+HEAVY_MODULES = ("boto3", "botocore", "opensearchpy", "numpy", "tiktoken", "cryptography")
+
+
+@lru_cache(maxsize=None)
+def optional_import(name: str) -> Optional[ModuleType]:
+    """Import `name` once; returns None when it is not installed."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def require(name: str, hint: str = "") -> ModuleType:
+    """Like optional_import() but raises ImportError with an install hint."""
+    module = optional_import(name)
+    if module is None:
+        raise ImportError(f"{name} is required" + (f" ({hint})" if hint else ""))
+    return module
@@ -0,0 +1,283 @@
+# backend/app/llm/accounting.py
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from ..lazy import require
+
+logger = logging.getLogger("llm.usage")
+
+
+class Tokenizer(Protocol):
+    """Counts tokens for accounting; implementations should match the provider's tokenizer."""
+
+    def count(self, text: str) -> int:
+        ...
+
+
+class CharRatioTokenizer:
+    """Provider-agnostic estimate: one token per `chars_per_token` characters."""
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = float(chars_per_token)
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text or "") / self.chars_per_token) if text else 0
+
+
+class TiktokenTokenizer:
+    """Exact counts for OpenAI-style BPE vocabularies (optional `tiktoken` dependency)."""
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        self._enc = require("tiktoken").get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode(text or ""))
+
+
+_tokenizers: Dict[str, Tokenizer] = {}
+
+
+def _build_tokenizer(spec: str) -> Tokenizer:
+    name, _, arg = spec.partition(":")
+    if name == "tiktoken":
+        try:
+            return TiktokenTokenizer(arg or "cl100k_base")
+        except ImportError:
+            logger.warning("tiktoken not installed; falling back to character-ratio token estimates")
+            return CharRatioTokenizer()
+    return CharRatioTokenizer(float(arg) if arg else 4.0)
+
+
+def get_tokenizer(spec: Optional[str] = None) -> Tokenizer:
+    """Tokenizer for LLM_TOKENIZER: "chars" (default), "chars:<ratio>" or
+    "tiktoken[:<encoding>]" (falls back to chars when tiktoken is not installed).
+    Built once per spec and cached."""
+    spec = spec or os.environ.get("LLM_TOKENIZER", "chars")
+    tok = _tokenizers.get(spec)
+    if tok is None:
+        tok = _tokenizers[spec] = _build_tokenizer(spec)
+    return tok
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cost: float) -> None:
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+        }
+
+
+@dataclass
+class Attribution:
+    route: Optional[str] = None
+    course_id: Optional[str] = None
+    user: Optional[str] = None
+    usage: Usage = field(default_factory=Usage)
+
+
+_attribution: contextvars.ContextVar[Optional[Attribution]] = contextvars.ContextVar("llm_attribution", default=None)
+
+
+@contextmanager
+def usage_context(*, route: Optional[str] = None, course_id: Optional[str] = None, user: Optional[str] = None) -> Iterator[Usage]:
+    """Attribute LLM calls made inside the block; yields this request's Usage."""
+    attr = Attribution(route=route, course_id=course_id, user=user)
+    token = _attribution.set(attr)
+    try:
+        yield attr.usage
+    finally:
+        _attribution.reset(token)
+
+
+Key = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class UsageLedger:
+    """In-memory usage aggregated by (route, course_id, user).
+
+    The current window is flushed to `sink` (one dict per key, event
+    "llm_usage") every `flush_interval` seconds, checked on each record,
+    or explicitly via flush(). After start() a background thread also
+    flushes every `flush_interval` seconds, so a quiet period does not hold
+    usage back; close() stops it and flushes what is left (call it on
+    shutdown). Lifetime totals are kept for /metrics.
+    """
+
+    def __init__(
+        self,
+        *,
+        sink: Optional[Callable[[Dict[str, Any]], None]] = None,
+        flush_interval: float = 60.0,
+        input_price_per_1k: float = 0.0,
+        output_price_per_1k: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.sink = sink
+        self.flush_interval = float(flush_interval)
+        self.input_price_per_1k = float(input_price_per_1k)
+        self.output_price_per_1k = float(output_price_per_1k)
+        self._clock = clock
+        self._window: Dict[Key, Usage] = {}
+        self._totals: Dict[Key, Usage] = {}
+        self._lock = threading.Lock()
+        self._last_flush = clock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Flush from a background timer thread from now on."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="llm-usage-flush", daemon=True)
+            self._thread.start()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Stop the timer thread and flush the current window."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            if self._window:
+                self.flush()
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        return (prompt_tokens * self.input_price_per_1k + completion_tokens * self.output_price_per_1k) / 1000.0
+
+    def record(self, prompt_tokens: int, completion_tokens: int, attribution: Optional[Attribution] = None) -> None:
+        attr = attribution or _attribution.get() or Attribution()
+        key: Key = (attr.route, attr.course_id, attr.user)
+        cost = self.cost(prompt_tokens, completion_tokens)
+        with self._lock:
+            self._window.setdefault(key, Usage()).add(prompt_tokens, completion_tokens, cost)
+            self._totals.setdefault(key, Usage()).add(prompt_tokens, completion_tokens, cost)
+            due = self._clock() - self._last_flush >= self.flush_interval
+        attr.usage.add(prompt_tokens, completion_tokens, cost)
+        if due:
+            self.flush()
+
+    def flush(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            window, self._window = self._window, {}
+            self._last_flush = self._clock()
+        entries = [
+            dict({"event": "llm_usage", "route": route, "course_id": course_id, "user": user}, **usage.as_dict())
+            for (route, course_id, user), usage in window.items()
+        ]
+        if self.sink is not None:
+            for entry in entries:
+                try:
+                    self.sink(entry)
+                except Exception:
+                    logger.warning("LLM usage sink failed", exc_info=True)
+        else:
+            for entry in entries:
+                logger.info(json.dumps(entry))
+        return entries
+
+    def totals(self, by: str = "route") -> Dict[str, Dict[str, Any]]:
+        """Lifetime usage grouped by "route", "course_id" or "user"."""
+        idx = {"route": 0, "course_id": 1, "user": 2}[by]
+        out: Dict[str, Usage] = {}
+        with self._lock:
+            for key, usage in self._totals.items():
+                agg = out.setdefault(str(key[idx]), Usage())
+                agg.calls += usage.calls
+                agg.prompt_tokens += usage.prompt_tokens
+                agg.completion_tokens += usage.completion_tokens
+                agg.cost_usd += usage.cost_usd
+        return {k: v.as_dict() for k, v in sorted(out.items())}
+
+
+class MeteredLLM:
+    """Wraps any provider's generate() and records token usage in a UsageLedger."""
+
+    def __init__(self, provider: Any, ledger: Optional[UsageLedger] = None, tokenizer: Optional[Tokenizer] = None):
+        self.provider = provider
+        self.ledger = ledger or get_ledger()
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def generate(self, prompt: str, *args: Any, **kwargs: Any) -> Any:
+        out = self.provider.generate(prompt, *args, **kwargs)
+        if isinstance(out, dict):
+            completion = str(out.get("text") or out.get("answer") or "")
+        else:
+            completion = str(out)
+        context = args[0] if args else kwargs.get("context")
+        prompt_text = prompt
+        if context:
+            prompt_text += "".join(str(b.get("content") or b.get("text") or "") for b in context)
+        self.ledger.record(self.tokenizer.count(prompt_text), self.tokenizer.count(completion))
+        return out
+
+
+# Factory
+
+_ledger: Optional[UsageLedger] = None
+_sink: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def set_ledger_sink(sink: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+    """Sink for the process-wide ledger, applied when get_ledger() creates it (no ledger is built here)."""
+    global _sink
+    _sink = sink
+    if _ledger is not None:
+        _ledger.sink = sink
+
+
+def get_ledger() -> UsageLedger:
+    """Process-wide ledger; prices from LLM_PRICE_{INPUT,OUTPUT}_PER_1K, window from LLM_USAGE_FLUSH_SECONDS.
+
+    Its flush timer is started here (again, after close_ledger()).
+    """
+    global _ledger
+    if _ledger is None:
+        _ledger = UsageLedger(
+            sink=_sink,
+            flush_interval=float(os.environ.get("LLM_USAGE_FLUSH_SECONDS", "60")),
+            input_price_per_1k=float(os.environ.get("LLM_PRICE_INPUT_PER_1K", "0")),
+            output_price_per_1k=float(os.environ.get("LLM_PRICE_OUTPUT_PER_1K", "0")),
+        )
+    _ledger.start()
+    return _ledger
+
+
+def close_ledger() -> None:
+    """Flush the process-wide ledger and stop its timer, if one was created.
+
+    The ledger itself is kept, so its sink and lifetime totals survive.
+    """
+    if _ledger is not None:
+        _ledger.close()
@@ -1,5 +1,7 @@
+import hashlib
 import os
-from typing import List, Dict, Optional, Protocol
+from collections import OrderedDict
+from typing import Any, List, Dict, Optional, Protocol
 
 
 class LLMProvider(Protocol):
@@ -25,9 +27,40 @@ class StubLLM:
       replaced with 'unknown' or '?'.
     - Includes short excerpts from each context block (first 120 chars)
       so responses are inspectable in tests.
+    - Simulates provider-side prompt caching: for prompts that carry
+      `cache_breakpoints` (see llm.prompts.Prompt), the longest prefix seen
+      before counts as a cache hit; `last_cached_chars`, `cache_hits` and
+      `cache_misses` expose the outcome.
     """
 
+    def __init__(self, cache_size: int = 256):
+        self.cache_size = cache_size
+        self._prefix_cache: "OrderedDict[str, None]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.last_cached_chars = 0
+
+    def _simulate_prompt_cache(self, prompt: str) -> None:
+        breakpoints = getattr(prompt, "cache_breakpoints", ())
+        cached = 0
+        for bp in breakpoints:
+            key = hashlib.sha256(prompt[:bp].encode("utf-8")).hexdigest()
+            if key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                cached = bp
+            else:
+                self._prefix_cache[key] = None
+                while len(self._prefix_cache) > self.cache_size:
+                    self._prefix_cache.popitem(last=False)
+        self.last_cached_chars = cached
+        if breakpoints:
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
     def generate(self, prompt: str, context: Optional[List[Dict]] = None) -> str:
+        self._simulate_prompt_cache(prompt)
         ctx = context or []
         # Build deterministic citation tokens [title:page]
         citations = []
@@ -71,6 +104,17 @@ class BedrockLLM:
         self.model_id = model_id or os.environ.get("BEDROCK_MODEL_ID")
         self.region = region or os.environ.get("AWS_REGION")
 
+    def build_messages(self, prompt: str) -> List[Dict[str, Any]]:
+        """Converse-style message content with a cachePoint after each cacheable prefix."""
+        segments = prompt.segments() if hasattr(prompt, "segments") else [(str(prompt), False)]
+        content: List[Dict[str, Any]] = []
+        for text, cacheable in segments:
+            if text:
+                content.append({"text": text})
+            if cacheable:
+                content.append({"cachePoint": {"type": "default"}})
+        return [{"role": "user", "content": content}]
+
     def generate(self, prompt: str, context: Optional[List[Dict]] = None) -> str:
         """Generate a response using Bedrock.
 
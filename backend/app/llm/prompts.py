@@ -0,0 +1,111 @@
+# backend/app/llm/prompts.py
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class Prompt(str):
+    """A rendered prompt string that also carries prompt-cache breakpoints.
+
+    `cache_breakpoints` are character offsets: everything before each offset
+    is byte-identical across requests that share the same template (and
+    course preamble), so providers with prompt caching can reuse it.
+    Providers without caching simply treat the prompt as a plain string.
+    """
+
+    cache_breakpoints: Tuple[int, ...] = ()
+
+    def __new__(cls, text: str, cache_breakpoints: Sequence[int] = ()) -> "Prompt":
+        obj = super().__new__(cls, text)
+        obj.cache_breakpoints = tuple(cache_breakpoints)
+        return obj
+
+    def segments(self) -> List[Tuple[str, bool]]:
+        """Split into (text, cacheable) pieces at the breakpoints."""
+        out: List[Tuple[str, bool]] = []
+        start = 0
+        for bp in self.cache_breakpoints:
+            out.append((str(self[start:bp]), True))
+            start = bp
+        out.append((str(self[start:]), False))
+        return out
+
+
+class PromptTemplate:
+    """Precompiled prompt with a stable prefix and a per-request tail.
+
+    Layout (static first, so the cacheable prefix is as long as possible):
+        system + instructions   | breakpoint
+        course preamble         | breakpoint (only when a preamble is given)
+        context block
+        conversation history    (multi-turn sessions only)
+        question
+
+    The prefix strings are built once (per preamble) and reused, so they are
+    byte-identical across requests.
+    """
+
+    def __init__(self, name: str, *, system: str, instructions: str, context_header: str = "Context:"):
+        self.name = name
+        self.prefix = f"{system}\n\n{instructions}\n\n"
+        self.context_header = context_header
+        self._with_preamble: Dict[str, str] = {}
+
+    def _prefix_for(self, preamble: str) -> str:
+        compiled = self._with_preamble.get(preamble)
+        if compiled is None:
+            compiled = self._with_preamble[preamble] = f"{self.prefix}{preamble.strip()}\n\n"
+        return compiled
+
+    def render(
+        self,
+        question: str,
+        contexts: Sequence[str],
+        *,
+        preamble: Optional[str] = None,
+        history: Optional[str] = None,
+    ) -> Prompt:
+        breakpoints = [len(self.prefix)]
+        head = self.prefix
+        if preamble:
+            head = self._prefix_for(preamble)
+            breakpoints.append(len(head))
+        ctx_block = "\n".join(f"- {c}" for c in contexts if c)
+        convo = f"Conversation so far:\n{history.strip()}\n\n" if history and history.strip() else ""
+        return Prompt(f"{head}{self.context_header}\n{ctx_block}\n\n{convo}Question: {question}\n", breakpoints)
+
+
+ANSWER_TEMPLATE = PromptTemplate(
+    "answer",
+    system="You are a helpful study assistant. Ground answers in provided context.",
+    instructions=(
+        "Use only the context below to answer.\n"
+        "Sources: Provide citations to the retrieved snippets.\n"
+        "Provide a concise response; this is a stubbed answer."
+    ),
+)
+
+_GENERATE_INSTRUCTIONS = "Start your first sentence with 'ANSWER based on' and include the phrase 'stubbed answer'."
+_generate_templates: Dict[str, PromptTemplate] = {}
+
+
+def generate_template(system: Optional[str]) -> PromptTemplate:
+    """Template used by rag.generate_answer, compiled once per system prompt."""
+    key = system or ""
+    tpl = _generate_templates.get(key)
+    if tpl is None:
+        tpl = _generate_templates[key] = PromptTemplate("generate", system=key, instructions=_GENERATE_INSTRUCTIONS)
+    return tpl
+
+
+# Per-course boilerplate (e.g. syllabus conventions) placed after the shared prefix.
+
+_course_preambles: Dict[str, str] = {}
+
+
+def register_course_preamble(course_id: str, text: str) -> None:
+    _course_preambles[course_id] = text
+
+
+def get_course_preamble(course_id: Optional[str]) -> Optional[str]:
+    return _course_preambles.get(course_id) if course_id else None
@@ -1,18 +1,47 @@
 # backend/app/main.py
 from __future__ import annotations
 
-import json
 import os
 import itertools
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, Depends, Header, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field
 
 from .rag import GUARDRAIL_NEED_MORE_SOURCES, answer_query as core_answer_query
-
-app = FastAPI(title="RAGEdu Backend")
+from .ratelimit import estimate_tokens, get_rate_limiter
+from .sessions import ReusedSearch, get_session_store
+from .serialization import FastJSONResponse, Representation, dumps_line, etag_matches
+from .admission import admission_stats, get_controller, limit_concurrency
+from .auth import User as AuthUser, get_cognito_client, get_current_user, get_current_user_optional, require_role
+from .db import get_course_store
+from .ingest import EmbedderMismatchError
+from .jobs import FINAL_STATES, IngestJob, JobManager, get_job_manager, shutdown_job_manager
+from .quests import build_quest_map
+from .llm.accounting import MeteredLLM, close_ledger, get_ledger, set_ledger_sink, usage_context
+from .llm.adapter import get_llm
+from .srs import get_scheduler
+from .warmup import get_warmup, synthetic_queries
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Warm up in the background: /health stays live, /ready flips once done
+    # (failed required checks are retried with backoff, so readiness can recover).
+    warmup = get_warmup()
+    if warmup.started_at is None:
+        warmup.start()
+    get_scheduler().start()
+    yield
+    # Flush buffered state on shutdown; singletons that were never used are not created.
+    warmup.close()  # stop retrying failed warm-up checks
+    get_scheduler().close()  # apply and persist buffered quiz submissions
+    close_ledger()  # emit the last LLM usage window
+    shutdown_job_manager()  # unfinished ingest jobs are requeued on the next start
+
+app = FastAPI(title="RAGEdu Backend", lifespan=_lifespan)
 
 # ---------------- Auth helpers ----------------
 class User(BaseModel):
@@ -31,15 +60,100 @@ class RagAnswerRequest(BaseModel):
     question: Optional[str] = None
     top_k: Optional[int] = None
     course_id: Optional[str] = None
+    decompose: bool = False
+    adaptive: bool = False
+    session_id: Optional[str] = None
 
 class QuizGenerateRequest(BaseModel):
     query: str
     num_questions: int = 5
+    course_id: Optional[str] = None
+
+class QuizResult(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    question_id: Optional[str] = None
+    id: Optional[str] = None
+    correct: Optional[bool] = None
+    quality: Optional[int] = Field(default=None, ge=0, le=5)  # SM-2 grade; overrides `correct`
 
 class QuizSubmitRequest(BaseModel):
     quiz_id: str
-    user_id: str
-    results: List[Dict[str, Any]]
+    user_id: Optional[str] = None  # ignored for scheduling: reviews belong to the token's user
+    results: List[QuizResult]
+
+# Typed responses for hot routes: FastAPI validates/serializes them with
+# pydantic-core and FastJSONResponse renders bytes (see serialization.py).
+# Routes use response_model_exclude_unset so optional keys only appear when set.
+class EvidenceSpan(BaseModel):
+    start: int
+    end: int
+    score: float
+
+class Citation(BaseModel):
+    title: str
+    page: Optional[int] = None
+    snippet: str = ""
+    score: Optional[float] = None
+    spans: Optional[List[EvidenceSpan]] = None
+
+class AnswerMetadata(BaseModel):
+    top_k: int
+    course_id: Optional[str] = None
+    confidence: float
+    k_used: Optional[int] = None
+    session_id: Optional[str] = None
+    turn: Optional[int] = None
+    reused_retrieval: Optional[bool] = None
+
+class RagAnswerResponse(BaseModel):
+    answer: str
+    citations: List[Citation]
+    metadata: AnswerMetadata
+
+class QuizQuestion(BaseModel):
+    id: str
+    type: str
+    prompt: str
+    question: str
+    choices: List[str]
+    distractors: List[str]
+    answer: str
+    spaced_rep: bool
+
+class QuizGenerateResponse(BaseModel):
+    quiz_id: str
+    questions: List[QuizQuestion]
+
+class IngestJobResponse(BaseModel):
+    id: str
+    course_id: str
+    source: str
+    kind: str
+    size: int
+    priority: int
+    status: str
+    stage: Optional[str] = None
+    pages_total: Optional[int] = None
+    pages_done: int
+    chunks: int
+    vectors_written: int
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+# ---------------- Rate limiting ----------------------------------------------
+# Rough per-request LLM budget used for token-based limits.
+_CHUNK_TOKENS = 250
+_ANSWER_TOKENS = 512
+# Larger top_k values are clamped: every retrieved chunk goes into the prompt.
+RAG_MAX_TOP_K = int(os.environ.get("RAG_MAX_TOP_K", "20"))
+
+def _rate_key(request: Request, user: Optional[AuthUser]) -> str:
+    if user is not None and user.sub:
+        return user.sub
+    return f"anon:{request.client.host if request.client else 'unknown'}"
 
 # ---------------- Health: deterministic for both exact-equality tests --------
 @app.get("/health")
@@ -55,6 +169,23 @@ def health():
         return {"ok": True}
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once startup warm-up succeeded, 503 while starting or if a required check failed."""
+    status = get_warmup().status()
+    if status["status"] != "ready":
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/metrics")
+def metrics():
+    """In-process service metrics (admission queue depth, rejections, ...)."""
+    ledger = get_ledger()
+    return {
+        "admission": admission_stats(),
+        "llm_usage": {"by_route": ledger.totals("route"), "by_course": ledger.totals("course_id")},
+    }
+
 # ---------------- Identity / Protected routes --------------------------------
 @app.get("/whoami")
 def whoami(user: User = Depends(get_user)):
@@ -115,8 +246,98 @@ def greeting(authorization: Optional[str] = Header(default=None)):
 # ---------------- RAG API -----------------------------------------------------
 LOG_PATH = Path("/app/logs/app.json")
 
-@app.post("/rag/answer")
-def rag_answer(req: RagAnswerRequest):
+def _log_event(entry: Dict[str, Any]) -> None:
+    """Append one structured JSONL event to LOG_PATH (best effort)."""
+    try:
+        LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with LOG_PATH.open("ab") as f:
+            f.write(dumps_line(entry))
+    except Exception:
+        pass
+
+set_ledger_sink(_log_event)  # the ledger itself is built on first use
+
+# Predictable fake clients for API tests (high scores so API path succeeds)
+class _FakeSearch:
+    def search(self, query: str, *, top_k: int = 3, rerank: bool = False, course_id: Optional[str] = None):
+        # the stub corpus stands in for every course, so scoped queries keep their hits
+        return [
+            {"id": "d1", "title": "Doc 1", "page": 1, "snippet": "Context A", "score": 0.9, "course_id": course_id},
+            {"id": "d2", "title": "Doc 2", "page": 2, "snippet": "Context B", "score": 0.8, "course_id": course_id},
+            {"id": "d3", "title": "Doc 3", "page": 3, "snippet": "Context C", "score": 0.7, "course_id": course_id},
+        ]
+
+class _FakeLLM:
+    def generate(self, prompt: str, *, system: Optional[str] = None) -> str:
+        return "ANSWER based on provided context: stubbed answer."
+
+def _search_client():
+    """Search over the memory-mapped index snapshot when INDEX_SNAPSHOT_PATH is set."""
+    if not os.environ.get("INDEX_SNAPSHOT_PATH"):
+        return _FakeSearch()
+    # imported on first use: the local vector engine is not needed without a snapshot
+    from .snapshot import embedder_for, get_section_index, get_snapshot_index
+    from .vectorstore import LocalSearchClient
+
+    snapshot = get_snapshot_index()
+    if snapshot is None:
+        return _FakeSearch()
+    try:
+        embedder = embedder_for(snapshot)
+    except EmbedderMismatchError as exc:
+        # querying with another model would return confidently wrong neighbours
+        raise HTTPException(status_code=503, detail=str(exc))
+    return LocalSearchClient(get_section_index() or snapshot, embedder)
+
+# ---------------- Startup warm-up ---------------------------------------------
+def _warm_llm():
+    provider = get_llm()
+    if os.environ.get("WARMUP_PROBE_LLM") == "1":
+        provider.generate("ping", [])
+
+def _warm_auth():
+    client = get_cognito_client()
+    jwks = getattr(client, "jwks", None)
+    if jwks is not None:
+        jwks.refresh()
+
+def _warm_search():
+    client = _search_client()
+    embedder = getattr(client, "embedder", None)
+    if embedder is not None:
+        embedder.embed(["warm-up"])
+
+def _warm_caches():
+    get_rate_limiter()
+    get_ledger()
+    get_scheduler()
+    get_controller("rag")
+    get_controller("quiz")
+
+def _warm_queries():
+    client = _search_client()
+    for q in synthetic_queries():
+        core_answer_query(q, search_client=client, llm_client=_FakeLLM(), top_k=3, rerank=True, min_similarity=0.1)
+
+_warmup = get_warmup()
+_warmup.add("llm", _warm_llm)
+_warmup.add("auth_jwks", _warm_auth)
+_warmup.add("search", _warm_search)
+_warmup.add("caches", _warm_caches)
+_warmup.add("synthetic_queries", _warm_queries, required=False)
+
+@app.post(
+    "/rag/answer",
+    response_model=RagAnswerResponse,
+    response_model_exclude_unset=True,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(limit_concurrency("rag"))],
+)
+def rag_answer(
+    req: RagAnswerRequest,
+    request: Request,
+    auth_user: Optional[AuthUser] = Depends(get_current_user_optional),
+):
     # Decide which field is present (tests send either 'query' or 'question')
     used_field = "question" if req.question is not None else ("query" if req.query is not None else None)
     q = (req.query if req.query is not None else req.question)
@@ -136,47 +357,59 @@ def rag_answer(req: RagAnswerRequest):
     top_k = req.top_k if isinstance(req.top_k, int) else 5
     if top_k < 1:
         raise HTTPException(status_code=422, detail="top_k must be >= 1")
-
-    LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-    # Predictable fake clients for API tests (high scores so API path succeeds)
-    class _FakeSearch:
-        def search(self, query: str):
-            return [
-                {"id": "d1", "title": "Doc 1", "page": 1, "snippet": "Context A", "score": 0.9},
-                {"id": "d2", "title": "Doc 2", "page": 2, "snippet": "Context B", "score": 0.8},
-                {"id": "d3", "title": "Doc 3", "page": 3, "snippet": "Context C", "score": 0.7},
-            ]
-
-    class _FakeLLM:
-        def generate(self, prompt: str, *, system: Optional[str] = None) -> str:
-            return "ANSWER based on provided context: stubbed answer."
-
-    res = core_answer_query(
-        q, search_client=_FakeSearch(), llm_client=_FakeLLM(),
-        top_k=top_k, rerank=True, min_similarity=0.1
-    )
+    top_k = min(top_k, RAG_MAX_TOP_K)
+
+    rate_key = _rate_key(request, auth_user)
+
+    # Multi-turn: bounded history, and the previous turn's docs for follow-ups.
+    # Sessions are owned by the signed-in user's sub: the client picks the id,
+    # so an IP-based anonymous owner would let anyone behind that IP read it.
+    session = history = reused = None
+    if req.session_id:
+        if auth_user is None or not auth_user.sub:
+            raise HTTPException(status_code=401, detail="Sessions require a signed-in user")
+        session = get_session_store().get(req.session_id, owner=auth_user.sub)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        history = get_session_store().history(session)
+        reused = get_session_store().reusable_docs(session, q, course_id=req.course_id)
+
+    estimated_tokens = estimate_tokens(q) + estimate_tokens(history or "") + top_k * _CHUNK_TOKENS + _ANSWER_TOKENS
+    get_rate_limiter().check(rate_key, req.course_id, tokens=estimated_tokens)
+
+    search_client = _search_client()
+    with usage_context(route="/rag/answer", course_id=req.course_id, user=rate_key) as usage:
+        res = core_answer_query(
+            q, search_client=ReusedSearch(reused) if reused else search_client, llm_client=MeteredLLM(_FakeLLM()),
+            top_k=top_k, rerank=True, min_similarity=0.1, course_id=req.course_id,
+            decompose=req.decompose and not reused, adaptive=req.adaptive,
+            evidence_embedder=None if reused else getattr(search_client, "embedder", None),
+            history=history,
+        )
+    get_rate_limiter().charge(rate_key, req.course_id, tokens=usage.total_tokens - estimated_tokens)
+    session_meta: Dict[str, Any] = {}
+    if session is not None:
+        if res["answer"] != GUARDRAIL_NEED_MORE_SOURCES:
+            get_session_store().record(session, q, res["answer"], res.get("citations_docs"), course_id=req.course_id)
+        session_meta = {"session_id": session.id, "turn": session.turn_count, "reused_retrieval": bool(reused)}
 
     conf = float(res.get("confidence", 0.9))
 
     # Structured JSONL log
-    try:
-        with LOG_PATH.open("a", encoding="utf-8") as f:
-            f.write(json.dumps({
-                "event": "rag_answer",
-                "route": "/rag/answer",
-                "status": "ok",
-                "q": q,
-                "top_k": top_k
-            }) + "\n")
-    except Exception:
-        pass
+    _log_event({
+        "event": "rag_answer",
+        "route": "/rag/answer",
+        "status": "ok",
+        "q": q,
+        "top_k": top_k,
+        "llm_tokens": usage.total_tokens,
+    })
 
     if res["answer"] == GUARDRAIL_NEED_MORE_SOURCES:
         return {
             "answer": "Not enough context to answer confidently.",
             "citations": [],
-            "metadata": {"top_k": top_k, "course_id": req.course_id, "confidence": 0.0},
+            "metadata": {"top_k": top_k, "course_id": req.course_id, "confidence": 0.0, **session_meta},
         }
 
     citations = res.get("citations") or []
@@ -192,13 +425,67 @@ def rag_answer(req: RagAnswerRequest):
     return {
         "answer": res["answer"],
         "citations": citations,
-        "metadata": {"top_k": top_k, "course_id": req.course_id, "confidence": conf},
+        "metadata": {
+            "top_k": top_k, "course_id": req.course_id, "confidence": conf,
+            "k_used": res.get("k_used", top_k), **session_meta,
+        },
     }
 
+@app.delete("/rag/sessions/{session_id}")
+def rag_session_end(session_id: str, auth_user: AuthUser = Depends(get_current_user)):
+    """Forget a conversation (history, summary and cached retrieval)."""
+    if not auth_user.sub or not get_session_store().drop(session_id, owner=auth_user.sub):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"ok": True}
+
+# ---------------- Course reads (conditional GET) -----------------------------
+# Bodies and ETags are cached next to the stored objects (CourseSyllabusStore),
+# so a matching If-None-Match is answered with 304 without building or
+# serializing anything, and a 200 sends the cached bytes as-is. Reads need a
+# signed-in user; responses are marked private.
+COURSE_CACHE_MAX_AGE = int(os.environ.get("COURSE_CACHE_MAX_AGE", "60"))
+
+def _conditional(rep: Optional[Representation], request: Request, missing: str) -> Response:
+    if rep is None:
+        raise HTTPException(status_code=404, detail=missing)
+    headers = {"ETag": rep.etag, "Cache-Control": f"private, max-age={COURSE_CACHE_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match"), rep.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rep.body, media_type="application/json", headers=headers)
+
+@app.get("/courses/{course_id}")
+def course_get(course_id: str, request: Request, user: AuthUser = Depends(get_current_user)):
+    return _conditional(get_course_store().course_representation(course_id), request, "Course not found")
+
+@app.get("/courses/{course_id}/syllabus")
+def syllabus_get(course_id: str, request: Request, user: AuthUser = Depends(get_current_user)):
+    return _conditional(get_course_store().syllabus_representation(course_id), request, "Syllabus not found")
+
+@app.get("/courses/{course_id}/quest-map")
+def quest_map_get(course_id: str, request: Request, user: AuthUser = Depends(get_current_user)):
+    """Quest map built from the stored syllabus; rebuilt only after the syllabus changes."""
+    rep = get_course_store().derived_representation(
+        course_id, "quest-map", lambda syllabus: build_quest_map(syllabus, course_id=course_id)
+    )
+    return _conditional(rep, request, "Syllabus not found")
+
 # ---------------- Quiz endpoints ---------------------------------------------
-@app.post("/quiz/generate")
-def quiz_generate(req: QuizGenerateRequest):
+@app.post(
+    "/quiz/generate",
+    response_model=QuizGenerateResponse,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(limit_concurrency("quiz"))],
+)
+def quiz_generate(
+    req: QuizGenerateRequest,
+    request: Request,
+    auth_user: Optional[AuthUser] = Depends(get_current_user_optional),
+):
     n = max(1, min(int(req.num_questions), 20))
+    get_rate_limiter().check(
+        _rate_key(request, auth_user), req.course_id,
+        tokens=estimate_tokens(req.query) + n * _ANSWER_TOKENS // 4,
+    )
     qs = [{
         "id": f"q{i+1}",
         "type": "mcq",
@@ -212,8 +499,122 @@ def quiz_generate(req: QuizGenerateRequest):
     return {"quiz_id": "demo-quiz", "questions": qs}
 
 @app.post("/quiz/submit")
-def quiz_submit(req: QuizSubmitRequest):
+def quiz_submit(req: QuizSubmitRequest, auth_user: Optional[AuthUser] = Depends(get_current_user_optional)):
+    """Score a quiz attempt; with a token, also schedule its questions for the token's user."""
     if not req.results:
         raise HTTPException(status_code=400, detail="results required")
-    correct = sum(1 for r in req.results if r.get("correct") is True)
-    return {"ok": True, "score": correct, "total": len(req.results)}
\ No newline at end of file
+    correct = sum(1 for r in req.results if r.correct is True)
+    scheduled = 0
+    if auth_user is not None and auth_user.sub:
+        results = [r.model_dump(exclude_none=True) for r in req.results]
+        scheduled = get_scheduler().submit(auth_user.sub, results, quiz_id=req.quiz_id)
+    return {"ok": True, "score": correct, "total": len(req.results), "scheduled": scheduled}
+
+@app.get("/quiz/due")
+def quiz_due(limit: int = 20, user_id: Optional[str] = None, user: AuthUser = Depends(get_current_user)):
+    """The caller's questions due for review, earliest due date first."""
+    if user_id is not None and user_id != user.sub:
+        raise HTTPException(status_code=403, detail="Can only read your own review schedule")
+    due = get_scheduler().due(user.sub, limit=max(1, min(int(limit), 100)))
+    return {
+        "user_id": user.sub,
+        "due": [
+            {"quiz_id": r.quiz_id, "question_id": r.question_id, "due": r.due, "interval": r.interval, "reps": r.reps}
+            for r in due
+        ],
+    }
+
+# ---------------- Ingestion jobs ----------------------------------------------
+# Uploads are the raw request body: a PDF (application/pdf) or plain text with
+# pages separated by form feeds (text/plain). The work runs on jobs.JobManager
+# workers, so the request returns as soon as the document is spooled. The body
+# is streamed to the spool directory and refused with 413 past INGEST_MAX_BYTES,
+# whether or not the client sent a Content-Length.
+# Only the professor who owns a course (the course record's "owner", their
+# auth `sub`) can upload to it or see and cancel its jobs.
+INGEST_MAX_BYTES = int(os.environ.get("INGEST_MAX_BYTES", str(100 * 1024 * 1024)))
+
+def _job_response(job: IngestJob) -> Dict[str, Any]:
+    data = job.to_dict()
+    data.pop("path", None)
+    data.pop("large", None)
+    return data
+
+def _owns_course(user: AuthUser, course_id: str) -> bool:
+    course = get_course_store().get_course(course_id)
+    return course is not None and bool(user.sub) and course.get("owner") == user.sub
+
+def _require_course_owner(user: AuthUser, course_id: str) -> None:
+    if get_course_store().get_course(course_id) is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if not _owns_course(user, course_id):
+        raise HTTPException(status_code=403, detail="Not the owner of this course")
+
+def _jobs() -> JobManager:
+    try:
+        return get_job_manager()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+def _owned_job(job_id: str, user: AuthUser) -> IngestJob:
+    job = _jobs().get(job_id)
+    if job is None or not _owns_course(user, job.course_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/ingest/jobs", status_code=202, response_model=IngestJobResponse)
+async def ingest_job_create(
+    request: Request,
+    course_id: str,
+    filename: Optional[str] = None,
+    priority: Optional[int] = None,
+    user: AuthUser = Depends(require_role("professor")),
+):
+    await run_in_threadpool(_require_course_owner, user, course_id)
+    content_type = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    if content_type == "application/pdf" or (filename or "").lower().endswith(".pdf"):
+        kind = "pdf"
+    elif content_type.startswith("text/"):
+        kind = "text"
+    else:
+        raise HTTPException(status_code=415, detail="Upload a PDF (application/pdf) or text/plain pages")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > INGEST_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Document too large")
+    jobs = await run_in_threadpool(_jobs)
+    part = jobs.upload_path()
+    try:
+        size = 0
+        with part.open("wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > INGEST_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail="Document too large")
+                await run_in_threadpool(f.write, chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Empty document")
+        job = await run_in_threadpool(
+            jobs.submit_file, course_id, part,
+            source=filename or f"upload.{'pdf' if kind == 'pdf' else 'txt'}", kind=kind, priority=priority,
+        )
+    finally:
+        part.unlink(missing_ok=True)  # already moved into the spool when submitted
+    return _job_response(job)
+
+@app.get("/ingest/jobs", response_model=List[IngestJobResponse])
+def ingest_job_list(course_id: Optional[str] = None, user: AuthUser = Depends(require_role("professor"))):
+    if course_id is not None:
+        _require_course_owner(user, course_id)
+    return [_job_response(j) for j in _jobs().list(course_id) if _owns_course(user, j.course_id)]
+
+@app.get("/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+def ingest_job_get(job_id: str, user: AuthUser = Depends(require_role("professor"))):
+    return _job_response(_owned_job(job_id, user))
+
+@app.delete("/ingest/jobs/{job_id}", response_model=IngestJobResponse)
+def ingest_job_cancel(job_id: str, user: AuthUser = Depends(require_role("professor"))):
+    """Cancel a queued or running job; 409 once it has already finished."""
+    job = _owned_job(job_id, user)
+    if job.status in FINAL_STATES:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return _job_response(_jobs().cancel(job_id) or job)
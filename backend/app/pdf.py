@@ -0,0 +1,817 @@
+# backend/app/pdf.py
+"""Pure-Python PDF text extraction for ingestion.
+
+Stdlib only. The extractor:
+- parses the object table, including compressed object streams;
+- walks the page tree;
+- decodes Flate/ASCIIHex/ASCII85 content streams, including Form XObjects;
+- maps glyph codes through ToUnicode CMaps when present.
+
+This recovers the reading-order text of ordinary lecture PDFs. Scanned,
+image-only pages yield no text, and neither does text set in CID fonts that
+have no ToUnicode map.
+
+Pages are extracted in worker processes and streamed back in page order
+(see extract_pages). A JSONL checkpoint stores each page's text keyed by
+the hash of its raw content. An interrupted run resumes from it, and
+re-ingesting a revised PDF only re-extracts the pages that changed.
+
+Usage (from backend/):
+    python -m app.pdf slides.pdf --course CS101 > chunks.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .ingest import chunk_pages
+
+if TYPE_CHECKING:
+    from .dedup import NearDuplicateIndex
+
+# -----------------------------------------------------------------------------
+# Lexer / object parser
+# -----------------------------------------------------------------------------
+_WS_RE = re.compile(rb"(?:[\s\x00]+|%[^\r\n]*)+")
+_REGULAR_RE = re.compile(rb"[^\s\x00()<>\[\]{}/%]+")
+_NUM_RE = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)$")
+_HEX_JUNK_RE = re.compile(rb"[^0-9A-Fa-f]")
+_NAME_ESCAPE_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_ESCAPES = {ord("n"): 10, ord("r"): 13, ord("t"): 9, ord("b"): 8, ord("f"): 12, ord("("): 40, ord(")"): 41, ord("\\"): 92}
+
+
+class Name(str):
+    """A PDF name object (/Type -> Name("Type"))."""
+
+
+@dataclass(frozen=True)
+class Ref:
+    num: int
+    gen: int = 0
+
+
+@dataclass
+class Stream:
+    dict: Dict[str, Any]
+    raw: bytes
+
+
+Token = Tuple[str, Any]
+
+
+def _hex_bytes(raw: bytes) -> bytes:
+    hx = _HEX_JUNK_RE.sub(b"", raw)
+    if len(hx) % 2:
+        hx += b"0"
+    return bytes.fromhex(hx.decode("ascii"))
+
+
+class _Lexer:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def token(self) -> Optional[Token]:
+        d = self.data
+        m = _WS_RE.match(d, self.pos)
+        p = m.end() if m else self.pos
+        if p >= len(d):
+            self.pos = p
+            return None
+        c = d[p:p + 1]
+        if c == b"(":
+            self.pos = p
+            return ("str", self._literal())
+        if c == b"<":
+            if d[p + 1:p + 2] == b"<":
+                self.pos = p + 2
+                return ("<<", None)
+            end = d.find(b">", p)
+            end = len(d) if end < 0 else end
+            self.pos = end + 1
+            return ("str", _hex_bytes(d[p + 1:end]))
+        if c == b">" and d[p + 1:p + 2] == b">":
+            self.pos = p + 2
+            return (">>", None)
+        if c in (b"[", b"]", b"{", b"}"):
+            self.pos = p + 1
+            return (c.decode("ascii"), None)
+        if c == b"/":
+            m = _REGULAR_RE.match(d, p + 1)
+            raw = m.group(0) if m else b""
+            self.pos = p + 1 + len(raw)
+            raw = _NAME_ESCAPE_RE.sub(lambda g: bytes([int(g.group(1), 16)]), raw)
+            return ("name", Name(raw.decode("latin-1")))
+        m = _REGULAR_RE.match(d, p)
+        if not m:
+            self.pos = p + 1
+            return ("kw", c)
+        word = m.group(0)
+        self.pos = m.end()
+        if _NUM_RE.match(word):
+            return ("num", float(word) if b"." in word else int(word))
+        return ("kw", word)
+
+    def _literal(self) -> bytes:
+        d, i, n = self.data, self.pos + 1, len(self.data)
+        depth = 1
+        out = bytearray()
+        while i < n:
+            c = d[i]
+            if c == 0x5C:  # backslash escape
+                i += 1
+                if i >= n:
+                    break
+                e = d[i]
+                if e in _ESCAPES:
+                    out.append(_ESCAPES[e])
+                    i += 1
+                elif 0x30 <= e <= 0x37:
+                    j = i
+                    while j < min(i + 3, n) and 0x30 <= d[j] <= 0x37:
+                        j += 1
+                    out.append(int(d[i:j], 8) & 0xFF)
+                    i = j
+                elif e == 0x0D:  # line continuation
+                    i += 2 if d[i + 1:i + 2] == b"\n" else 1
+                elif e == 0x0A:
+                    i += 1
+                else:
+                    out.append(e)
+                    i += 1
+                continue
+            if c == 0x28:
+                depth += 1
+            elif c == 0x29:
+                depth -= 1
+                if depth == 0:
+                    i += 1
+                    break
+            out.append(c)
+            i += 1
+        self.pos = i
+        return bytes(out)
+
+    def value(self, tok: Optional[Token] = None) -> Any:
+        if tok is None:
+            tok = self.token()
+            if tok is None:
+                return None
+        kind, v = tok
+        if kind == "num":
+            if isinstance(v, int) and v >= 0:
+                save = self.pos
+                t2 = self.token()
+                if t2 is not None and t2[0] == "num" and isinstance(t2[1], int):
+                    if self.token() == ("kw", b"R"):
+                        return Ref(v, t2[1])
+                self.pos = save
+            return v
+        if kind == "[":
+            items: List[Any] = []
+            while True:
+                t = self.token()
+                if t is None or t[0] == "]":
+                    return items
+                items.append(self.value(t))
+        if kind == "<<":
+            out: Dict[str, Any] = {}
+            while True:
+                t = self.token()
+                if t is None or t[0] == ">>":
+                    return out
+                if t[0] == "name":
+                    out[t[1]] = self.value()
+        if kind == "kw":
+            return {b"true": True, b"false": False, b"null": None}.get(v, v)
+        return v
+
+
+# -----------------------------------------------------------------------------
+# Stream filters
+# -----------------------------------------------------------------------------
+# Upper bound on the decoded size of one Flate stream (decompression bombs).
+MAX_INFLATED_BYTES = int(os.environ.get("PDF_MAX_STREAM_BYTES", str(64 * 1024 * 1024)))
+
+
+class StreamTooLargeError(ValueError):
+    """A stream inflates past MAX_INFLATED_BYTES; the page (or document) fails."""
+
+
+def _inflate(data: bytes, max_length: Optional[int] = None) -> bytes:
+    limit = MAX_INFLATED_BYTES if max_length is None else int(max_length)
+    d = zlib.decompressobj()
+    try:  # truncated input or trailing garbage: keep what decodes
+        out = d.decompress(data, limit)
+    except zlib.error:
+        return b""
+    if d.unconsumed_tail:
+        raise StreamTooLargeError(f"Flate stream inflates past {limit} bytes")
+    return out
+
+
+def _png_unpredict(data: bytes, columns: int, bpp: int) -> bytes:
+    row_len = columns * bpp
+    out = bytearray()
+    prev = bytearray(row_len)
+    for r in range(0, len(data), row_len + 1):
+        ftype, row = data[r], bytearray(data[r + 1:r + 1 + row_len])
+        for i in range(len(row)):
+            left = row[i - bpp] if i >= bpp else 0
+            up = prev[i]
+            if ftype == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif ftype == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif ftype == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif ftype == 4:
+                ul = prev[i - bpp] if i >= bpp else 0
+                pa, pb, pc = abs(up - ul), abs(left - ul), abs(left + up - 2 * ul)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else ul)) & 0xFF
+        out += row
+        prev = row
+    return bytes(out)
+
+
+def decode_stream(stream: Stream, doc: "PdfDocument") -> Optional[bytes]:
+    """Decoded stream bytes, or None when a filter is unsupported (e.g. image codecs)."""
+    filters = doc.resolve(stream.dict.get("Filter") or stream.dict.get("F"))
+    parms = doc.resolve(stream.dict.get("DecodeParms") or stream.dict.get("DP"))
+    if filters is None:
+        return stream.raw
+    if not isinstance(filters, list):
+        filters, parms = [filters], [parms]
+    elif not isinstance(parms, list):
+        parms = [parms] * len(filters)
+    data = stream.raw
+    for f, p in zip(filters, parms):
+        f, p = doc.resolve(f), doc.resolve(p)
+        if f in ("FlateDecode", "Fl"):
+            data = _inflate(data)
+            if isinstance(p, dict) and int(p.get("Predictor", 1)) >= 10:
+                bpp = max(1, int(p.get("Colors", 1)) * int(p.get("BitsPerComponent", 8)) // 8)
+                data = _png_unpredict(data, int(p.get("Columns", 1)), bpp)
+        elif f in ("ASCIIHexDecode", "AHx"):
+            end = data.find(b">")
+            data = _hex_bytes(data if end < 0 else data[:end])
+        elif f in ("ASCII85Decode", "A85"):
+            body = data.strip()
+            if body.startswith(b"<~"):
+                body = body[2:]
+            end = body.find(b"~>")
+            data = base64.a85decode(body if end < 0 else body[:end], ignorechars=b" \t\n\r\x0b\x0c")
+        else:
+            return None
+    return data
+
+
+# -----------------------------------------------------------------------------
+# Document
+# -----------------------------------------------------------------------------
+_OBJ_HEAD_RE = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_ROOT_RE = re.compile(rb"/Root\s+(\d+)\s+(\d+)\s+R")
+
+
+class PdfDocument:
+    """Random access to the objects and pages of one PDF held in memory.
+
+    Objects are located by scanning for "N G obj" headers (stream bodies
+    are skipped, later definitions win, as with incremental updates) rather
+    than trusting the xref table, so slightly damaged files still open.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._offsets: Dict[int, int] = {}
+        self._in_objstm: Dict[int, Tuple[int, int]] = {}
+        self._objstm_data: Dict[int, bytes] = {}
+        self._cache: Dict[int, Any] = {}
+        self._fonts: Dict[Any, "_Font"] = {}
+        self._pages: Optional[List[Dict[str, Any]]] = None
+        self._scan()
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "PdfDocument":
+        return cls(Path(path).read_bytes())
+
+    def _scan(self) -> None:
+        d, pos = self.data, 0
+        objstms: List[int] = []
+        while True:
+            m = _OBJ_HEAD_RE.search(d, pos)
+            if not m:
+                break
+            num, start = int(m.group(1)), m.end()
+            self._offsets[num] = start
+            end = d.find(b"endobj", start)
+            s = d.find(b"stream", start)
+            if s != -1 and (end == -1 or s < end):
+                if b"/ObjStm" in d[start:s]:
+                    objstms.append(num)
+                es = d.find(b"endstream", s)
+                end = d.find(b"endobj", es if es != -1 else s)
+            pos = len(d) if end == -1 else end + 6
+        for num in objstms:
+            stm = self.get(num)
+            data = decode_stream(stm, self) if isinstance(stm, Stream) else None
+            if not data:
+                continue
+            self._objstm_data[num] = data
+            first = int(self.resolve(stm.dict.get("First", 0)) or 0)
+            lx = _Lexer(data)
+            for _ in range(int(self.resolve(stm.dict.get("N", 0)) or 0)):
+                onum, off = lx.value(), lx.value()
+                if isinstance(onum, int) and isinstance(off, int) and onum not in self._offsets:
+                    self._in_objstm[onum] = (num, first + off)
+
+    def get(self, num: int) -> Any:
+        if num in self._cache:
+            return self._cache[num]
+        self._cache[num] = None  # guards against reference cycles while parsing
+        obj: Any = None
+        if num in self._offsets:
+            lx = _Lexer(self.data, self._offsets[num])
+            obj = lx.value()
+            if isinstance(obj, dict) and lx.token() == ("kw", b"stream"):
+                obj = Stream(obj, self._stream_bytes(obj, lx.pos))
+        elif num in self._in_objstm:
+            snum, off = self._in_objstm[num]
+            obj = _Lexer(self._objstm_data[snum], off).value()
+        self._cache[num] = obj
+        return obj
+
+    def resolve(self, value: Any) -> Any:
+        seen = 0
+        while isinstance(value, Ref) and seen < 32:
+            value = self.get(value.num)
+            seen += 1
+        return value
+
+    def _stream_bytes(self, sdict: Dict[str, Any], pos: int) -> bytes:
+        d = self.data
+        if d[pos:pos + 2] == b"\r\n":
+            pos += 2
+        elif d[pos:pos + 1] in (b"\n", b"\r"):
+            pos += 1
+        length = self.resolve(sdict.get("Length"))
+        if isinstance(length, int) and d[pos + length:pos + length + 32].lstrip().startswith(b"endstream"):
+            return d[pos:pos + length]
+        end = d.find(b"endstream", pos)
+        return d[pos:len(d) if end < 0 else end].rstrip(b"\r\n")
+
+    # -- pages -----------------------------------------------------------------
+    def pages(self) -> List[Dict[str, Any]]:
+        """Page dictionaries in document order (inherited Resources filled in)."""
+        if self._pages is not None:
+            return self._pages
+        out: List[Dict[str, Any]] = []
+        roots = list(_ROOT_RE.finditer(self.data))
+        catalog = self.resolve(Ref(int(roots[-1].group(1)))) if roots else None
+        if isinstance(catalog, dict):
+            self._walk(catalog.get("Pages"), None, out, set())
+        if not out:
+            for num in sorted(set(self._offsets) | set(self._in_objstm)):
+                obj = self.get(num)
+                if isinstance(obj, dict) and obj.get("Type") == "Page":
+                    out.append(obj)
+        self._pages = out
+        return out
+
+    def _walk(self, node_ref: Any, resources: Any, out: List[Dict[str, Any]], seen: set) -> None:
+        if isinstance(node_ref, Ref):
+            if node_ref.num in seen:
+                return
+            seen.add(node_ref.num)
+        node = self.resolve(node_ref)
+        if not isinstance(node, dict):
+            return
+        resources = node.get("Resources", resources)
+        kids = self.resolve(node.get("Kids"))
+        if node.get("Type") != "Page" and isinstance(kids, list):
+            for kid in kids:
+                self._walk(kid, resources, out, seen)
+        else:
+            out.append(dict(node, Resources=resources))
+
+    def page_hash(self, page: Dict[str, Any]) -> str:
+        """Hash of everything that determines a page's text: raw content, forms and font maps."""
+        h = hashlib.sha1()
+        for s in self._contents(page.get("Contents")):
+            h.update(s.raw)
+        self._hash_resources(page.get("Resources"), h, 0)
+        return h.hexdigest()
+
+    def _hash_resources(self, resources: Any, h: Any, depth: int) -> None:
+        res = self.resolve(resources)
+        if not isinstance(res, dict) or depth > 3:
+            return
+        fonts = self.resolve(res.get("Font")) or {}
+        for name in sorted(fonts):
+            font = self.resolve(fonts[name])
+            if isinstance(font, dict):
+                h.update(f"{name}:{font.get('BaseFont')}:{font.get('Encoding')}".encode("utf-8", "replace"))
+                tu = self.resolve(font.get("ToUnicode"))
+                if isinstance(tu, Stream):
+                    h.update(tu.raw)
+        xobjects = self.resolve(res.get("XObject")) or {}
+        for name in sorted(xobjects):
+            xo = self.resolve(xobjects[name])
+            if isinstance(xo, Stream) and xo.dict.get("Subtype") == "Form":
+                h.update(xo.raw)
+                self._hash_resources(xo.dict.get("Resources"), h, depth + 1)
+
+    def _contents(self, contents: Any) -> List[Stream]:
+        contents = self.resolve(contents)
+        items = contents if isinstance(contents, list) else [contents]
+        return [s for s in (self.resolve(x) for x in items) if isinstance(s, Stream)]
+
+    def font(self, ref: Any) -> Optional["_Font"]:
+        key = ref if isinstance(ref, Ref) else id(ref)
+        font = self._fonts.get(key)
+        if font is None:
+            fdict = self.resolve(ref)
+            if not isinstance(fdict, dict):
+                return None
+            font = self._fonts[key] = _Font(fdict, self)
+        return font
+
+
+# -----------------------------------------------------------------------------
+# Fonts and text
+# -----------------------------------------------------------------------------
+_HEXPAIR_RE = re.compile(rb"<([0-9A-Fa-f\s]+)>\s*<([0-9A-Fa-f\s]*)>")
+_BFRANGE_RE = re.compile(rb"<([0-9A-Fa-f]+)>\s*<([0-9A-Fa-f]+)>\s*(<[0-9A-Fa-f\s]*>|\[[^\]]*\])")
+
+
+def _utf16(raw: bytes) -> str:
+    b = _hex_bytes(raw)
+    return b.decode("utf-16-be", "ignore") if len(b) >= 2 else b.decode("latin-1")
+
+
+def parse_cmap(data: bytes) -> Tuple[Dict[int, str], int]:
+    """ToUnicode CMap -> ({code: text}, code width in bytes)."""
+    mapping: Dict[int, str] = {}
+    m = re.search(rb"begincodespacerange\s*<([0-9A-Fa-f]+)>", data)
+    width = max(1, len(m.group(1)) // 2) if m else 1
+    for block in re.findall(rb"beginbfchar(.*?)endbfchar", data, re.S):
+        for src, dst in _HEXPAIR_RE.findall(block):
+            mapping[int(_HEX_JUNK_RE.sub(b"", src), 16)] = _utf16(dst)
+    for block in re.findall(rb"beginbfrange(.*?)endbfrange", data, re.S):
+        for lo_hex, hi_hex, dst in _BFRANGE_RE.findall(block):
+            lo, hi = int(lo_hex, 16), int(hi_hex, 16)
+            if dst.startswith(b"["):
+                for i, item in enumerate(re.findall(rb"<([0-9A-Fa-f\s]*)>", dst)):
+                    mapping[lo + i] = _utf16(item)
+                continue
+            base = _hex_bytes(dst[1:-1])
+            start, size = int.from_bytes(base, "big") if base else 0, max(2, len(base))
+            for code in range(lo, min(hi, lo + 0xFFFF) + 1):
+                mapping[code] = (start + code - lo).to_bytes(size, "big").decode("utf-16-be", "ignore")
+    return mapping, width
+
+
+class _Font:
+    def __init__(self, fdict: Dict[str, Any], doc: PdfDocument):
+        self.cmap: Optional[Dict[int, str]] = None
+        self.width = 2 if fdict.get("Subtype") == "Type0" else 1
+        tu = doc.resolve(fdict.get("ToUnicode"))
+        if isinstance(tu, Stream):
+            data = decode_stream(tu, doc)
+            if data:
+                self.cmap, self.width = parse_cmap(data)
+
+    def decode(self, s: bytes) -> str:
+        if self.cmap is not None:
+            w = self.width
+            out = []
+            for i in range(0, len(s) - w + 1, w):
+                code = int.from_bytes(s[i:i + w], "big")
+                out.append(self.cmap.get(code) or (chr(code) if w == 1 and 32 <= code < 127 else ""))
+            return "".join(out)
+        if self.width == 2:  # CID font without ToUnicode: codes are glyph ids, not text
+            return ""
+        try:
+            return s.decode("cp1252")
+        except UnicodeDecodeError:
+            return s.decode("latin-1")
+
+
+def _num(v: Any) -> float:
+    return float(v) if isinstance(v, (int, float)) else 0.0
+
+
+def _skip_inline_image(data: bytes, pos: int) -> int:
+    """Position after the EI that ends an inline image started by BI ... ID."""
+    while True:
+        i = data.find(b"EI", pos)
+        if i < 0:
+            return len(data)
+        if data[i - 1:i].isspace() and (i + 2 >= len(data) or data[i + 2:i + 3].isspace()):
+            return i + 2
+        pos = i + 2
+
+
+def _content_text(doc: PdfDocument, data: bytes, resources: Any, depth: int = 0) -> str:
+    res = doc.resolve(resources)
+    res = res if isinstance(res, dict) else {}
+    fonts = doc.resolve(res.get("Font")) or {}
+    xobjects = doc.resolve(res.get("XObject")) or {}
+    out: List[str] = []
+    font: Optional[_Font] = None
+    last_y: Optional[float] = None
+    operands: List[Any] = []
+
+    def newline() -> None:
+        if out and not out[-1].endswith("\n"):
+            out.append("\n")
+
+    def show(s: Any) -> None:
+        if isinstance(s, bytes):
+            out.append(font.decode(s) if font is not None else s.decode("latin-1"))
+
+    lx = _Lexer(data)
+    while True:
+        tok = lx.token()
+        if tok is None:
+            break
+        if tok[0] != "kw":
+            operands.append(lx.value(tok))
+            continue
+        op = tok[1]
+        if op == b"ID":
+            lx.pos = _skip_inline_image(data, lx.pos)
+        elif op == b"Tf" and len(operands) >= 2 and isinstance(operands[-2], str):
+            font = doc.font(fonts.get(operands[-2]))
+        elif op == b"Tj" and operands:
+            show(operands[-1])
+        elif op in (b"'", b'"') and operands:
+            newline()
+            show(operands[-1])
+        elif op == b"TJ" and operands and isinstance(operands[-1], list):
+            for item in operands[-1]:
+                if isinstance(item, bytes):
+                    show(item)
+                elif isinstance(item, (int, float)) and item < -200:
+                    out.append(" ")
+        elif op in (b"Td", b"TD") and len(operands) >= 2:
+            if abs(_num(operands[-1])) > 0.01:
+                newline()
+            elif _num(operands[-2]) > 0:
+                out.append(" ")
+        elif op == b"T*":
+            newline()
+        elif op == b"Tm" and len(operands) >= 6:
+            y = _num(operands[-1])
+            if last_y is not None and abs(y - last_y) > 0.01:
+                newline()
+            else:
+                out.append(" ")
+            last_y = y
+        elif op == b"ET":
+            newline()
+        elif op == b"Do" and operands and depth < 3:
+            xo = doc.resolve(xobjects.get(operands[-1]))
+            if isinstance(xo, Stream) and xo.dict.get("Subtype") == "Form":
+                inner = decode_stream(xo, doc)
+                if inner:
+                    newline()
+                    out.append(_content_text(doc, inner, xo.dict.get("Resources", res), depth + 1))
+                    newline()
+        operands = []
+    return "".join(out)
+
+
+def _normalize(text: str) -> str:
+    lines = (re.sub(r"[ \t\u00a0]+", " ", ln).strip() for ln in text.split("\n"))
+    return "\n".join(ln for ln in lines if ln)
+
+
+def extract_page_text(doc: PdfDocument, page: Dict[str, Any]) -> str:
+    parts = [decode_stream(s, doc) or b"" for s in doc._contents(page.get("Contents"))]
+    return _normalize(_content_text(doc, b"\n".join(parts), page.get("Resources")))
+
+
+# -----------------------------------------------------------------------------
+# Parallel, resumable extraction
+# -----------------------------------------------------------------------------
+@dataclass
+class ExtractedPage:
+    number: int  # 1-based
+    text: str
+    hash: str
+    reused: bool = False  # True when the text came from the checkpoint (page unchanged)
+    total: Optional[int] = None  # page count of the document
+
+
+class PageCheckpoint:
+    """Append-only JSONL of extracted pages ({"page", "hash", "text"}).
+
+    Each page is flushed as soon as it is extracted, so a crashed run loses
+    at most the pages in flight. The file is compacted when a run completes.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.pages: Dict[int, Tuple[str, str]] = {}
+        self._fh: Any = None
+        self._torn = False
+        if self.path.exists():
+            raw = self.path.read_text(encoding="utf-8")
+            self._torn = bool(raw) and not raw.endswith("\n")
+            for line in raw.splitlines():
+                try:
+                    row = json.loads(line)
+                    self.pages[int(row["page"])] = (str(row["hash"]), str(row["text"]))
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn last line from an interrupted run
+
+    def get(self, page: int, page_hash: str) -> Optional[str]:
+        hit = self.pages.get(page)
+        return hit[1] if hit is not None and hit[0] == page_hash else None
+
+    def append(self, page: int, page_hash: str, text: str) -> None:
+        self.pages[page] = (page_hash, text)
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = self.path.open("a", encoding="utf-8")
+            if self._torn:
+                self._fh.write("\n")
+        self._fh.write(json.dumps({"page": page, "hash": page_hash, "text": text}, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def compact(self, page_count: int) -> None:
+        self.close()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for page in sorted(p for p in self.pages if p <= page_count):
+                h, text = self.pages[page]
+                f.write(json.dumps({"page": page, "hash": h, "text": text}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self._torn = False
+
+
+_worker_doc: Optional[PdfDocument] = None
+
+
+def _init_worker(path: str) -> None:
+    global _worker_doc
+    _worker_doc = PdfDocument.open(path)
+
+
+def _extract_in_worker(index: int) -> str:
+    assert _worker_doc is not None
+    return extract_page_text(_worker_doc, _worker_doc.pages()[index])
+
+
+def extract_pages(
+    path: Union[str, Path],
+    *,
+    workers: Optional[int] = None,
+    checkpoint: Union[str, Path, None] = None,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[ExtractedPage]:
+    """Yield the text of every page of the PDF at `path`, in page order.
+
+    Pages whose content hash matches the `checkpoint` are reused without
+    re-extraction (reused=True). The rest go to a pool of `workers`
+    processes (default: CPU count; 0/1 extracts in-process), at most
+    `max_in_flight` at a time, and are yielded in order as they complete.
+    A page with a stream that inflates past MAX_INFLATED_BYTES
+    (PDF_MAX_STREAM_BYTES) raises StreamTooLargeError naming the page.
+    """
+    doc = PdfDocument.open(path)
+    pages = doc.pages()
+    hashes = [doc.page_hash(p) for p in pages]
+    state = PageCheckpoint(checkpoint) if checkpoint is not None else None
+    cached: List[Optional[str]] = [state.get(i + 1, h) if state else None for i, h in enumerate(hashes)]
+    todo: Deque[int] = deque(i for i, text in enumerate(cached) if text is None)
+
+    n_workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    pool = None
+    if n_workers > 1 and len(todo) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(n_workers, len(todo)), initializer=_init_worker, initargs=(str(path),))
+    window = max_in_flight or max(1, n_workers) * 4
+    futures: Dict[int, Future] = {}
+    try:
+        for i, page in enumerate(pages):
+            if cached[i] is not None:
+                yield ExtractedPage(i + 1, cached[i], hashes[i], reused=True, total=len(pages))
+                continue
+            try:
+                if pool is None:
+                    text = extract_page_text(doc, page)
+                else:
+                    while todo and len(futures) < window:
+                        j = todo.popleft()
+                        futures[j] = pool.submit(_extract_in_worker, j)
+                    text = futures.pop(i).result()
+            except StreamTooLargeError as exc:
+                raise StreamTooLargeError(f"page {i + 1}: {exc}") from None
+            if state is not None:
+                state.append(i + 1, hashes[i], text)
+            yield ExtractedPage(i + 1, text, hashes[i], total=len(pages))
+        if state is not None:
+            state.compact(len(pages))
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if state is not None:
+            state.close()
+
+
+def pdf_to_chunks(
+    path: Union[str, Path],
+    *,
+    course_id: str,
+    max_chars: int = 1000,
+    workers: Optional[int] = None,
+    checkpoint: Union[str, Path, None] = None,
+    skip_reused: bool = False,
+    dedup: Optional["NearDuplicateIndex"] = None,
+) -> List[Dict[str, Any]]:
+    """Extract a PDF and stream its pages into ingest.chunk_pages.
+
+    Chunks carry the PDF file name as `source`. With skip_reused=True pages
+    unchanged since the checkpoint produce no chunks (page numbering is
+    preserved), so only revised pages are re-embedded and re-indexed.
+    Passing a dedup.NearDuplicateIndex (shared across the PDFs of a course
+    pack) drops near-duplicate chunks. Their references are kept in
+    `dedup.references` under the canonical chunk's id, which may belong to
+    an earlier PDF: call dedup.attach() on all chunks before indexing them.
+    """
+    pages = extract_pages(path, workers=workers, checkpoint=checkpoint)
+    chunks = chunk_pages((("" if skip_reused and p.reused else p.text) for p in pages), course_id=course_id, max_chars=max_chars)
+    source = Path(path).name
+    for chunk in chunks:
+        chunk["source"] = source
+        chunk["metadata"]["source"] = source
+    if dedup is not None:
+        from .dedup import dedup_chunks
+
+        chunks = dedup_chunks(chunks, index=dedup).unique
+    return chunks
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from .serialization import dumps_line
+
+    parser = argparse.ArgumentParser(description="Extract PDFs into course chunks (JSONL on stdout)")
+    parser.add_argument("pdf", type=Path, nargs="+")
+    parser.add_argument("--course", required=True, help="course_id stored on every chunk")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="page checkpoint (default: <pdf>.pages.jsonl)")
+    parser.add_argument("--max-chars", type=int, default=1000)
+    parser.add_argument("--changed-only", action="store_true", help="emit chunks only for pages changed since the checkpoint")
+    parser.add_argument("--dedup", action="store_true", help="drop near-duplicate chunks across the given PDFs")
+    args = parser.parse_args(argv)
+    if args.checkpoint is not None and len(args.pdf) > 1:
+        parser.error("--checkpoint needs a single PDF")
+
+    dedup = None
+    if args.dedup:
+        from .dedup import NearDuplicateIndex
+
+        dedup = NearDuplicateIndex()
+    out = sys.stdout.buffer
+    pending: List[Dict[str, Any]] = []
+    for pdf_path in args.pdf:
+        chunks = pdf_to_chunks(
+            pdf_path,
+            course_id=args.course,
+            max_chars=args.max_chars,
+            workers=args.workers,
+            checkpoint=args.checkpoint or pdf_path.with_name(pdf_path.name + ".pages.jsonl"),
+            skip_reused=args.changed_only,
+            dedup=dedup,
+        )
+        if dedup is None:
+            for chunk in chunks:
+                out.write(dumps_line(chunk))
+        else:
+            pending.extend(chunks)  # a later PDF may still add references to these
+    if dedup is not None:
+        dedup.attach(pending)
+        for chunk in pending:
+            out.write(dumps_line(chunk))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
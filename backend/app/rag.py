@@ -2,7 +2,15 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Protocol, Sequence, TypedDict, Optional
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Protocol, Sequence, Tuple, TypedDict, Optional
+
+from .evidence import select_evidence
+from .llm.prompts import ANSWER_TEMPLATE, generate_template, get_course_preamble
+
+logger = logging.getLogger(__name__)
 
 # Returned by guardrail when evidence quality is too low.
 GUARDRAIL_NEED_MORE_SOURCES = "NEED_MORE_SOURCES"
@@ -17,6 +25,7 @@ GUARDRAIL_NEED_MORE_SOURCES = "NEED_MORE_SOURCES"
 class OpenSearchClientInterface(Protocol):
     def index(self, index: str, document: Dict[str, Any]) -> Any: ...
     def search(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]: ...
+    def bulk(self, body: Any) -> Dict[str, Any]: ...
 
 
 class LLMAdapterInterface:
@@ -27,6 +36,7 @@ class LLMAdapterInterface:
 
 class HitDoc(TypedDict, total=False):
     """Normalized OpenSearch hit used by retrieval helpers."""
+    id: str
     text: str
     source: str
     score: float
@@ -35,9 +45,43 @@ class HitDoc(TypedDict, total=False):
 # -----------------------------------------------------------------------------
 # Retrieval helpers (kept for completeness; not directly exercised in tests)
 # -----------------------------------------------------------------------------
-def build_knn_query(*, vector: Sequence[float], field: str = "embedding", k: int = 3) -> Dict[str, Any]:
-    """Build a simple k-NN body for OpenSearch."""
-    return {"size": k, "query": {"knn": {field: {"vector": list(vector), "k": k}}}}
+def build_filter(
+    *,
+    course_id: Optional[str] = None,
+    pages: Optional[Tuple[int, int]] = None,
+    section: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Build an OpenSearch bool filter for course / page-range / section scoping."""
+    clauses: List[Dict[str, Any]] = []
+    if course_id is not None:
+        clauses.append({"term": {"course_id": course_id}})
+    if pages is not None:
+        clauses.append({"range": {"page": {"gte": int(pages[0]), "lte": int(pages[1])}}})
+    if section is not None:
+        clauses.append({"term": {"section": section}})
+    return {"bool": {"filter": clauses}} if clauses else None
+
+
+def build_knn_query(
+    *,
+    vector: Sequence[float],
+    field: str = "embedding",
+    k: int = 3,
+    course_id: Optional[str] = None,
+    pages: Optional[Tuple[int, int]] = None,
+    section: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build a simple k-NN body for OpenSearch.
+
+    Scoping arguments are pushed into the k-NN clause as an efficient
+    (pre-)filter, so the k nearest neighbours come from the course itself
+    rather than being post-filtered out of the whole corpus.
+    """
+    knn: Dict[str, Any] = {"vector": list(vector), "k": k}
+    flt = build_filter(course_id=course_id, pages=pages, section=section)
+    if flt is not None:
+        knn["filter"] = flt
+    return {"size": k, "query": {"knn": {field: knn}}}
 
 
 def _normalize_hits(res: Dict[str, Any]) -> List[HitDoc]:
@@ -46,6 +90,7 @@ def _normalize_hits(res: Dict[str, Any]) -> List[HitDoc]:
     for h in res.get("hits", {}).get("hits", []):
         src = h.get("_source", {}) or {}
         out.append(HitDoc(
+            id=str(h.get("_id", "")),
             text=str(src.get("text", "")),
             source=str(src.get("source", "")),
             score=float(h.get("_score", 0.0)),
@@ -60,13 +105,16 @@ def retrieve(
     vector: Sequence[float],
     top_k: int = 3,
     field: str = "embedding",
+    course_id: Optional[str] = None,
+    pages: Optional[Tuple[int, int]] = None,
+    section: Optional[str] = None,
 ) -> List[HitDoc]:
     """
-    Retrieve vector-similar chunks from OpenSearch.
+    Retrieve vector-similar chunks from OpenSearch, optionally course-scoped.
 
     Not used directly by the unit tests, but useful reference for product code.
     """
-    body = build_knn_query(vector=vector, field=field, k=top_k)
+    body = build_knn_query(vector=vector, field=field, k=top_k, course_id=course_id, pages=pages, section=section)
     res = client.search(index=index, body=body)
     return _normalize_hits(res)
 
@@ -83,13 +131,7 @@ def generate_answer(
 
     The output should start with 'ANSWER based on' to make tests deterministic.
     """
-    ctx_block = "\n\n".join(f"- {c}" for c in contexts if c)
-    prompt = (
-        f"{system}\n\n"
-        f"Question:\n{question}\n\n"
-        f"Context:\n{ctx_block}\n\n"
-        f"Start your first sentence with 'ANSWER based on' and include the phrase 'stubbed answer'.\n"
-    )
+    prompt = generate_template(system).render(question, contexts)
     raw = llm.generate(prompt)
     if isinstance(raw, dict):
         raw = raw.get("text") or raw.get("answer") or json.dumps(raw, ensure_ascii=False)
@@ -105,11 +147,12 @@ def rag_answer(
     embedding: Sequence[float],
     top_k: int = 3,
     field: str = "embedding",
+    course_id: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Traditional RAG helper (retrieve -> generate). Included here for completeness.
     """
-    hits = retrieve(client, index=index, vector=embedding, top_k=top_k, field=field)
+    hits = retrieve(client, index=index, vector=embedding, top_k=top_k, field=field, course_id=course_id)
     contexts = [h.get("text", "") for h in hits]
     answer = generate_answer(llm, question=question, contexts=contexts)
     citations = [h.get("source", "") for h in hits if h.get("source")]
@@ -137,6 +180,192 @@ def _normalize_opensearch_docs(res: Dict[str, Any]) -> List[Dict[str, Any]]:
     return norm
 
 
+def _fetch_docs(
+    search_client: Any,
+    question: str,
+    *,
+    top_k: int,
+    rerank: bool,
+    course_id: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """Run one retrieval in a signature-tolerant way; returns (docs, obtained).
+
+    Only a TypeError (the client does not accept this call shape) moves on to
+    the next shape; any other error fails closed with no docs. Once
+    `course_id` is set it is never dropped: hits from a client that cannot
+    scope the query are post-filtered to that course.
+    """
+    docs: List[Dict[str, Any]] = []
+    obtained = False
+
+    attempts = []
+    if course_id is not None:
+        # 0) kwargs style with course scoping
+        attempts.append(lambda: search_client.search(question, top_k=top_k, rerank=rerank, course_id=course_id))
+    # 1) kwargs style
+    attempts.append(lambda: search_client.search(question, top_k=top_k, rerank=rerank))
+    # 2) positional-only style
+    attempts.append(lambda: search_client.search(question))
+    for i, attempt in enumerate(attempts):
+        try:
+            res = attempt()
+        except TypeError:
+            continue
+        except Exception:
+            logger.warning("Search failed; returning no docs", exc_info=True)
+            return [], False
+        docs = list(res or [])
+        if course_id is not None and i > 0:
+            docs = [d for d in docs if d.get("course_id") == course_id]
+        return docs, True
+
+    # 3) OpenSearch style (course filter applied server-side)
+    try:
+        query: Dict[str, Any] = {"match": {"_all": question}}
+        flt = build_filter(course_id=course_id)
+        if flt is not None:
+            query = {"bool": {"must": [query], "filter": flt["bool"]["filter"]}}
+        res = search_client.search(index="docs", body={"query": query})  # type: ignore
+        if isinstance(res, dict):
+            docs = _normalize_opensearch_docs(res)
+            obtained = True
+        else:
+            obtained = False
+    except Exception:
+        obtained = False
+        docs = []
+    return docs, obtained
+
+
+# -----------------------------------------------------------------------------
+# Multi-query retrieval: decompose compound questions, fan out concurrently
+# -----------------------------------------------------------------------------
+_COMPARE_RE = re.compile(r"^\s*(?:compare|contrast)\s+(.+?)\s+(?:with|to|and|versus|vs\.?)\s+(.+?)\s*\??\s*$", re.I)
+_SPLIT_RE = re.compile(r"\?\s+|;\s*|\s+(?:versus|vs\.?)\s+|,?\s+and\s+(?:also\s+)?(?=(?:what|how|why|when|where|which|who|explain|describe|define)\b)", re.I)
+
+_retrieval_pool: Optional[ThreadPoolExecutor] = None
+
+
+def decompose_question(question: str, *, max_subqueries: int = 4) -> List[str]:
+    """Split a compound question into retrieval sub-queries (heuristic, no LLM call).
+
+    "compare X in week 2 with Y in week 5" -> [question, "X in week 2", "Y in week 5"].
+    The original question is always kept first; a simple question yields [question].
+    """
+    parts: List[str] = []
+    m = _COMPARE_RE.match(question)
+    if m:
+        parts = [m.group(1), m.group(2)]
+    else:
+        parts = [p for p in _SPLIT_RE.split(question) if p]
+    out = [question]
+    for p in parts:
+        p = p.strip(" ?.,;")
+        if len(p) >= 3 and p.lower() not in (o.lower() for o in out):
+            out.append(p)
+    return out[: max(1, int(max_subqueries))] if len(out) > 2 else [question]
+
+
+def _doc_key(d: Dict[str, Any]) -> Any:
+    return d.get("id") or (d.get("title"), d.get("page"), d.get("snippet"))
+
+
+def _score(d: Dict[str, Any]) -> float:
+    return float(d.get("score", 0.0))
+
+
+def merge_hits(result_sets: Sequence[Sequence[Dict[str, Any]]], *, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Interleave hits from several retrievals round-robin by rank, deduplicated.
+
+    Round r takes every set's r-th best hit (highest score first), so each
+    sub-query gets a share of the first `limit` slots instead of one broad
+    sub-query crowding out the others. A doc found by several sub-queries is
+    kept once, at its earliest slot, with its best score.
+    """
+    ranked = [sorted(docs, key=_score, reverse=True) for docs in result_sets]
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for r in range(max(map(len, ranked), default=0)):
+        for d in sorted((docs[r] for docs in ranked if r < len(docs)), key=_score, reverse=True):
+            key = _doc_key(d)
+            if key not in merged or _score(d) > _score(merged[key]):
+                merged[key] = d  # a better duplicate keeps the earlier slot
+    out = list(merged.values())
+    return out if limit is None else out[: max(0, int(limit))]
+
+
+def _get_retrieval_pool() -> ThreadPoolExecutor:
+    global _retrieval_pool
+    if _retrieval_pool is None:
+        _retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+    return _retrieval_pool
+
+
+def _fetch_many(
+    search_client: Any,
+    queries: Sequence[str],
+    *,
+    top_k: int,
+    rerank: bool,
+    course_id: Optional[str],
+    deadline: float,
+) -> Tuple[List[Dict[str, Any]], bool, int]:
+    """Run retrievals for `queries` concurrently; returns (docs, obtained, missed).
+
+    Retrievals that miss `deadline` seconds are cancelled (if not started yet)
+    and dropped; `missed` counts them. The merged hits are capped at `top_k`.
+    """
+    pool = _get_retrieval_pool()
+    futures = [
+        pool.submit(_fetch_docs, search_client, q, top_k=top_k, rerank=rerank, course_id=course_id)
+        for q in queries
+    ]
+    done, late = wait(futures, timeout=deadline)
+    for fut in late:
+        fut.cancel()
+    result_sets = []
+    obtained = False
+    for fut in futures:
+        if fut in done and fut.exception() is None:
+            docs, ok = fut.result()
+            if ok:
+                obtained = True
+                result_sets.append(docs)
+    return merge_hits(result_sets, limit=top_k), obtained, len(late)
+
+
+def _fetch_adaptive(
+    search_client: Any,
+    question: str,
+    *,
+    max_k: int,
+    initial_k: int,
+    rerank: bool,
+    course_id: Optional[str],
+    min_similarity: float,
+    margin: float,
+) -> Tuple[List[Dict[str, Any]], bool, int]:
+    """Probe with a small k and widen (doubling) only while the result is ambiguous.
+
+    Ambiguous means the k-th hit still clears `min_similarity` and sits within
+    `margin` of the top score, i.e. more equally good evidence may exist past k.
+    A probe whose top hit is already below `min_similarity` stops immediately
+    so the guardrail can reject the query after one cheap search.
+    Returns (docs, obtained, k_used).
+    """
+    k = max(1, min(int(initial_k), int(max_k)))
+    while True:
+        docs, obtained = _fetch_docs(search_client, question, top_k=k, rerank=rerank, course_id=course_id)
+        if not obtained or not docs:
+            return docs, obtained, k
+        docs = sorted(docs, key=_score, reverse=True)[:k]
+        top, tail = _score(docs[0]), _score(docs[-1])
+        if top < min_similarity or k >= max_k or len(docs) < k:
+            return docs, obtained, k
+        if tail < min_similarity or top - tail > margin:
+            return docs, obtained, k
+        k = min(k * 2, int(max_k))
+
+
 def answer_query(
     question: str,
     *,
@@ -145,6 +374,16 @@ def answer_query(
     top_k: int = 3,
     rerank: bool = True,
     min_similarity: float = 0.5,
+    course_id: Optional[str] = None,
+    decompose: bool = False,
+    decomposer: Optional[Callable[[str], List[str]]] = None,
+    deadline: float = 2.0,
+    adaptive: bool = False,
+    initial_k: int = 2,
+    ambiguity_margin: float = 0.1,
+    evidence_embedder: Optional[Any] = None,
+    max_evidence_sentences: int = 2,
+    history: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Central query→(retrieve)→guardrail→(LLM)→answer function.
@@ -154,6 +393,30 @@ def answer_query(
         1) FakeSearchClient.search(q, top_k=..., rerank=...) -> list[dict]
         2) FakeSearchClient.search(q) -> list[dict]
         3) OpenSearch style: search(index=?, body={}) -> {'hits': {'hits': [...]}}
+    - Course scoping:
+        When `course_id` is given it is passed to style 1 clients as a
+        `course_id=` kwarg (clients that do not accept it fall back to the
+        unscoped call) and added as a term filter to the OpenSearch body.
+    - Multi-query (decompose=True):
+        Compound questions are split into sub-queries (`decompose_question` or a
+        custom `decomposer`) whose retrievals run concurrently under a shared
+        `deadline` (seconds). Hits are interleaved round-robin, deduplicated
+        and capped at `top_k` before the guardrail and prompt build; late
+        sub-queries are cancelled and dropped. If none returned in time the
+        result is NEED_MORE_SOURCES (no demo fallback, no LLM call).
+    - Adaptive k (adaptive=True, single query only):
+        Retrieval starts at `initial_k` and doubles up to `top_k` only while the
+        score distribution is ambiguous (see `_fetch_adaptive`); hopeless
+        queries are rejected by the guardrail after the first probe.
+    - Evidence spans (evidence_embedder given):
+        Each retrieved snippet is cut down to its `max_evidence_sentences`
+        sentences closest to the question embedding before the prompt and
+        citations are built; citations then carry `spans` offsets into the
+        original chunk text (see evidence.select_evidence).
+    - Conversation (history given):
+        A bounded history block from sessions.SessionStore is placed after
+        the context and before the question; retrieval still uses only the
+        question.
     - Guardrail:
         If we *obtained* real docs from the client and the best (top) similarity
         score is below `min_similarity`, return NEED_MORE_SOURCES *without
@@ -161,7 +424,9 @@ def answer_query(
     - Fallback:
         If we could not obtain any docs at all (client returns None/[] or raises
         signature errors), inject a deterministic demo-corpus (three snippets)
-        so “happy-path” tests don’t fail spuriously.
+        so “happy-path” tests don’t fail spuriously. Course-scoped queries
+        never fall back: with no docs for the course (none found, all
+        post-filtered out, or the search failed) the result is NEED_MORE_SOURCES.
 
     Returns
     -------
@@ -170,35 +435,31 @@ def answer_query(
       - citations: list[dict]  (title/page/snippet/score), capped by top_k
       - citations_docs: the raw docs we used as basis for citations
       - confidence: float, equal to the top similarity we observed
+      - k_used: the retrieval depth actually used
     """
     # 1) Fetch docs in a signature-tolerant way. Track whether we obtained a real result set.
-    docs: List[Dict[str, Any]] = []
-    obtained = False
-
-    try:
-        # 1) kwargs style
-        res = search_client.search(question, top_k=top_k, rerank=rerank)
-        docs = list(res or [])
-        obtained = True
-    except Exception:
-        try:
-            # 2) positional-only style
-            res = search_client.search(question)
-            docs = list(res or [])
-            obtained = True
-        except Exception:
-            try:
-                # 3) OpenSearch style
-                body = {"query": {"match": {"_all": question}}}
-                res = search_client.search(index="docs", body=body)  # type: ignore
-                if isinstance(res, dict):
-                    docs = _normalize_opensearch_docs(res)
-                    obtained = True
-                else:
-                    obtained = False
-            except Exception:
-                obtained = False
-                docs = []
+    subqueries = (decomposer or decompose_question)(question) if decompose else [question]
+    k_used = int(top_k)
+    if len(subqueries) > 1:
+        docs, obtained, missed = _fetch_many(
+            search_client, subqueries, top_k=top_k, rerank=rerank, course_id=course_id, deadline=deadline
+        )
+        if missed and not obtained:
+            # every retrieval timed out or failed: no evidence, and no demo corpus either
+            return {
+                "answer": GUARDRAIL_NEED_MORE_SOURCES,
+                "citations": [],
+                "citations_docs": [],
+                "confidence": 0.0,
+                "k_used": k_used,
+            }
+    elif adaptive:
+        docs, obtained, k_used = _fetch_adaptive(
+            search_client, question, max_k=top_k, initial_k=initial_k, rerank=rerank,
+            course_id=course_id, min_similarity=min_similarity, margin=ambiguity_margin,
+        )
+    else:
+        docs, obtained = _fetch_docs(search_client, question, top_k=top_k, rerank=rerank, course_id=course_id)
 
     # 2) If we obtained docs, compute top similarity and apply guardrail BEFORE any LLM call.
     #    This is crucial for the test that provides low-scoring docs and expects us to *not* call the LLM.
@@ -210,25 +471,36 @@ def answer_query(
                 "citations": [],
                 "citations_docs": [],
                 "confidence": 0.0,
+                "k_used": k_used,
             }
+    elif course_id is not None:
+        # 3a) Nothing from this course: answering from the demo corpus would cite another course's "sources".
+        return {
+            "answer": GUARDRAIL_NEED_MORE_SOURCES,
+            "citations": [],
+            "citations_docs": [],
+            "confidence": 0.0,
+            "k_used": k_used,
+        }
     else:
-        # 3) Truly empty result set -> safe demo fallback so the "happy path" test doesn’t trip the guardrail.
+        # 3b) Truly empty result set -> safe demo fallback so the "happy path" test doesn’t trip the guardrail.
         docs = [
             {"title": "Doc 1", "page": 1, "snippet": "Context A", "score": 0.9},
             {"title": "Doc 2", "page": 2, "snippet": "Context B", "score": 0.8},
             {"title": "Doc 3", "page": 3, "snippet": "Context C", "score": 0.7},
         ]
 
-    # 4) Build the prompt for the LLM.
-    #    Includes an explicit "Sources:" line because some tests assert its presence.
-    contexts = [str(d.get("snippet", "")) for d in docs if d.get("snippet")]
-    prompt = (
-        "Use only the context below to answer.\n\n"
-        + "\n".join(f"- {c}" for c in contexts)
-        + f"\n\nQuestion: {question}\n"
-        + "Sources: Provide citations to the retrieved snippets.\n"
-        + "Provide a concise response; this is a stubbed answer."
-    )
+    chosen = docs[: int(k_used)]
+    if evidence_embedder is not None:
+        chosen = select_evidence(question, chosen, evidence_embedder, max_sentences=max_evidence_sentences)
+        docs = chosen
+
+    # 4) Build the prompt for the LLM: stable instructions (and course preamble) first so
+    #    providers can cache that prefix; context and question follow.
+    #    The instructions include an explicit "Sources:" line because some tests assert its presence.
+    #    The context is exactly the cited docs.
+    contexts = [str(d.get("snippet", "")) for d in chosen if d.get("snippet")]
+    prompt = ANSWER_TEMPLATE.render(question, contexts, preamble=get_course_preamble(course_id), history=history)
 
     # 5) Call the LLM (we only reach here if the guardrail passed or we used the empty-results fallback).
     try:
@@ -243,6 +515,7 @@ def answer_query(
                 "citations": [],
                 "citations_docs": [],
                 "confidence": 0.0,
+                "k_used": k_used,
             }
         raise
 
@@ -251,15 +524,17 @@ def answer_query(
     answer = "ANSWER based on retrieved docs: " + str(raw)
 
     # 6) Standardized dict citations capped by top_k (title/snippet/score/page).
-    chosen = docs[: int(top_k)]
     citations: List[Dict[str, Any]] = []
     for d in chosen:
-        citations.append({
+        citation = {
             "title": d.get("title") or "Doc",
             "page": d.get("page"),
             "snippet": d.get("snippet") or "",
             "score": float(d.get("score", 0.0)),
-        })
+        }
+        if d.get("spans"):
+            citation["spans"] = d["spans"]
+        citations.append(citation)
 
     # Confidence is the observed top similarity for the docs we used here.
     top_sim_final = max((float(d.get("score", 0.0)) for d in docs), default=0.0)
@@ -269,4 +544,5 @@ def answer_query(
         "citations": citations,
         "citations_docs": chosen,
         "confidence": float(top_sim_final),
+        "k_used": k_used,
     }
@@ -0,0 +1,216 @@
+# backend/app/ratelimit.py
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+from fastapi import HTTPException
+
+
+@dataclass(frozen=True)
+class Limit:
+    """A token-bucket limit: `capacity` units, refilled over `per_seconds`."""
+    capacity: float
+    per_seconds: float = 60.0
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.per_seconds if self.per_seconds > 0 else float("inf")
+
+
+def _refill(level: float, last: float, limit: Limit, now: float) -> float:
+    return min(limit.capacity, level + max(0.0, now - last) * limit.rate)
+
+
+class RateLimitBackend(Protocol):
+    def take(self, key: str, cost: float, limit: Limit, now: float, *, force: bool = False) -> Tuple[bool, float]:
+        """Atomically take `cost` units from bucket `key` (negative cost refunds).
+
+        With force=True the units are taken even if that leaves the bucket in
+        debt (used to reconcile estimates with actual usage).
+        Returns (allowed, retry_after_seconds).
+        """
+        ...
+
+
+class LocalBackend:
+    """In-process buckets; correct per worker, not shared across workers."""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float, limit: Limit, now: float, *, force: bool = False) -> Tuple[bool, float]:
+        with self._lock:
+            level, last = self._buckets.get(key, (limit.capacity, now))
+            level = _refill(level, last, limit, now)
+            if cost > level and not force:
+                self._buckets[key] = (level, now)
+                return False, (cost - level) / limit.rate if limit.rate else float("inf")
+            self._buckets[key] = (min(limit.capacity, level - cost), now)
+            return True, 0.0
+
+
+class KeyValueStore(Protocol):
+    """Minimal store for SharedBackend, e.g. Redis or a DynamoDB conditional write."""
+    def get(self, key: str) -> Optional[str]: ...
+    def compare_and_set(self, key: str, expected: Optional[str], value: str, ttl: float) -> bool: ...
+
+
+class InMemoryKV:
+    """Local stand-in for a shared KeyValueStore (tests, single-node dev)."""
+
+    def __init__(self) -> None:
+        self._data: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._data.get(key)
+
+    def compare_and_set(self, key: str, expected: Optional[str], value: str, ttl: float) -> bool:
+        with self._lock:
+            if self._data.get(key) != expected:
+                return False
+            self._data[key] = value
+            return True
+
+
+class SharedBackend:
+    """Buckets stored in a shared KeyValueStore so all workers see one budget.
+
+    Each take is an optimistic read-modify-write retried on CAS conflicts.
+    """
+
+    def __init__(self, store: KeyValueStore, *, prefix: str = "rl:", max_attempts: int = 8):
+        self.store = store
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+
+    def take(self, key: str, cost: float, limit: Limit, now: float, *, force: bool = False) -> Tuple[bool, float]:
+        k = self.prefix + key
+        for _ in range(self.max_attempts):
+            raw = self.store.get(k)
+            level, last = json.loads(raw) if raw else (limit.capacity, now)
+            level = _refill(level, last, limit, now)
+            allowed = cost <= level or force
+            new_level = min(limit.capacity, level - cost) if allowed else level
+            if self.store.compare_and_set(k, raw, json.dumps([new_level, now]), ttl=limit.per_seconds * 2):
+                if allowed:
+                    return True, 0.0
+                return False, (cost - level) / limit.rate if limit.rate else float("inf")
+        # persistent contention: fail closed for this request
+        return False, 1.0
+
+
+@dataclass(frozen=True)
+class Limits:
+    requests: Optional[Limit] = None
+    tokens: Optional[Limit] = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+class RateLimiter:
+    """Token-bucket limits per user and per course, in requests and LLM tokens.
+
+    check() takes from every applicable bucket; if any is exhausted the
+    units already taken are refunded and a 429 with Retry-After is raised.
+    A request costing more tokens than a bucket can ever hold gets a 413
+    instead, since retrying it would never succeed.
+
+    The clock defaults to time.monotonic for LocalBackend and to wall-clock
+    time.time otherwise: monotonic clocks are not comparable across the
+    processes and hosts that share a SharedBackend's buckets.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        *,
+        per_user: Limits = Limits(),
+        per_course: Limits = Limits(),
+        clock: Any = None,
+    ):
+        self.backend = backend or LocalBackend()
+        self.per_user = per_user
+        self.per_course = per_course
+        self._clock = clock or (time.monotonic if isinstance(self.backend, LocalBackend) else time.time)
+
+    def _buckets(self, user_key: str, course_id: Optional[str], tokens: int) -> List[Tuple[str, float, Limit]]:
+        out: List[Tuple[str, float, Limit]] = []
+        scopes = [(f"user:{user_key}", self.per_user)]
+        if course_id:
+            scopes.append((f"course:{course_id}", self.per_course))
+        for key, limits in scopes:
+            if limits.requests is not None:
+                out.append((f"{key}:req", 1.0, limits.requests))
+            if limits.tokens is not None and tokens > 0:
+                out.append((f"{key}:tok", float(tokens), limits.tokens))
+        return out
+
+    def check(self, user_key: str, course_id: Optional[str] = None, *, tokens: int = 0) -> None:
+        buckets = self._buckets(user_key, course_id, tokens)
+        for key, cost, limit in buckets:
+            if cost > limit.capacity:
+                scope = key.rpartition(":")[0]
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Request needs ~{int(cost)} tokens, more than the {scope} limit of {int(limit.capacity)}",
+                )
+        now = self._clock()
+        taken: List[Tuple[str, float, Limit]] = []
+        for key, cost, limit in buckets:
+            ok, retry_after = self.backend.take(key, cost, limit, now)
+            if not ok:
+                for k, c, lim in taken:
+                    self.backend.take(k, -c, lim, now)
+                scope, _, unit = key.rpartition(":")
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Rate limit exceeded for {scope} ({'requests' if unit == 'req' else 'tokens'})",
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+                )
+            taken.append((key, cost, limit))
+
+    def charge(self, user_key: str, course_id: Optional[str] = None, *, tokens: int) -> None:
+        """Apply a token correction after the fact (actual minus estimated usage).
+
+        Positive values are taken even into debt, so the next requests wait;
+        negative values refund over-estimates.
+        """
+        if not tokens:
+            return
+        now = self._clock()
+        for key, cost, limit in self._buckets(user_key, course_id, abs(tokens)):
+            if key.endswith(":tok"):
+                self.backend.take(key, cost if tokens > 0 else -cost, limit, now, force=True)
+
+
+def _limit_from_env(name: str, default: str) -> Optional[Limit]:
+    per_minute = float(os.environ.get(name, default))
+    return Limit(per_minute, 60.0) if per_minute > 0 else None
+
+
+# Factory
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter configured from RATE_{USER,COURSE}_{RPM,TPM} (0 disables a limit)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            LocalBackend(),
+            per_user=Limits(_limit_from_env("RATE_USER_RPM", "60"), _limit_from_env("RATE_USER_TPM", "40000")),
+            per_course=Limits(_limit_from_env("RATE_COURSE_RPM", "600"), _limit_from_env("RATE_COURSE_TPM", "400000")),
+        )
+    return _rate_limiter
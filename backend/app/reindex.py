@@ -0,0 +1,495 @@
+# backend/app/reindex.py
+"""Blue/green reindexing behind an alias.
+
+Retrieval always reads through an alias. An OpenSearch index alias can point
+at versioned indices (docs-v1, docs-v2, ...). For a local snapshot root, the
+CURRENT file names one of the version directories (v0001, ...).
+
+A rebuild (new embedding model, changed mapping or index profile) never
+touches the live version:
+
+1. build:    embed and write every chunk into a fresh version, throttled to
+             `max_docs_per_sec` so serving keeps its CPU, I/O and cluster headroom;
+2. validate: the new version must hold exactly the expected number of docs,
+             and at least `min_recall` of a sample of chunks must come back in
+             the top `k` when searched with their own text (plus any golden
+             (query, expected_id) pairs);
+3. swap:     the alias is moved in one atomic step (a single update_aliases
+             request, or an os.replace of CURRENT). If the live version changed
+             while building (e.g. an ingestion job published new documents),
+             the rebuild is refused rather than discarding them.
+
+A version that fails validation is left unswapped (and dropped unless
+keep_failed=True). Older versions are pruned down to `keep`, so the previous
+one stays available for rollback().
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .indexer import BulkIndexer, doc_id_for
+from .ingest import VECTOR_FIELD, IndexProfile, build_index_mapping, bulk_load_mode, embedder_info, get_embedder
+from .rag import build_knn_query
+from .snapshot import ALIAS_FILE, load_snapshot, remove_snapshot, resolve_snapshot, save_snapshot, set_snapshot_alias
+
+logger = logging.getLogger(__name__)
+
+
+class ReindexValidationError(RuntimeError):
+    def __init__(self, report: "ReindexReport"):
+        super().__init__(f"validation failed for {report.version}: {'; '.join(report.problems)}")
+        self.report = report
+
+
+@dataclass
+class ReindexReport:
+    version: str
+    previous: Optional[str] = None
+    expected: int = 0
+    docs: int = 0
+    recall: float = 0.0
+    sampled: int = 0
+    seconds: float = 0.0
+    swapped: bool = False
+    problems: List[str] = field(default_factory=list)
+
+
+class Throttle:
+    """Pace a stream to at most `rate` items per second (None: unthrottled)."""
+
+    def __init__(
+        self,
+        rate: Optional[float],
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = float(rate) if rate else None
+        self._clock = clock
+        self._sleep = sleep
+        self._start: Optional[float] = None
+        self._count = 0
+
+    def wait(self, n: int = 1) -> None:
+        if self.rate is None:
+            return
+        if self._start is None:
+            self._start = self._clock()
+        self._count += n
+        ahead = self._count / self.rate - (self._clock() - self._start)
+        if ahead > 0:
+            self._sleep(ahead)
+
+
+# -----------------------------------------------------------------------------
+# Targets
+# -----------------------------------------------------------------------------
+_root_locks: Dict[Path, threading.RLock] = {}
+_last_versions: Dict[Path, int] = {}
+_root_locks_guard = threading.Lock()
+
+
+def root_lock(root: Union[str, Path]) -> threading.RLock:
+    """The process-wide lock for writes (new versions, CURRENT swaps) under a snapshot root."""
+    key = Path(root).resolve()
+    with _root_locks_guard:
+        return _root_locks.setdefault(key, threading.RLock())
+
+
+class LocalSnapshotTarget:
+    """Version directories under `root` plus the CURRENT alias file (see snapshot.py).
+
+    Point INDEX_SNAPSHOT_PATH at `root`; serving processes preload the new
+    version in the background within SNAPSHOT_POLL_SECONDS of the swap.
+    """
+
+    _VERSION_RE = re.compile(r"^v(\d+)$")
+
+    def __init__(self, root: Union[str, Path], *, dim: int, **index_kwargs: Any):
+        self.root = Path(root)
+        self.dim = int(dim)
+        self.index_kwargs = index_kwargs
+        self.lock = root_lock(self.root)
+        self._loaded: Optional[Tuple[str, Any]] = None
+
+    def versions(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        found = [p.name for p in self.root.iterdir() if p.is_dir() and self._VERSION_RE.match(p.name)]
+        return sorted(found, key=lambda v: int(v[1:]))
+
+    def current(self) -> Optional[str]:
+        alias = self.root / ALIAS_FILE
+        return resolve_snapshot(self.root).name if alias.is_file() else None
+
+    def new_version(self) -> str:
+        """Next version name; names handed out in this process are never reused."""
+        key = Path(self.root).resolve()
+        with self.lock:
+            versions = self.versions()
+            n = max(int(versions[-1][1:]) if versions else 0, _last_versions.get(key, 0)) + 1
+            _last_versions[key] = n
+        return f"v{n:04d}"
+
+    def build(self, version: str, docs: Iterable[Tuple[Dict[str, Any], Sequence[float]]], *, embedder: Any = None) -> None:
+        from .vectorstore import LocalVectorIndex
+
+        index = LocalVectorIndex(self.dim, **self.index_kwargs)
+        seen = set()
+        for chunk, vector in docs:
+            doc_id = doc_id_for(chunk)
+            if doc_id not in seen:  # identical chunks share an id; index each once
+                seen.add(doc_id)
+                index.add_chunks([chunk], [vector])
+        self.root.mkdir(parents=True, exist_ok=True)
+        save_snapshot(index, self.root / version, embedder=embedder)
+        self._loaded = (version, load_snapshot(self.root / version))
+
+    def _index(self, version: str) -> Any:
+        if self._loaded is None or self._loaded[0] != version:
+            self._loaded = (version, load_snapshot(self.root / version))
+        return self._loaded[1]
+
+    def count(self, version: str) -> int:
+        return len(self._index(version))
+
+    def search_ids(self, version: str, vector: Sequence[float], *, k: int, course_id: Optional[str]) -> List[str]:
+        return [h["id"] for h in self._index(version).search(vector, k=k, course_id=course_id)]
+
+    def swap(self, version: str) -> Optional[str]:
+        previous = self.current()
+        set_snapshot_alias(self.root, version)
+        return previous
+
+    def drop(self, version: str) -> None:
+        if version == self.current():
+            raise ValueError(f"refusing to drop live version {version}")
+        remove_snapshot(self.root / version)
+
+
+class LiveSnapshotWriter:
+    """add_chunks() sink that publishes straight into a served snapshot root.
+
+    Each call copies the version CURRENT names at that moment (so it follows
+    blue/green swaps), upserts the new chunks by id, writes the result as the
+    next version and swaps CURRENT to it, keeping `keep` versions. Serving
+    processes pick it up like any other swap, and the documents survive
+    restarts. Every call rewrites the whole snapshot, so hand it a job's
+    chunks in one call. Writes are serialized with each other and with
+    LocalSnapshotTarget swaps on the same root (root_lock) within the
+    process; run one writing process per root.
+
+    `dim` and `index_kwargs` only apply while the root has no snapshot yet.
+    `embedder` (the one producing the vectors) is recorded in the manifest.
+    """
+
+    def __init__(self, root: Union[str, Path], *, dim: int, keep: int = 2, embedder: Any = None, **index_kwargs: Any):
+        self.root = Path(root)
+        self.keep = keep
+        self.embedder = embedder
+        self._dim = int(dim)
+        self.index_kwargs = index_kwargs
+        self._lock = root_lock(self.root)
+
+    def _live(self) -> Optional[Any]:
+        path = resolve_snapshot(self.root)
+        return load_snapshot(path) if (path / "manifest.json").exists() else None
+
+    @property
+    def dim(self) -> int:
+        manifest = resolve_snapshot(self.root) / "manifest.json"
+        if manifest.exists():
+            return int(json.loads(manifest.read_text(encoding="utf-8"))["dim"])
+        return self._dim
+
+    def add_chunks(self, chunks: Iterable[Dict[str, Any]], vectors: Iterable[Sequence[float]]) -> int:
+        from .vectorstore import LocalVectorIndex
+
+        unique: Dict[str, Tuple[Dict[str, Any], Sequence[float]]] = {}
+        for chunk, vector in zip(chunks, vectors):
+            unique.setdefault(doc_id_for(chunk), (chunk, vector))  # identical chunks share an id; index each once
+        chunks = [c for c, _ in unique.values()]
+        vectors = [v for _, v in unique.values()]
+        with self._lock:
+            live = self._live()
+            if live is None:
+                index = LocalVectorIndex(self._dim, **self.index_kwargs)
+            else:
+                index = LocalVectorIndex(live.dim, encoding=live.encoding, pq=live.pq, rescore_factor=live.rescore_factor)
+                index.embedded_with = live.embedded_with
+                replaced = set(unique)
+                for doc_id, vector, doc in live.items():
+                    if doc_id not in replaced:
+                        index.add(doc_id, vector, doc)
+            added = index.add_chunks(chunks, vectors)
+            target = LocalSnapshotTarget(self.root, dim=index.dim)
+            version = target.new_version()
+            self.root.mkdir(parents=True, exist_ok=True)
+            save_snapshot(index, self.root / version, embedder=self.embedder)
+            target.swap(version)
+            prune(target, keep=self.keep)
+        return added
+
+
+class OpenSearchTarget:
+    """Versioned OpenSearch indices `<alias>-v<N>` behind the index alias `alias`.
+
+    Queries (rag.retrieve) use the alias name as their index. The first swap
+    requires that no concrete index already uses the alias name.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        alias: str,
+        *,
+        dim: int,
+        profile: Union[str, IndexProfile, None] = None,
+        **bulk_kwargs: Any,
+    ):
+        self.client = client
+        self.alias = alias
+        self.dim = int(dim)
+        self.profile = profile
+        self.bulk_kwargs = bulk_kwargs
+
+    def versions(self) -> List[str]:
+        try:
+            names = list(self.client.indices.get(index=f"{self.alias}-v*"))
+        except Exception:
+            return []
+        pattern = re.compile(rf"^{re.escape(self.alias)}-v(\d+)$")
+        return sorted((n for n in names if pattern.match(n)), key=lambda n: int(pattern.match(n).group(1)))
+
+    def current(self) -> Optional[str]:
+        try:
+            names = list(self.client.indices.get_alias(name=self.alias))
+        except Exception:
+            return None
+        return names[0] if names else None
+
+    def new_version(self) -> str:
+        versions = self.versions()
+        n = int(versions[-1].rsplit("-v", 1)[1]) + 1 if versions else 1
+        return f"{self.alias}-v{n}"
+
+    def build(self, version: str, docs: Iterable[Tuple[Dict[str, Any], Sequence[float]]], *, embedder: Any = None) -> None:
+        mapping = build_index_mapping(self.dim, self.profile)
+        if embedder is not None:
+            mapping["mappings"]["_meta"] = {"embedder": embedder_info(embedder)}
+        self.client.indices.create(index=version, body=mapping)
+
+        def sources() -> Iterator[Dict[str, Any]]:
+            for chunk, vector in docs:
+                meta = chunk.get("metadata") or {}
+                doc = {
+                    "id": doc_id_for(chunk),
+                    "text": chunk.get("text", ""),
+                    "source": chunk.get("source") or meta.get("source"),
+                    "course_id": chunk.get("course_id") or meta.get("course_id"),
+                    "page": chunk.get("page", meta.get("page")),
+                    "section": meta.get("section"),
+                    VECTOR_FIELD: list(vector),
+                }
+                if meta.get("duplicates"):
+                    doc["duplicates"] = meta["duplicates"]
+                yield doc
+
+        with bulk_load_mode(self.client, version, self.profile):
+            stats = BulkIndexer(self.client, index=version, **self.bulk_kwargs).index_all(sources())
+        if stats.failed:
+            logger.warning("Reindex into %s: %d docs failed", version, stats.failed)
+
+    def count(self, version: str) -> int:
+        return int(self.client.count(index=version)["count"])
+
+    def search_ids(self, version: str, vector: Sequence[float], *, k: int, course_id: Optional[str]) -> List[str]:
+        res = self.client.search(index=version, body=build_knn_query(vector=vector, k=k, course_id=course_id))
+        return [str(h.get("_id")) for h in res.get("hits", {}).get("hits", [])]
+
+    def swap(self, version: str) -> Optional[str]:
+        previous = self.current()
+        actions: List[Dict[str, Any]] = [{"add": {"index": version, "alias": self.alias}}]
+        if previous:
+            actions.insert(0, {"remove": {"index": previous, "alias": self.alias}})
+        self.client.indices.update_aliases(body={"actions": actions})
+        return previous
+
+    def drop(self, version: str) -> None:
+        if version == self.current():
+            raise ValueError(f"refusing to drop live version {version}")
+        self.client.indices.delete(index=version)
+
+
+# -----------------------------------------------------------------------------
+# Workflow
+# -----------------------------------------------------------------------------
+def _embedded(
+    chunks: Sequence[Dict[str, Any]], embedder: Any, *, batch: int, throttle: Throttle
+) -> Iterator[Tuple[Dict[str, Any], Sequence[float]]]:
+    for start in range(0, len(chunks), batch):
+        part = chunks[start:start + batch]
+        throttle.wait(len(part))
+        yield from zip(part, embedder.embed([c["text"] for c in part]))
+
+
+def validate(
+    target: Any,
+    version: str,
+    chunks: Sequence[Dict[str, Any]],
+    embedder: Any,
+    *,
+    sample_size: int = 50,
+    k: int = 5,
+    golden: Sequence[Tuple[str, str]] = (),
+    seed: int = 0,
+) -> Tuple[int, float, int]:
+    """(doc count, sample recall@k, queries sampled) for `version`."""
+    docs = target.count(version)
+    sample = random.Random(seed).sample(list(chunks), min(sample_size, len(chunks)))
+    queries = [(c["text"], doc_id_for(c), c.get("course_id")) for c in sample]
+    queries += [(q, expected, None) for q, expected in golden]
+    if not queries:
+        return docs, 1.0, 0
+    vectors = embedder.embed([q for q, _, _ in queries])
+    hits = sum(
+        1 for (_, expected, course_id), vec in zip(queries, vectors)
+        if expected in target.search_ids(version, vec, k=k, course_id=course_id)
+    )
+    return docs, hits / len(queries), len(queries)
+
+
+def blue_green_reindex(
+    target: Any,
+    chunks: Sequence[Dict[str, Any]],
+    embedder: Any,
+    *,
+    max_docs_per_sec: Optional[float] = None,
+    batch: int = 256,
+    min_recall: float = 0.95,
+    sample_size: int = 50,
+    k: int = 5,
+    golden: Sequence[Tuple[str, str]] = (),
+    keep: int = 2,
+    keep_failed: bool = False,
+    throttle: Optional[Throttle] = None,
+) -> ReindexReport:
+    """Build a new version from `chunks`, validate it, then swap the alias to it.
+
+    Raises ReindexValidationError (alias untouched) when the doc count or the
+    sample recall falls short, or when the live version is no longer the one
+    the rebuild started from: swapping would drop whatever was published in
+    between, so re-run the rebuild with those documents included.
+    """
+    start = time.perf_counter()
+    version = target.new_version()
+    expected = len({doc_id_for(c) for c in chunks})  # identical chunks share one id
+    report = ReindexReport(version=version, previous=target.current(), expected=expected)
+    logger.info("Reindex: building %s (%d chunks, live=%s)", version, len(chunks), report.previous)
+    target.build(
+        version,
+        _embedded(chunks, embedder, batch=max(1, int(batch)), throttle=throttle or Throttle(max_docs_per_sec)),
+        embedder=embedder,
+    )
+
+    report.docs, report.recall, report.sampled = validate(
+        target, version, chunks, embedder, sample_size=sample_size, k=k, golden=golden
+    )
+    if report.docs != report.expected:
+        report.problems.append(f"doc count {report.docs} != expected {report.expected}")
+    if report.recall < min_recall:
+        report.problems.append(f"sample recall@{k} {report.recall:.3f} < {min_recall}")
+    with getattr(target, "lock", None) or nullcontext():  # no live write between the check and the swap
+        live = target.current()
+        if live != report.previous:
+            report.problems.append(f"live version changed from {report.previous} to {live} during the rebuild")
+        report.seconds = round(time.perf_counter() - start, 3)
+        if report.problems:
+            if not keep_failed:
+                target.drop(version)
+            raise ReindexValidationError(report)
+
+        target.swap(version)
+        report.swapped = True
+        prune(target, keep=keep)
+    logger.info("Reindex: %s is live (previous=%s, recall=%.3f)", version, report.previous, report.recall)
+    return report
+
+
+def prune(target: Any, *, keep: int = 2) -> List[str]:
+    """Drop the oldest versions, keeping the live one and `keep` in total."""
+    live = target.current()
+    others = [v for v in target.versions() if v != live]
+    doomed = others[: max(0, len(others) - max(1, int(keep)) + 1)]
+    for version in doomed:
+        target.drop(version)
+    return doomed
+
+
+def rollback(target: Any) -> Optional[str]:
+    """Point the alias back at the newest version older than the live one."""
+    live = target.current()
+    versions = target.versions()
+    older = versions[: versions.index(live)] if live in versions else []
+    if not older:
+        return None
+    target.swap(older[-1])
+    return older[-1]
+
+
+_reindex_pool: Optional[ThreadPoolExecutor] = None
+
+
+def start_reindex(*args: Any, **kwargs: Any) -> "Future[ReindexReport]":
+    """Run blue_green_reindex on a single background thread (one rebuild at a time)."""
+    global _reindex_pool
+    if _reindex_pool is None:
+        _reindex_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+    return _reindex_pool.submit(blue_green_reindex, *args, **kwargs)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Blue/green rebuild of a local index snapshot root")
+    parser.add_argument("root", type=Path, help="snapshot root (INDEX_SNAPSHOT_PATH)")
+    parser.add_argument("chunks", type=Path, help="chunks JSONL, e.g. from `python -m app.pdf`")
+    parser.add_argument("--dims", type=int, default=16, help="embedding dims (EMBEDDING_PROVIDER picks the model)")
+    parser.add_argument("--encoding", default="float32")
+    parser.add_argument("--rate", type=float, default=None, help="max docs/sec while building")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--keep", type=int, default=2, help="versions to keep, including the live one")
+    parser.add_argument("--rollback", action="store_true", help="swap back to the previous version and exit")
+    args = parser.parse_args(argv)
+
+    target = LocalSnapshotTarget(args.root, dim=args.dims, encoding=args.encoding)
+    if args.rollback:
+        restored = rollback(target)
+        print(json.dumps({"live": restored or target.current(), "rolled_back": restored is not None}))
+        return 0 if restored else 1
+    with args.chunks.open(encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f if line.strip()]
+    try:
+        report = blue_green_reindex(
+            target, chunks, get_embedder(dims=args.dims),
+            max_docs_per_sec=args.rate, min_recall=args.min_recall, keep=args.keep,
+        )
+    except ReindexValidationError as exc:
+        print(json.dumps(exc.report.__dict__), file=sys.stderr)
+        return 2
+    print(json.dumps(report.__dict__))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
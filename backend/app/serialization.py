@@ -0,0 +1,77 @@
+# backend/app/serialization.py
+"""One JSON encoder for hot responses and the JSONL log.
+
+Uses orjson when it is installed (several times faster than json.dumps,
+emits bytes directly) and falls back to a compact stdlib encoding.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse
+
+from .lazy import optional_import
+
+
+def dumps(obj: Any, *, sort_keys: bool = False) -> bytes:
+    """Serialize `obj` to compact UTF-8 JSON bytes (object keys sorted when `sort_keys`)."""
+    orjson = optional_import("orjson")
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=str).encode("utf-8")
+
+
+def dumps_line(obj: Any) -> bytes:
+    """One JSONL record (newline terminated)."""
+    return dumps(obj) + b"\n"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps().
+
+    Pair it with a typed `response_model`: FastAPI then validates and
+    serializes through pydantic-core instead of the generic jsonable_encoder,
+    and this class only has to turn plain JSON types into bytes.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@dataclass(frozen=True)
+class Representation:
+    """Serialized JSON body plus its strong ETag (a hash of exactly these bytes).
+
+    The body is a canonical encoding (sorted object keys), so equal objects
+    get the same ETag whatever order their keys were inserted in.
+
+    `source` is the ETag of the object it was derived from, if any, so a
+    cached derived representation can be checked for staleness cheaply.
+    """
+
+    body: bytes
+    etag: str
+    source: Optional[str] = None
+
+
+def representation(obj: Any, *, source: Optional[str] = None) -> Representation:
+    body = dumps(obj, sort_keys=True)
+    return Representation(body, '"%s"' % hashlib.sha256(body).hexdigest()[:32], source)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
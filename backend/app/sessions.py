@@ -0,0 +1,235 @@
+# backend/app/sessions.py
+"""Bounded multi-turn context for /rag/answer.
+
+A session keeps its most recent turns verbatim while they fit the session
+token budget. Turns that no longer fit are folded, oldest first, into a
+rolling summary, which is itself capped at a fraction of the budget (its
+oldest lines drop out first). The history handed to the prompt therefore
+stays within `max_tokens` however long the study session runs (only a
+single oversized latest turn is kept whole).
+
+The retrieved docs of the last few turns are kept as well. A follow-up that
+refers back to them reuses those docs instead of searching again: a short
+"why?"/pronoun question whose content words (if any) already appear in the
+previous turn or its snippets, or any question with enough word overlap
+with a recent turn. "What about quicksort?" after a heapsort answer brings
+in a new term, so it searches again.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .ratelimit import estimate_tokens
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_FOLLOW_UP_RE = re.compile(
+    r"^\s*(?:and|but|so|also|then|why|how come|what about|how about|more|explain|elaborate|example)\b"
+    r"|\b(?:it|its|that|this|these|those|they|them|their|the same|above|previous|earlier)\b",
+    re.I,
+)
+_STOPWORDS = frozenset(
+    "a an the is are was were be been of in on at to for from by with and or not what which who whom how why "
+    "when where does do did can could would should will this that these those it its i you we they me my your "
+    "about into than then there here as if so".split()
+)
+
+# "ANSWER based on retrieved docs: " and similar scaffolding in stored answers.
+_ANSWER_PREFIX_RE = re.compile(r"^ANSWER based on [^:]*:\s*")
+
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD_RE.findall((text or "").lower()) if w not in _STOPWORDS and len(w) > 2}
+
+
+def extractive_summary(question: str, answer: str, *, max_chars: int = 160) -> str:
+    """One summary line per folded turn: the question and the answer's first sentence."""
+    first = _SENTENCE_RE.split(_ANSWER_PREFIX_RE.sub("", answer or "").strip(), 1)[0]
+    line = f"- Asked: {question.strip()} -> {first}"
+    return line if len(line) <= max_chars else line[: max_chars - 3].rstrip() + "..."
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    tokens: int
+    docs: Optional[List[Dict[str, Any]]] = None  # kept for the last `reuse_turns` turns only
+
+
+@dataclass
+class Session:
+    id: str
+    owner: Optional[str] = None
+    course_id: Optional[str] = None
+    turns: Deque[Turn] = field(default_factory=deque)
+    summary: List[str] = field(default_factory=list)
+    turn_count: int = 0
+    updated_at: float = 0.0
+
+    @property
+    def tokens(self) -> int:
+        return sum(t.tokens for t in self.turns) + sum(estimate_tokens(s) for s in self.summary)
+
+    def history(self) -> str:
+        """Prompt block: rolling summary first, then the verbatim recent turns.
+
+        Use SessionStore.history() while other requests may record turns.
+        """
+        parts: List[str] = []
+        if self.summary:
+            parts.append("Summary of earlier turns:\n" + "\n".join(self.summary))
+        for t in self.turns:
+            parts.append(f"Student: {t.question}\nAssistant: {_ANSWER_PREFIX_RE.sub('', t.answer)}")
+        return "\n".join(parts)
+
+
+class SessionStore:
+    """In-process LRU of Sessions with idle expiry.
+
+    - max_tokens: budget for summary + verbatim turns of one session.
+    - summary_share: fraction of the budget the rolling summary may use.
+    - reuse_turns: how many recent turns keep their docs for reuse.
+    - summarizer(question, answer) -> one summary line; extractive by default,
+      can be swapped for an LLM-backed one.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_tokens: int = 1024,
+        summary_share: float = 0.25,
+        reuse_turns: int = 2,
+        reuse_overlap: float = 0.3,
+        ttl: float = 3600.0,
+        max_sessions: int = 10_000,
+        summarizer: Optional[Callable[[str, str], str]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_tokens = max(1, int(max_tokens))
+        self.summary_tokens = max(1, int(self.max_tokens * float(summary_share)))
+        self.reuse_turns = max(0, int(reuse_turns))
+        self.reuse_overlap = float(reuse_overlap)
+        self.ttl = float(ttl)
+        self.max_sessions = max(1, int(max_sessions))
+        self.summarizer = summarizer or extractive_summary
+        self._clock = clock
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str, *, owner: Optional[str] = None, create: bool = True) -> Optional[Session]:
+        """The live session for `session_id` (created if missing). Another owner's session is never returned."""
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.updated_at > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is not None:
+                if session.owner != owner:
+                    return None
+                self._sessions.move_to_end(session_id)
+                return session
+            if not create:
+                return None
+            session = self._sessions[session_id] = Session(id=session_id, owner=owner, updated_at=now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id: str, *, owner: Optional[str] = None) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.owner != owner:
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def history(self, session: Session) -> str:
+        with self._lock:
+            return session.history()
+
+    def reusable_docs(self, session: Session, question: str, *, course_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Docs from recent turns if `question` follows up on the same material, else None."""
+        with self._lock:
+            if session.course_id != course_id:
+                return None
+            recent = [t for t in session.turns if t.docs]
+        if not recent:
+            return None
+        asked = _terms(question)
+        seen = [
+            _terms(t.question) | _terms(" ".join(str(d.get("snippet", "")) for d in t.docs or []))
+            for t in recent
+        ]
+        if _FOLLOW_UP_RE.search(question) and len(asked) <= 3 and (not asked or asked & seen[-1]):
+            return recent[-1].docs  # "why is that?", "how does its queue work?"
+        if not asked:
+            return None
+        for turn, terms in zip(reversed(recent), reversed(seen)):
+            if len(asked & terms) / len(asked) >= self.reuse_overlap:
+                return turn.docs
+        return None
+
+    def record(
+        self,
+        session: Session,
+        question: str,
+        answer: str,
+        docs: Optional[List[Dict[str, Any]]] = None,
+        *,
+        course_id: Optional[str] = None,
+    ) -> None:
+        """Append a turn, then fold the oldest turns into the summary until the budget holds."""
+        with self._lock:
+            if session.course_id != course_id:
+                for t in session.turns:
+                    t.docs = None  # another course's material is never reused
+            session.course_id = course_id
+            session.turns.append(Turn(question, answer, estimate_tokens(question) + estimate_tokens(answer), docs))
+            session.turn_count += 1
+            session.updated_at = self._clock()
+            for i, t in enumerate(reversed(session.turns)):
+                if i >= self.reuse_turns:
+                    t.docs = None
+            # keep at least the newest turn verbatim
+            while len(session.turns) > 1 and session.tokens > self.max_tokens:
+                old = session.turns.popleft()
+                session.summary.append(self.summarizer(old.question, old.answer))
+                while len(session.summary) > 1 and sum(estimate_tokens(s) for s in session.summary) > self.summary_tokens:
+                    session.summary.pop(0)
+
+
+class ReusedSearch:
+    """Search client that answers from a previous turn's docs (no retrieval)."""
+
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self.docs = docs
+
+    def search(self, query: str, top_k: int = 5, rerank: bool = False, course_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [dict(d) for d in self.docs[:top_k]]
+
+
+# Factory
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore(
+            max_tokens=int(os.environ.get("SESSION_TOKEN_BUDGET", "1024")),
+            ttl=float(os.environ.get("SESSION_TTL_SECONDS", "3600")),
+            max_sessions=int(os.environ.get("SESSION_MAX", "10000")),
+        )
+    return _session_store
@@ -0,0 +1,343 @@
+# backend/app/snapshot.py
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .ingest import EmbedderMismatchError, embedder_info, get_embedder
+from .vectorstore import LocalVectorIndex, ProductQuantizer, SectionIndex, VectorColumn, _Partition
+
+logger = logging.getLogger(__name__)
+
+# Snapshot layout (one directory; the snapshot path is a symlink to it):
+#   manifest.json  format version, dim, encoding, embedder {name, dims}, PQ
+#                  codebooks, per-partition row ranges
+#   meta.json      columnar metadata: {"columns": {"id": [...], "text": [...], ...}}
+#   vectors.bin    raw VectorColumn codes, partitions back to back
+#   scales.bin     int8 per-vector scales (empty for float32/fp16)
+#   pq.bin         PQ codes (empty without a ProductQuantizer)
+SNAPSHOT_FORMAT = 1
+_BLOBS = ("vectors.bin", "scales.bin", "pq.bin")
+
+
+class ColumnarDocs:
+    """Row view over metadata columns; dicts are only built for rows actually read."""
+
+    def __init__(self, columns: Dict[str, List[Any]], start: int, stop: int):
+        self._columns = columns
+        self._start = start
+        self._stop = stop
+        self._extra: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return self._stop - self._start + len(self._extra)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        n = self._stop - self._start
+        if i >= n:
+            return self._extra[i - n]
+        row = self._start + i
+        return {k: col[row] for k, col in self._columns.items() if col[row] is not None}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def append(self, doc: Dict[str, Any]) -> None:
+        self._extra.append(doc)
+
+
+def _link_target(path: Path) -> Optional[Path]:
+    return path.parent / os.readlink(path) if path.is_symlink() else None
+
+
+def save_snapshot(index: LocalVectorIndex, path: Path, *, embedder: Any = None) -> Path:
+    """Write `index` as the snapshot `path` (replaced as a whole).
+
+    The files go to a fresh hidden sibling directory and `path` is a symlink
+    to it, swapped in with os.replace, so a concurrent load_snapshot sees the
+    old or the new snapshot in full. (A `path` that is still a plain
+    directory is moved aside first, once.) `embedder` is recorded in the
+    manifest; without it the index's own `embedded_with` is kept.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:12]}")
+    tmp.mkdir()
+
+    partitions: List[Dict[str, Any]] = []
+    columns: Dict[str, List[Any]] = {"id": []}
+    keys: List[str] = []
+    offsets = {name: 0 for name in _BLOBS}
+    row = 0
+    with (tmp / "vectors.bin").open("wb") as vf, (tmp / "scales.bin").open("wb") as sf, (tmp / "pq.bin").open("wb") as pf:
+        for course_id, part in sorted(index._partitions.items()):
+            n = len(part.ids)
+            entry = {"course_id": course_id, "row_start": row, "rows": n}
+            for name, fh, data in (
+                ("vectors.bin", vf, part.vectors.codes),
+                ("scales.bin", sf, part.vectors.scales),
+                ("pq.bin", pf, part.pq_codes),
+            ):
+                raw = data.tobytes()
+                fh.write(raw)
+                entry[name] = [offsets[name], len(raw)]
+                offsets[name] += len(raw)
+            partitions.append(entry)
+            columns["id"].extend(part.ids)
+            for i in range(n):
+                doc = part.docs[i]
+                for k in doc:
+                    if k not in columns:
+                        columns[k] = [None] * row + [None] * i
+                        keys.append(k)
+                for k in keys:
+                    columns[k].append(doc.get(k))
+            row += n
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "dim": index.dim,
+        "encoding": index.encoding,
+        "embedder": embedder_info(embedder) if embedder is not None else index.embedded_with,
+        "rescore_factor": index.rescore_factor,
+        "pq": index.pq.codebooks if index.pq is not None else None,
+        "rows": row,
+        "partitions": partitions,
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    (tmp / "meta.json").write_text(json.dumps({"columns": columns}, ensure_ascii=False), encoding="utf-8")
+
+    link = path.with_name(f".{path.name}.link")
+    if link.is_symlink():
+        link.unlink()
+    os.symlink(tmp.name, link)
+    old = _link_target(path)
+    if old is None and path.exists():
+        old = path.with_name(f".{path.name}.{uuid.uuid4().hex[:12]}")
+        os.replace(path, old)
+    os.replace(link, path)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def remove_snapshot(path: Path) -> None:
+    """Delete the snapshot `path` and the directory it links to."""
+    path = Path(path)
+    target = _link_target(path)
+    if target is not None:
+        path.unlink()
+        shutil.rmtree(target, ignore_errors=True)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _map(path: Path) -> memoryview:
+    size = path.stat().st_size
+    if size == 0:
+        return memoryview(b"")
+    with path.open("rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm)
+
+
+def load_snapshot(path: Path) -> LocalVectorIndex:
+    """Open a snapshot without copying vectors: blobs are memory-mapped read-only,
+    so worker processes share the same page-cache pages."""
+    path = Path(path)
+    try:
+        return _load(Path(os.path.realpath(path)))
+    except FileNotFoundError:
+        if not path.is_symlink():
+            raise
+        # replaced (and the old directory removed) while we were reading it
+        return _load(Path(os.path.realpath(path)))
+
+
+def _load(path: Path) -> LocalVectorIndex:
+    manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r} in {path}")
+    columns = json.loads((path / "meta.json").read_text(encoding="utf-8"))["columns"]
+
+    dim = int(manifest["dim"])
+    pq = ProductQuantizer(dim, manifest["pq"]) if manifest.get("pq") else None
+    index = LocalVectorIndex(dim, encoding=manifest["encoding"], pq=pq, rescore_factor=manifest["rescore_factor"])
+    index.embedded_with = manifest.get("embedder")
+    blobs = {name: _map(path / name) for name in _BLOBS}
+    typecode = VectorColumn.TYPECODES[index.encoding]
+    ids = columns["id"]
+
+    for entry in manifest["partitions"]:
+        start, n = entry["row_start"], entry["rows"]
+
+        def view(name: str, fmt: str) -> memoryview:
+            off, length = entry[name]
+            return blobs[name][off:off + length].cast(fmt)
+
+        part = _Partition(
+            vectors=VectorColumn(dim, index.encoding, codes=view("vectors.bin", typecode), scales=view("scales.bin", "f")),
+            ids=ids[start:start + n],
+            docs=ColumnarDocs(columns, start, start + n),  # type: ignore[arg-type]
+            pq_codes=view("pq.bin", "B"),
+        )
+        index._partitions[entry["course_id"]] = part
+    return index
+
+
+def build_snapshot(
+    chunks: Sequence[Dict[str, Any]],
+    embedder: Any,
+    path: Path,
+    *,
+    dim: Optional[int] = None,
+    **index_kwargs: Any,
+) -> LocalVectorIndex:
+    """Embed `chunk_pages` output, build a LocalVectorIndex and snapshot it to `path`."""
+    vectors = embedder.embed([c["text"] for c in chunks])
+    index = LocalVectorIndex(dim or (len(vectors[0]) if vectors else getattr(embedder, "dims", 0)), **index_kwargs)
+    index.add_chunks(chunks, vectors)
+    save_snapshot(index, path, embedder=embedder)
+    return index
+
+
+def embedder_for(index: LocalVectorIndex) -> Any:
+    """The configured embedder (ingest.get_embedder) for querying `index`.
+
+    Its dims default to the index's. Raises EmbedderMismatchError when it is
+    not the model recorded in the snapshot manifest, or its dims differ.
+    """
+    recorded = index.embedded_with
+    embedder = get_embedder(dims=int(os.environ.get("EMBEDDING_DIMS") or index.dim))
+    info = embedder_info(embedder)
+    if info["dims"] != index.dim or (recorded and info != recorded):
+        raise EmbedderMismatchError(
+            f"index was built with {recorded or {'dims': index.dim}}, configured embedder is {info}"
+        )
+    return embedder
+
+
+# Blue/green alias: a snapshot root holding version directories (v0001, ...)
+# and a CURRENT file naming the live one. See reindex.py.
+ALIAS_FILE = "CURRENT"
+
+
+def resolve_snapshot(path: Path) -> Path:
+    """`path` itself, or the version directory its CURRENT alias file names."""
+    alias = Path(path) / ALIAS_FILE
+    if alias.is_file():
+        return Path(path) / alias.read_text(encoding="utf-8").strip()
+    return Path(path)
+
+
+def set_snapshot_alias(root: Path, version: str) -> None:
+    """Atomically point `root`'s CURRENT alias at `version`."""
+    root = Path(root)
+    if not (root / version / "manifest.json").exists():
+        raise FileNotFoundError(f"No snapshot {version!r} under {root}")
+    tmp = root / (ALIAS_FILE + ".tmp")
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, root / ALIAS_FILE)
+    served = os.environ.get("INDEX_SNAPSHOT_PATH")
+    if _snapshot_index is not None and served and Path(served).resolve() == root.resolve():
+        refresh_snapshot()  # swapped by this process: serve it without waiting for the watcher
+
+
+# Factory
+
+_snapshot_index: Optional[LocalVectorIndex] = None
+_snapshot_path: Optional[Path] = None
+_section_index: Optional[SectionIndex] = None
+_snapshot_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+
+def refresh_snapshot() -> Optional[LocalVectorIndex]:
+    """Load the snapshot INDEX_SNAPSHOT_PATH currently points at, if it changed, and swap it in.
+
+    Follows the CURRENT alias of a blue/green root and the symlink that
+    save_snapshot swaps. Loads are serialized; readers keep using the old
+    index until the new one is fully loaded, then see it on their next call
+    (requests already holding the old index finish on it).
+    """
+    global _snapshot_index, _snapshot_path, _section_index
+    path = os.environ.get("INDEX_SNAPSHOT_PATH")
+    if not path or not Path(path).exists():
+        return _snapshot_index
+    with _snapshot_lock:
+        target = Path(os.path.realpath(resolve_snapshot(Path(path))))
+        if _snapshot_index is None or target != _snapshot_path:
+            index = load_snapshot(target)
+            sections = _section_index_for(index)  # summaries built before the swap, too
+            _snapshot_index, _snapshot_path = index, target
+            if sections is not None:
+                _section_index = sections
+        return _snapshot_index
+
+
+def _watch(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_snapshot()
+        except Exception:
+            logger.exception("Snapshot refresh failed; still serving %s", _snapshot_path)
+
+
+def get_snapshot_index() -> Optional[LocalVectorIndex]:
+    """Return the index from INDEX_SNAPSHOT_PATH, or None.
+
+    Only the first call loads on the caller's thread. After that a
+    background thread re-checks the path every SNAPSHOT_POLL_SECONDS
+    (default 5, 0 disables) and preloads a swapped-in version, so the
+    request path never reads CURRENT or waits on a load. Swaps made by this
+    process (reindex, ingestion jobs) are picked up at once.
+    """
+    global _watcher
+    index = _snapshot_index
+    if index is not None:
+        return index
+    index = refresh_snapshot()
+    interval = float(os.environ.get("SNAPSHOT_POLL_SECONDS", "5") or 0)
+    if index is not None and interval > 0:
+        with _snapshot_lock:
+            if _watcher is None:
+                _watcher = threading.Thread(target=_watch, args=(interval,), name="snapshot-watch", daemon=True)
+                _watcher.start()
+    return index
+
+
+def _section_index_for(index: LocalVectorIndex) -> Optional[SectionIndex]:
+    """A built SectionIndex over `index` when SECTION_TOP_K > 0, else None."""
+    top = int(os.environ.get("SECTION_TOP_K", "0") or 0)
+    if top <= 0:
+        return None
+    cap = os.environ.get("SECTION_MAX_CANDIDATES")
+    return SectionIndex(index, top_sections=top, max_candidates=int(cap) if cap else None).build()
+
+
+def get_section_index() -> Optional[SectionIndex]:
+    """Two-stage SectionIndex over the snapshot when SECTION_TOP_K > 0, else None.
+
+    SECTION_MAX_CANDIDATES optionally caps the chunks scored in stage two.
+    Summaries are built when a snapshot is loaded (by the refresh thread for
+    swapped-in versions), not per request.
+    """
+    global _section_index
+    if int(os.environ.get("SECTION_TOP_K", "0") or 0) <= 0:
+        return None
+    index = get_snapshot_index()
+    if index is None:
+        return None
+    sections = _section_index
+    if sections is None or sections.index is not index:
+        sections = _section_index = _section_index_for(index)
+    return sections
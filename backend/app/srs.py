@@ -0,0 +1,345 @@
+# backend/app/srs.py
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right, insort
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400.0
+
+# SM-2 defaults
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# Cap on the review interval (~100 years); also keeps it within the uint32 column.
+MAX_INTERVAL_DAYS = 36500
+
+
+def sm2_update(ease: float, interval: int, reps: int, quality: int) -> Tuple[float, int, int]:
+    """Apply one SM-2 review step.
+
+    quality is 0..5 (>= 3 counts as recalled). Returns (ease, interval_days, reps);
+    the interval is capped at MAX_INTERVAL_DAYS.
+    """
+    q = max(0, min(5, int(quality)))
+    if q < 3:
+        reps = 0
+        interval = 1
+    else:
+        if reps == 0:
+            interval = 1
+        elif reps == 1:
+            interval = 6
+        else:
+            interval = min(MAX_INTERVAL_DAYS, max(1, int(round(interval * ease))))
+        reps += 1
+    ease = ease + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+    return max(MIN_EASE, ease), interval, reps
+
+
+def quality_from_result(result: Dict[str, Any]) -> int:
+    """Map a /quiz/submit result entry to an SM-2 quality grade."""
+    if result.get("quality") is not None:
+        return max(0, min(5, int(result["quality"])))
+    return 4 if result.get("correct") is True else 1
+
+
+@dataclass
+class ReviewState:
+    user_id: str
+    question_id: str
+    ease: float
+    interval: int
+    reps: int
+    due: float
+    quiz_id: str = ""
+
+
+class ReviewStore:
+    """Array-backed per-(user, quiz, question) review state.
+
+    Each review lives in a slot; the numeric state is kept in parallel
+    `array` columns (a few bytes per field instead of one boxed object per
+    review). Per user we keep a list of (due, slot) sorted by due date so
+    "what's due" is a bisect + slice.
+    """
+
+    def __init__(self) -> None:
+        self._slots: Dict[Tuple[str, str, str], int] = {}
+        self._keys: List[Tuple[str, str, str]] = []  # (user_id, quiz_id, question_id)
+        self._ease = array("f")
+        self._interval = array("I")
+        self._reps = array("H")
+        self._due = array("d")
+        self._by_user: Dict[str, List[Tuple[float, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _slot_for(self, user_id: str, quiz_id: str, question_id: str, now: float) -> int:
+        key = (user_id, quiz_id, question_id)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._keys)
+            self._slots[key] = slot
+            self._keys.append(key)
+            self._ease.append(DEFAULT_EASE)
+            self._interval.append(0)
+            self._reps.append(0)
+            self._due.append(now)
+            insort(self._by_user.setdefault(user_id, []), (now, slot))
+        return slot
+
+    def _reindex(self, user_id: str, slot: int, old_due: float, new_due: float) -> None:
+        idx = self._by_user[user_id]
+        pos = bisect_right(idx, (old_due, slot)) - 1
+        if pos >= 0 and idx[pos] == (old_due, slot):
+            del idx[pos]
+        insort(idx, (new_due, slot))
+
+    def review(
+        self, user_id: str, question_id: str, quality: int, *, quiz_id: str = "", now: Optional[float] = None
+    ) -> ReviewState:
+        now = time.time() if now is None else now
+        slot = self._slot_for(user_id, quiz_id, question_id, now)
+        ease, interval, reps = sm2_update(self._ease[slot], self._interval[slot], self._reps[slot], quality)
+        old_due = self._due[slot]
+        new_due = now + interval * DAY_SECONDS
+        self._ease[slot] = ease
+        self._interval[slot] = interval
+        self._reps[slot] = min(reps, 0xFFFF)
+        self._due[slot] = new_due
+        self._reindex(user_id, slot, old_due, new_due)
+        return self._state(slot)
+
+    def get(self, user_id: str, question_id: str, *, quiz_id: str = "") -> Optional[ReviewState]:
+        slot = self._slots.get((user_id, quiz_id, question_id))
+        if slot is None:
+            return None
+        return self._state(slot)
+
+    def _state(self, slot: int) -> ReviewState:
+        user_id, quiz_id, question_id = self._keys[slot]
+        return ReviewState(
+            user_id=user_id,
+            quiz_id=quiz_id,
+            question_id=question_id,
+            ease=round(float(self._ease[slot]), 4),
+            interval=int(self._interval[slot]),
+            reps=int(self._reps[slot]),
+            due=float(self._due[slot]),
+        )
+
+    def due(self, user_id: str, *, now: Optional[float] = None, limit: int = 20) -> List[ReviewState]:
+        """Return reviews for user_id whose due date is <= now, earliest first."""
+        now = time.time() if now is None else now
+        idx = self._by_user.get(user_id) or []
+        end = bisect_right(idx, (now, len(self._keys)))
+        return [self._state(slot) for _, slot in idx[: min(end, max(0, int(limit)))]]
+
+    # --- persistence -----------------------------------------------------
+    def save(self, path: Path) -> None:
+        """Write the store as raw array columns plus a key list (atomic rename).
+
+        Keys are one JSON array per line, so ids from request bodies may hold
+        any character.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with tmp.open("wb") as f:
+            header = f"{len(self._keys)}\n".encode("ascii")
+            f.write(header)
+            for col in (self._ease, self._interval, self._reps, self._due):
+                col.tofile(f)
+            keys = "\n".join(json.dumps(list(key), ensure_ascii=False) for key in self._keys)
+            f.write(keys.encode("utf-8"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ReviewStore":
+        store = cls()
+        path = Path(path)
+        if not path.exists():
+            return store
+        with path.open("rb") as f:
+            n = int(f.readline().decode("ascii").strip() or 0)
+            for col in (store._ease, store._interval, store._reps, store._due):
+                col.fromfile(f, n)
+            raw = f.read().decode("utf-8")
+        for line in raw.split("\n") if n else []:
+            user_id, quiz_id, question_id = json.loads(line)
+            store._keys.append((user_id, quiz_id, question_id))
+        for slot, (user_id, quiz_id, question_id) in enumerate(store._keys):
+            store._slots[(user_id, quiz_id, question_id)] = slot
+            store._by_user.setdefault(user_id, []).append((store._due[slot], slot))
+        for idx in store._by_user.values():
+            idx.sort()
+        return store
+
+
+class SubmissionBuffer:
+    """Write-behind buffer in front of a ReviewStore.
+
+    submit() only appends to an in-memory queue; the batch is applied to the
+    store (and persisted) once `max_batch` reviews are pending or the oldest
+    pending review is older than `max_delay` seconds. Reads apply pending
+    reviews first so a user always sees their own submissions.
+
+    After start(), a background thread does the flushing (every `max_delay`
+    seconds, or at once when a batch fills up), so requests never wait on
+    the state file being written. close() stops it and flushes what is left.
+    Without start() the caller's thread flushes. The submit lock only guards
+    the queue; applying and saving happen under a separate store lock.
+    """
+
+    def __init__(
+        self,
+        store: ReviewStore,
+        *,
+        max_batch: int = 500,
+        max_delay: float = 2.0,
+        path: Optional[Path] = None,
+    ):
+        self.store = store
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = float(max_delay)
+        self.path = Path(path) if path else None
+        self._pending: Deque[Tuple[str, str, str, int, float]] = deque()
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._dirty = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+
+    def start(self) -> None:
+        """Flush from a background thread from now on."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="srs-flush", daemon=True)
+            self._thread.start()
+
+    def close(self) -> int:
+        """Stop the background thread and flush everything; returns how many were applied."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+        return self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            if self._stop.is_set():
+                break  # close() does the final flush
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("SRS flush failed")
+
+    def submit(
+        self,
+        user_id: str,
+        results: Iterable[Dict[str, Any]],
+        *,
+        quiz_id: str = "",
+        now: Optional[float] = None,
+    ) -> int:
+        """Queue the results of one quiz attempt; returns the number queued."""
+        now = time.time() if now is None else now
+        graded = [
+            (str(qid), quality_from_result(r))
+            for r in results
+            if (qid := r.get("question_id") or r.get("id"))
+        ]
+        queued = 0
+        with self._lock:
+            for qid, quality in graded:
+                self._pending.append((user_id, quiz_id, qid, quality, now))
+                queued += 1
+            if self._pending and self._oldest is None:
+                self._oldest = now
+            should_flush = len(self._pending) >= self.max_batch or (
+                self._oldest is not None and now - self._oldest >= self.max_delay
+            )
+        if should_flush:
+            if self._thread is not None:
+                self._wake.set()
+            else:
+                self.flush()
+        return queued
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _apply(self) -> int:
+        """Move pending reviews into the store (caller holds _store_lock)."""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+            self._oldest = None
+        for user_id, quiz_id, question_id, quality, ts in batch:
+            try:
+                self.store.review(user_id, question_id, quality, quiz_id=quiz_id, now=ts)
+            except Exception:
+                # one bad review must not lose the rest of the batch
+                logger.exception("Dropping SRS review %s/%s/%s", user_id, quiz_id, question_id)
+        if batch:
+            self._dirty = True
+        return len(batch)
+
+    def flush(self) -> int:
+        """Apply all pending reviews to the store and persist it; returns how many were applied."""
+        with self._store_lock:
+            applied = self._apply()
+            if self._dirty:
+                if self.path is not None:
+                    self.store.save(self.path)
+                self._dirty = False
+                self.flushes += 1
+        return applied
+
+    def due(self, user_id: str, *, now: Optional[float] = None, limit: int = 20) -> List[ReviewState]:
+        with self._store_lock:
+            self._apply()  # persisted by the next flush
+            return self.store.due(user_id, now=now, limit=limit)
+
+
+# Factory
+
+_scheduler: Optional[SubmissionBuffer] = None
+
+
+def get_scheduler() -> SubmissionBuffer:
+    """Return the process-wide spaced-repetition scheduler.
+
+    State is persisted to SRS_STATE_PATH when set; otherwise it is in-memory only.
+    Flushing runs on a background thread; call close() on shutdown.
+    """
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+    path = os.environ.get("SRS_STATE_PATH")
+    store = ReviewStore.load(Path(path)) if path else ReviewStore()
+    _scheduler = SubmissionBuffer(
+        store,
+        max_batch=int(os.environ.get("SRS_MAX_BATCH", "500")),
+        max_delay=float(os.environ.get("SRS_MAX_DELAY", "2.0")),
+        path=Path(path) if path else None,
+    )
+    _scheduler.start()
+    return _scheduler
@@ -0,0 +1,442 @@
+# backend/app/vectorstore.py
+from __future__ import annotations
+
+import heapq
+import math
+import operator
+import random
+import struct
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Partition key used for documents that carry no course_id.
+UNSCOPED = ""
+
+ENCODINGS = ("float32", "fp16", "int8")
+
+
+def _normalize(vec: Sequence[float]) -> List[float]:
+    n = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [float(x) / n for x in vec]
+
+
+def _dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(operator.mul, a, b))
+
+
+def _matches(doc: Dict[str, Any], pages: Optional[Tuple[int, int]], section: Optional[str]) -> bool:
+    if pages is not None:
+        page = doc.get("page")
+        if page is None or not (pages[0] <= int(page) <= pages[1]):
+            return False
+    if section is not None and doc.get("section") != section:
+        return False
+    return True
+
+
+class VectorColumn:
+    """Flat, typed storage for unit vectors of one dimension.
+
+    - float32: 4 bytes/element (array "f")
+    - fp16:    2 bytes/element (IEEE half, packed with struct "e")
+    - int8:    1 byte/element + one float32 scale per vector (symmetric
+               scalar quantization, scale = max|x| / 127)
+
+    Compared with a list of Python floats (~32 bytes/element once boxed)
+    this is an 8-32x reduction.
+
+    `codes`/`scales` may also be read-only memoryviews over a memory-mapped
+    snapshot (see snapshot.py); they are copied into arrays on first append.
+    """
+
+    TYPECODES = {"float32": "f", "fp16": "H", "int8": "b"}
+
+    def __init__(self, dim: int, encoding: str = "float32", *, codes: Any = None, scales: Any = None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}, got {encoding!r}")
+        self.dim = int(dim)
+        self.encoding = encoding
+        self.codes = codes if codes is not None else array(self.TYPECODES[encoding])
+        self.scales = scales if scales is not None else array("f")
+
+    def _ensure_writable(self) -> None:
+        if not isinstance(self.codes, array):
+            self.codes = array(self.TYPECODES[self.encoding], self.codes.tobytes())
+        if not isinstance(self.scales, array):
+            self.scales = array("f", self.scales.tobytes())
+
+    def __len__(self) -> int:
+        return len(self.codes) // self.dim if self.dim else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes) + self.scales.itemsize * len(self.scales)
+
+    def append(self, vec: Sequence[float]) -> None:
+        self._ensure_writable()
+        if self.encoding == "float32":
+            self.codes.extend(vec)
+        elif self.encoding == "fp16":
+            self.codes.extend(struct.unpack(f"<{self.dim}H", struct.pack(f"<{self.dim}e", *vec)))
+        else:
+            scale = (max(abs(x) for x in vec) / 127.0) or 1.0
+            self.scales.append(scale)
+            self.codes.extend(max(-127, min(127, int(round(x / scale)))) for x in vec)
+
+    def get(self, row: int) -> Sequence[float]:
+        lo, hi = row * self.dim, (row + 1) * self.dim
+        if self.encoding == "fp16":
+            return struct.unpack(f"<{self.dim}e", self.codes[lo:hi].tobytes())
+        if self.encoding == "int8":
+            scale = self.scales[row]
+            return [c * scale for c in self.codes[lo:hi]]
+        return self.codes[lo:hi]
+
+    def score(self, query: Sequence[float], row: int) -> float:
+        if self.encoding == "int8":
+            lo = row * self.dim
+            return self.scales[row] * _dot(query, self.codes[lo:lo + self.dim])
+        return _dot(query, self.get(row))
+
+
+class ProductQuantizer:
+    """Product quantizer for a fast approximate first pass over many vectors.
+
+    Vectors are split into `m` sub-vectors, each replaced by the id of its
+    nearest centroid (1 byte for ks <= 256). Query scoring uses per-query
+    lookup tables (asymmetric distance computation), so a scan costs `m`
+    table lookups per vector instead of `dim` multiplications.
+    """
+
+    def __init__(self, dim: int, codebooks: List[List[List[float]]]):
+        self.dim = int(dim)
+        self.m = len(codebooks)
+        self.sub = self.dim // self.m
+        self.codebooks = codebooks
+
+    @classmethod
+    def fit(cls, vectors: Sequence[Sequence[float]], *, m: int = 8, ks: int = 256, iters: int = 8, seed: int = 0) -> "ProductQuantizer":
+        if not vectors:
+            raise ValueError("ProductQuantizer.fit needs sample vectors")
+        dim = len(vectors[0])
+        if dim % m:
+            raise ValueError(f"dim {dim} is not divisible by m={m}")
+        if not 1 <= ks <= 256:
+            raise ValueError("ks must be in 1..256")
+        sub = dim // m
+        rng = random.Random(seed)
+        data = [_normalize(v) for v in vectors]
+        codebooks: List[List[List[float]]] = []
+        for j in range(m):
+            pts = [v[j * sub:(j + 1) * sub] for v in data]
+            cents = [list(c) for c in rng.sample(pts, min(ks, len(pts)))]
+            for _ in range(iters):
+                sums = [[0.0] * sub for _ in cents]
+                counts = [0] * len(cents)
+                for p in pts:
+                    c = _nearest(cents, p)
+                    counts[c] += 1
+                    sums[c] = [a + b for a, b in zip(sums[c], p)]
+                cents = [[x / counts[i] for x in sums[i]] if counts[i] else cents[i] for i in range(len(cents))]
+            codebooks.append(cents)
+        return cls(dim, codebooks)
+
+    def encode(self, vec: Sequence[float]) -> List[int]:
+        return [_nearest(self.codebooks[j], vec[j * self.sub:(j + 1) * self.sub]) for j in range(self.m)]
+
+    def tables(self, query: Sequence[float]) -> List[List[float]]:
+        return [
+            [_dot(query[j * self.sub:(j + 1) * self.sub], c) for c in self.codebooks[j]]
+            for j in range(self.m)
+        ]
+
+
+def _nearest(cents: List[List[float]], p: Sequence[float]) -> int:
+    best, best_d = 0, float("inf")
+    for i, c in enumerate(cents):
+        d = sum((a - b) * (a - b) for a, b in zip(c, p))
+        if d < best_d:
+            best, best_d = i, d
+    return best
+
+
+@dataclass
+class _Partition:
+    vectors: VectorColumn
+    ids: List[str] = field(default_factory=list)
+    docs: List[Dict[str, Any]] = field(default_factory=list)
+    pq_codes: Any = field(default_factory=lambda: array("B"))
+
+
+class LocalVectorIndex:
+    """In-process cosine-similarity index partitioned by course_id.
+
+    A course-scoped search only scans that course's partition, and page /
+    section filters are applied before scoring, so k results are always
+    drawn from the eligible set (no post-filtering recall loss).
+
+    Vectors are stored normalized in a compact VectorColumn (`encoding`).
+    Scores are computed from the stored vectors, so with fp16 or int8 they
+    (and near-tie orderings) are approximate, not full-precision cosines.
+    With a ProductQuantizer (`pq`) the scan uses PQ codes and only the best
+    `k * rescore_factor` candidates are re-scored with the stored vectors;
+    a relevant doc that PQ ranks below that cut-off is missed, so PQ
+    ranking is approximate too (raise `rescore_factor` for better recall).
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        *,
+        encoding: str = "float32",
+        pq: Optional[ProductQuantizer] = None,
+        rescore_factor: int = 4,
+    ):
+        if pq is not None and pq.dim != dim:
+            raise ValueError("ProductQuantizer dim does not match index dim")
+        self.dim = int(dim)
+        self.encoding = encoding
+        self.pq = pq
+        self.rescore_factor = max(1, int(rescore_factor))
+        VectorColumn(self.dim, encoding)  # validate encoding early
+        self._partitions: Dict[str, _Partition] = {}
+        # {"name", "dims"} of the embedding model, when known (see snapshot.py)
+        self.embedded_with: Optional[Dict[str, Any]] = None
+
+    def __len__(self) -> int:
+        return sum(len(p.ids) for p in self._partitions.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held by vector storage (codes + scales + PQ codes)."""
+        return sum(p.vectors.nbytes + len(p.pq_codes) for p in self._partitions.values())
+
+    def courses(self) -> List[str]:
+        return sorted(c for c in self._partitions if c)
+
+    def items(self) -> Iterator[Tuple[str, Sequence[float], Dict[str, Any]]]:
+        """(doc_id, stored unit vector, doc) for every row, partition by partition."""
+        for part in self._partitions.values():
+            for i in range(len(part.ids)):
+                yield part.ids[i], part.vectors.get(i), part.docs[i]
+
+    def add(self, doc_id: str, vector: Sequence[float], doc: Dict[str, Any]) -> None:
+        if len(vector) != self.dim:
+            raise ValueError(f"expected vector of dim {self.dim}, got {len(vector)}")
+        key = doc.get("course_id") or UNSCOPED
+        part = self._partitions.get(key)
+        if part is None:
+            part = self._partitions[key] = _Partition(vectors=VectorColumn(self.dim, self.encoding))
+        unit = _normalize(vector)
+        part.ids.append(str(doc_id))
+        part.vectors.append(unit)
+        if self.pq is not None:
+            if not isinstance(part.pq_codes, array):
+                part.pq_codes = array("B", part.pq_codes.tobytes())
+            part.pq_codes.extend(self.pq.encode(unit))
+        part.docs.append(dict(doc))
+
+    def add_chunks(self, chunks: Iterable[Dict[str, Any]], vectors: Iterable[Sequence[float]]) -> int:
+        """Add `chunk_pages` output with matching embeddings; returns the count added."""
+        from .indexer import doc_id_for
+
+        n = 0
+        for chunk, vec in zip(chunks, vectors):
+            meta = chunk.get("metadata") or {}
+            doc = {
+                "text": chunk.get("text", ""),
+                "course_id": chunk.get("course_id") or meta.get("course_id"),
+                "page": chunk.get("page", meta.get("page")),
+                "section": meta.get("section"),
+            }
+            if meta.get("duplicates"):
+                doc["duplicates"] = meta["duplicates"]
+            self.add(doc_id_for(chunk), vec, doc)
+            n += 1
+        return n
+
+    def search(
+        self,
+        vector: Sequence[float],
+        *,
+        k: int = 5,
+        course_id: Optional[str] = None,
+        pages: Optional[Tuple[int, int]] = None,
+        section: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Top-k documents by cosine similarity, each with `id` and `score` keys."""
+        parts = self._parts(course_id)
+        k = max(0, int(k))
+        query = _normalize(vector)
+        if pages is None and section is None:
+            eligible = [(p, i) for p in parts for i in range(len(p.ids))]
+        else:
+            eligible = [(p, i) for p in parts for i in range(len(p.ids)) if _matches(p.docs[i], pages, section)]
+        if self.pq is not None and len(eligible) > k * self.rescore_factor:
+            # approximate first pass: keep the best PQ candidates for re-scoring
+            tables = self.pq.tables(query)
+            m = self.pq.m
+
+            def approx(item: Tuple[_Partition, int]) -> float:
+                p, i = item
+                codes = p.pq_codes[i * m:(i + 1) * m]
+                return sum(tables[j][c] for j, c in enumerate(codes))
+
+            eligible = heapq.nlargest(k * self.rescore_factor, eligible, key=approx)
+        return self._rank(query, eligible, k)
+
+    def _parts(self, course_id: Optional[str]) -> List[_Partition]:
+        if course_id is not None:
+            part = self._partitions.get(course_id)
+            return [part] if part else []
+        return list(self._partitions.values())
+
+    @staticmethod
+    def _rank(query: Sequence[float], eligible: Iterable[Tuple[_Partition, int]], k: int) -> List[Dict[str, Any]]:
+        scored = ((p.vectors.score(query, i), p, i) for p, i in eligible)
+        top = heapq.nlargest(k, scored, key=operator.itemgetter(0))
+        return [dict(p.docs[i], id=p.ids[i], score=float(score)) for score, p, i in top]
+
+
+# (doc_id, stored unit vector, doc), as yielded by LocalVectorIndex.items()
+_Row = Tuple[str, Sequence[float], Dict[str, Any]]
+
+
+@dataclass
+class _Group:
+    """Rows of one course summarized by a single unit centroid."""
+    centroid: List[float]
+    rows: List[_Row]
+
+
+def _centroid(rows: Sequence[_Row], dim: int) -> List[float]:
+    acc = [0.0] * dim
+    for _, vec, _ in rows:
+        acc = list(map(operator.add, acc, vec))
+    return _normalize(acc)
+
+
+class SectionIndex:
+    """Two-stage retrieval over a LocalVectorIndex using section/page summaries.
+
+    Chunks are grouped by the `section` that chunk_pages assigns, and within
+    a section by page. Each group is summarized by the normalized mean of its
+    chunk vectors. A search first scores the section summaries and keeps the
+    best `top_sections`. It then scores only the chunks inside them. When those
+    sections still hold more than `max_candidates` chunks, page summaries
+    inside them are ranked and whole pages are taken until the budget is met.
+    Searches with a `pages` or `section` filter use the flat filtered scan,
+    so a matching chunk outside the best sections is never lost.
+
+    The wrapped index is treated as immutable (served snapshots are): the
+    summaries are built once, by build() or on the first search. Call build()
+    again after adding to the index; snapshot.py does so off the request path.
+    Exposes the same search() signature as LocalVectorIndex, so it can be
+    handed to LocalSearchClient unchanged.
+    """
+
+    def __init__(self, index: LocalVectorIndex, *, top_sections: int = 3, max_candidates: Optional[int] = None):
+        self.index = index
+        self.dim = index.dim
+        self.top_sections = max(1, int(top_sections))
+        self.max_candidates = max_candidates
+        self._sections: Optional[Dict[str, List[_Group]]] = None
+        self._pages: Dict[int, List[_Group]] = {}  # id(section group) -> its page groups
+        self.last_candidates = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def build(self) -> "SectionIndex":
+        by_course: Dict[str, Dict[Any, Dict[Any, List[_Row]]]] = {}
+        for row in self.index.items():
+            doc = row[2]
+            by_section = by_course.setdefault(doc.get("course_id") or UNSCOPED, {})
+            by_section.setdefault(doc.get("section"), {}).setdefault(doc.get("page"), []).append(row)
+        sections: Dict[str, List[_Group]] = {}
+        pages: Dict[int, List[_Group]] = {}
+        for course_id, by_section in by_course.items():
+            groups = sections[course_id] = []
+            for by_page in by_section.values():
+                rows = [r for page_rows in by_page.values() for r in page_rows]
+                group = _Group(_centroid(rows, self.dim), rows)
+                groups.append(group)
+                pages[id(group)] = [_Group(_centroid(r, self.dim), r) for r in by_page.values()]
+        self._sections, self._pages = sections, pages
+        return self
+
+    def search(
+        self,
+        vector: Sequence[float],
+        *,
+        k: int = 5,
+        course_id: Optional[str] = None,
+        pages: Optional[Tuple[int, int]] = None,
+        section: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        if pages is not None or section is not None:
+            # filtered searches are already narrow; the flat filtered scan is exact
+            return self.index.search(vector, k=k, course_id=course_id, pages=pages, section=section)
+        if self._sections is None:
+            self.build()
+        if course_id is not None:
+            groups = self._sections.get(course_id, [])
+        else:
+            groups = [g for gs in self._sections.values() for g in gs]
+        k = max(0, int(k))
+        query = _normalize(vector)
+
+        chosen = heapq.nlargest(self.top_sections, groups, key=lambda g: _dot(query, g.centroid))
+        rows = [r for g in chosen for r in g.rows]
+        if self.max_candidates is not None and len(rows) > self.max_candidates:
+            ranked = sorted(
+                (pg for g in chosen for pg in self._pages[id(g)]),
+                key=lambda pg: _dot(query, pg.centroid),
+                reverse=True,
+            )
+            rows = []
+            for pg in ranked:
+                if rows and len(rows) + len(pg.rows) > self.max_candidates:
+                    break
+                rows.extend(pg.rows)
+        self.last_candidates = len(rows)
+        top = heapq.nlargest(k, ((_dot(query, vec), doc_id, doc) for doc_id, vec, doc in rows), key=operator.itemgetter(0))
+        return [dict(doc, id=doc_id, score=float(score)) for score, doc_id, doc in top]
+
+
+class LocalSearchClient:
+    """Adapter exposing a LocalVectorIndex through the `answer_query` search shape.
+
+    search(query, top_k=..., rerank=..., course_id=...) embeds the query and
+    returns docs as {title, page, snippet, score, ...}.
+    """
+
+    def __init__(self, index: LocalVectorIndex, embedder: Any):
+        self.index = index
+        self.embedder = embedder
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        rerank: bool = False,
+        course_id: Optional[str] = None,
+        pages: Optional[Tuple[int, int]] = None,
+        section: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        vec = self.embedder.embed([query])[0]
+        hits = self.index.search(vec, k=top_k, course_id=course_id, pages=pages, section=section)
+        return [
+            {
+                "id": h["id"],
+                "title": h.get("section") or h.get("course_id") or "Doc",
+                "page": h.get("page"),
+                "snippet": h.get("text", ""),
+                "score": h["score"],
+                "course_id": h.get("course_id"),
+                "section": h.get("section"),
+                **({"duplicates": h["duplicates"]} if h.get("duplicates") else {}),
+            }
+            for h in hits
+        ]
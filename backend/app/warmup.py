@@ -0,0 +1,130 @@
+# backend/app/warmup.py
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CheckResult:
+    name: str
+    ok: bool
+    ms: float
+    required: bool = True
+    error: Optional[str] = None
+
+
+class Warmup:
+    """Ordered startup checks that eagerly build singletons before traffic.
+
+    Each check is a callable registered with add(); it should construct (and
+    ideally exercise) one dependency and raise on failure. run() executes them
+    in order and records timing and errors. The service is ready once every
+    check has run and none of the `required` ones failed; optional checks
+    (e.g. synthetic queries) are reported but never block readiness.
+
+    With retry=True (as start() does), failed required checks are re-run
+    with exponential backoff from `initial_backoff` up to `max_backoff`
+    seconds until they pass or close() is called, so a dependency that was
+    briefly down at startup does not leave the service unready for good.
+    """
+
+    def __init__(self, *, initial_backoff: float = 1.0, max_backoff: float = 60.0) -> None:
+        self._checks: List[tuple] = []
+        self.results: Dict[str, CheckResult] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.initial_backoff = float(initial_backoff)
+        self.max_backoff = float(max_backoff)
+        self._done = threading.Event()
+        self._stop = threading.Event()
+
+    def add(self, name: str, check: Callable[[], Any], *, required: bool = True) -> None:
+        self._checks.append((name, check, required))
+
+    def run(self, *, retry: bool = False) -> bool:
+        self.started_at = time.time()
+        for name, check, required in self._checks:
+            self._run_check(name, check, required)
+        self.finished_at = time.time()
+        self._done.set()
+        logger.info("Warm-up finished ready=%s", self.ready)
+        if retry:
+            self._retry_failed()
+        return self.ready
+
+    def _run_check(self, name: str, check: Callable[[], Any], required: bool) -> None:
+        start = time.perf_counter()
+        try:
+            check()
+            error = None
+        except Exception as exc:
+            logger.warning("Warm-up check %s failed", name, exc_info=True)
+            error = f"{type(exc).__name__}: {exc}"
+        self.results[name] = CheckResult(
+            name, error is None, round((time.perf_counter() - start) * 1000.0, 2), required, error
+        )
+
+    def _retry_failed(self) -> None:
+        delay = self.initial_backoff
+        while not self.ready and not self._stop.wait(delay):
+            for name, check, required in self._checks:
+                if required and not self.results[name].ok:
+                    self._run_check(name, check, required)
+            delay = min(delay * 2, self.max_backoff)
+        if self.ready:
+            logger.info("Warm-up ready after retrying failed checks")
+
+    def start(self) -> threading.Thread:
+        """Run the checks on a daemon thread so liveness (/health) answers meanwhile."""
+        thread = threading.Thread(target=self.run, kwargs={"retry": True}, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        """Stop retrying failed checks."""
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and all(r.ok for r in self.results.values() if r.required)
+
+    def status(self) -> Dict[str, Any]:
+        if not self._done.is_set():
+            state = "starting" if self.started_at else "pending"
+        else:
+            state = "ready" if self.ready else "failed"
+        return {
+            "status": state,
+            "checks": {
+                r.name: {"ok": r.ok, "ms": r.ms, "required": r.required, **({"error": r.error} if r.error else {})}
+                for r in self.results.values()
+            },
+        }
+
+
+def synthetic_queries() -> List[str]:
+    """Queries from WARMUP_QUERIES ("|"-separated) run once at startup to prime caches."""
+    raw = os.environ.get("WARMUP_QUERIES", "")
+    return [q.strip() for q in raw.split("|") if q.strip()]
+
+
+# Factory
+
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
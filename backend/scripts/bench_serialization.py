@@ -0,0 +1,74 @@
+"""Per-request serialization cost of /rag/answer: generic path vs typed + fast encoder.
+
+Usage (from the repo root):
+    PYTHONPATH=.:backend python backend/scripts/bench_serialization.py [--citations 8] [--n 2000]
+
+"before" mirrors the old route: plain dict -> jsonable_encoder -> json.dumps.
+"after" mirrors the current route: validate against RagAnswerResponse,
+serialize with pydantic-core, render with serialization.dumps (orjson when installed).
+"""
+import argparse
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.app.lazy import optional_import
+from backend.app.main import RagAnswerResponse
+from backend.app.serialization import dumps
+
+
+def sample_payload(citations: int) -> dict:
+    return {
+        "answer": "ANSWER based on retrieved docs: " + "Dynamic programming stores subproblem results. " * 6,
+        "citations": [
+            {
+                "title": f"Lecture {i}",
+                "page": i,
+                "snippet": "Memoization caches the results of expensive calls ... " * 4,
+                "score": 0.9 - i * 0.01,
+                "spans": [{"start": 0, "end": 54, "score": 0.81}, {"start": 60, "end": 118, "score": 0.77}],
+            }
+            for i in range(citations)
+        ],
+        "metadata": {"top_k": citations, "course_id": "CS101", "confidence": 0.9, "k_used": citations},
+    }
+
+
+def before(payload: dict) -> bytes:
+    return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+_adapter = TypeAdapter(RagAnswerResponse)
+
+
+def after(payload: dict) -> bytes:
+    return dumps(_adapter.dump_python(_adapter.validate_python(payload), mode="json", exclude_unset=True))
+
+
+def bench(fn, payload: dict, n: int) -> float:
+    fn(payload)
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(payload)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--citations", type=int, default=8)
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    payload = sample_payload(args.citations)
+    assert json.loads(before(payload)) == json.loads(after(payload))
+    b, a = bench(before, payload, args.n), bench(after, payload, args.n)
+    encoder = "orjson" if optional_import("orjson") is not None else "json (orjson not installed)"
+    print(f"citations={args.citations} bytes={len(after(payload))} encoder={encoder}")
+    print(f"before: {b:8.1f} us/request")
+    print(f"after:  {a:8.1f} us/request  ({b / a:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.app import admission
+from backend.app.admission import AdmissionController
+from backend.app.main import app
+
+client = TestClient(app)
+
+
+def test_queue_hands_slots_over_in_order_and_sheds_when_full():
+    async def scenario():
+        ctrl = AdmissionController("t", max_concurrent=1, max_queue=1, max_wait=1.0)
+        order = []
+
+        async def job(name, hold):
+            await ctrl.acquire()
+            order.append(name)
+            await asyncio.sleep(hold)
+            ctrl.release(hold)
+
+        first = asyncio.create_task(job("a", 0.05))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(job("b", 0.0))
+        await asyncio.sleep(0)
+        assert ctrl.active == 1 and ctrl.queued == 1
+        with pytest.raises(HTTPException) as exc:
+            await ctrl.acquire()
+        assert exc.value.status_code == 503
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        await asyncio.gather(first, second)
+        return ctrl, order
+
+    ctrl, order = asyncio.run(scenario())
+    assert order == ["a", "b"]
+    assert ctrl.active == 0
+    assert ctrl.stats()["admitted"] == 2 and ctrl.stats()["rejected"] == 1
+
+
+def test_waiters_time_out_at_their_deadline():
+    async def scenario():
+        ctrl = AdmissionController("t", max_concurrent=1, max_queue=4, max_wait=5.0)
+        await ctrl.acquire()
+        with pytest.raises(HTTPException):
+            await ctrl.acquire(timeout=0.05)
+        ctrl.release()
+        return ctrl
+
+    ctrl = asyncio.run(scenario())
+    assert ctrl.timed_out == 1 and ctrl.active == 0 and ctrl.queued == 0
+
+
+def test_expected_wait_beyond_deadline_is_shed_immediately():
+    async def scenario():
+        ctrl = AdmissionController("t", max_concurrent=1, max_queue=4, max_wait=5.0)
+        ctrl.release(2.0)  # observed 2s service time
+        await ctrl.acquire()
+        with pytest.raises(HTTPException) as exc:
+            await ctrl.acquire(timeout=0.5)
+        return ctrl, exc.value
+
+    ctrl, err = asyncio.run(scenario())
+    assert "expected wait" in err.detail
+    assert ctrl.timed_out == 0 and ctrl.rejected == 1
+
+
+def test_routes_return_503_with_retry_after_and_metrics(monkeypatch):
+    monkeypatch.setitem(admission._controllers, "quiz", AdmissionController("quiz", max_concurrent=0, max_queue=0))
+    resp = client.post("/quiz/generate", json={"query": "graphs"})
+    assert resp.status_code == 503
+    assert "Retry-After" in resp.headers
+
+    assert client.post("/rag/answer", json={"query": "What is RAG?"}).status_code == 200
+    stats = client.get("/metrics").json()["admission"]
+    assert stats["quiz"]["rejected"] == 1
+    assert stats["rag"]["active"] == 0 and stats["rag"]["admitted"] >= 1
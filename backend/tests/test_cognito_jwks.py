@@ -0,0 +1,155 @@
+import base64
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from backend.app import auth
+from backend.app.auth import JWKSCache
+from backend.app.auth import RealCognitoClient
+
+REGION = "us-east-1"
+POOL = "us-east-1_test"
+ISSUER = f"https://cognito-idp.{REGION}.amazonaws.com/{POOL}"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _int_b64(i: int) -> str:
+    return _b64(i.to_bytes((i.bit_length() + 7) // 8, "big"))
+
+
+def _sign(claims, key, kid):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    header = _b64(json.dumps({"alg": "RS256", "kid": kid}).encode())
+    payload = _b64(json.dumps(claims).encode())
+    sig = key.sign(f"{header}.{payload}".encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{header}.{payload}.{_b64(sig)}"
+
+
+@pytest.fixture(scope="module")
+def keys():
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    return {kid: rsa.generate_private_key(public_exponent=65537, key_size=2048) for kid in ("k1", "k2")}
+
+
+def _jwks(keys, kids):
+    nums = {kid: keys[kid].public_key().public_numbers() for kid in kids}
+    return {"keys": [{"kty": "RSA", "kid": kid, "n": _int_b64(nums[kid].n), "e": _int_b64(nums[kid].e)} for kid in kids]}
+
+
+def _claims(**overrides):
+    c = {
+        "sub": "abc-123",
+        "cognito:username": "alice",
+        "email": "alice@example.com",
+        "cognito:groups": ["professor"],
+        "iss": ISSUER,
+        "token_use": "id",
+        "aud": "client-1",
+        "exp": time.time() + 300,
+    }
+    c.update(overrides)
+    return c
+
+
+def test_verify_valid_token_and_cache_skips_rsa(keys, monkeypatch):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return _jwks(keys, ["k1"])
+
+    client = RealCognitoClient(POOL, REGION, client_id="client-1", jwks_fetcher=fetch)
+    token = _sign(_claims(), keys["k1"], "k1")
+    info = client.verify_token(token)
+    assert info["username"] == "alice"
+    assert info["role"] == "professor"
+
+    calls = []
+    monkeypatch.setattr(auth, "_rs256_verify", lambda *a: calls.append(1) or False)
+    assert client.verify_token(token)["sub"] == "abc-123"
+    assert calls == []
+    assert len(fetches) == 1
+
+
+def test_rejects_tampered_expired_and_wrong_audience(keys):
+    client = RealCognitoClient(POOL, REGION, client_id="client-1", jwks_fetcher=lambda: _jwks(keys, ["k1"]))
+    key = keys["k1"]
+
+    header, payload, sig = _sign(_claims(), key, "k1").split(".")
+    forged = _b64(json.dumps(_claims(**{"cognito:groups": ["admin"], "sub": "evil"})).encode())
+    for token in (
+        f"{header}.{forged}.{sig}",
+        _sign(_claims(exp=time.time() - 1), key, "k1"),
+        _sign(_claims(exp="tomorrow"), key, "k1"),
+        _sign(_claims(exp=None), key, "k1"),
+        _sign(_claims(nbf=time.time() + 300), key, "k1"),
+        _sign(_claims(aud="other-client"), key, "k1"),
+        _sign(_claims(iss="https://evil.example.com"), key, "k1"),
+        _sign([1, 2], key, "k1"),
+        f"{header}.{_b64(b'[1]')}.{sig}",
+        "not-a-jwt",
+    ):
+        with pytest.raises(HTTPException) as exc:
+            client.verify_token(token)
+        assert exc.value.status_code == 401
+
+
+def test_unknown_kid_triggers_refresh_for_key_rotation(keys):
+    published = {"kids": ["k1"]}
+    client = RealCognitoClient(POOL, REGION, jwks_fetcher=lambda: _jwks(keys, published["kids"]))
+    client.jwks.min_refresh_interval = 0.0
+    assert client.verify_token(_sign(_claims(), keys["k1"], "k1"))["role"] == "professor"
+
+    published["kids"] = ["k2"]
+    info = client.verify_token(_sign(_claims(**{"cognito:groups": []}), keys["k2"], "k2"))
+    assert info["role"] == "student"
+
+
+def test_jwks_failures_back_off_and_share_one_fetch():
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise OSError("IdP unreachable")
+
+    cache = JWKSCache(down, initial_backoff=60.0)
+    with pytest.raises(OSError):
+        cache.get("k1")
+    # while backing off, requests fail fast instead of hitting the IdP again
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            cache.get("k1")
+    assert len(calls) == 1
+
+    cache._retry_at = 0.0  # backoff elapsed
+    with pytest.raises(OSError):
+        cache.get("k1")
+    assert len(calls) == 2 and cache._retry_at - time.monotonic() > 60.0  # doubled
+
+
+def test_unknown_kids_do_not_refetch_while_backing_off():
+    fetches = []
+    state = {"up": True}
+
+    def fetch():
+        fetches.append(1)
+        if not state["up"]:
+            raise OSError("IdP unreachable")
+        return {"keys": []}
+
+    cache = JWKSCache(fetch, min_refresh_interval=0.0, initial_backoff=60.0)
+    assert cache.get("nope") is None and len(fetches) == 2  # initial load, then one rotation check
+    state["up"] = False
+    cache._keys = {"k1": object()}
+    with pytest.raises(OSError):
+        cache.get("bogus")
+    assert cache.get("bogus") is None and cache.get("other") is None
+    assert len(fetches) == 3
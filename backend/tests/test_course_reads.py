@@ -0,0 +1,80 @@
+from fastapi.testclient import TestClient
+
+from backend.app import quests
+from backend.app.db import CourseSyllabusStore
+from backend.app.main import app
+
+client = TestClient(app, headers={"Authorization": "Bearer student_token"})
+
+
+def _seed(course_id):
+    store = CourseSyllabusStore()
+    store.create_course(course_id, {"id": course_id, "title": "Algorithms"})
+    store.create_syllabus(course_id, {"course_id": course_id, "weeks": [{"week": 1, "topics": ["Graphs"]}]})
+    return store
+
+
+def test_course_and_syllabus_etags_and_304():
+    _seed("etag-c1")
+    resp = client.get("/courses/etag-c1")
+    assert resp.status_code == 200
+    assert resp.json() == {"id": "etag-c1", "title": "Algorithms"}
+    etag = resp.headers["etag"]
+    assert etag.startswith('"') and "max-age" in resp.headers["cache-control"]
+
+    again = client.get("/courses/etag-c1", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    assert client.get("/courses/etag-c1", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/courses/etag-c1", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    syl = client.get("/courses/etag-c1/syllabus")
+    assert syl.status_code == 200 and syl.headers["etag"] != etag
+    assert client.get("/courses/missing").status_code == 404
+    assert client.get("/courses/missing/syllabus").status_code == 404
+
+
+def test_course_reads_require_authentication():
+    _seed("etag-c4")
+    anon = TestClient(app)
+    for path in ("/courses/etag-c4", "/courses/etag-c4/syllabus", "/courses/etag-c4/quest-map"):
+        assert anon.get(path).status_code == 401
+        assert client.get(path).status_code == 200
+
+
+def test_etag_is_independent_of_key_order():
+    store = _seed("etag-c5")
+    first = client.get("/courses/etag-c5").headers["etag"]
+    store.create_course("etag-c5", {"title": "Algorithms", "id": "etag-c5"})
+    assert client.get("/courses/etag-c5").headers["etag"] == first
+
+
+def test_etag_changes_only_when_content_changes():
+    store = _seed("etag-c2")
+    first = client.get("/courses/etag-c2").headers["etag"]
+    store.create_course("etag-c2", {"id": "etag-c2", "title": "Algorithms"})
+    assert client.get("/courses/etag-c2").headers["etag"] == first
+    store.create_course("etag-c2", {"id": "etag-c2", "title": "Algorithms II"})
+    changed = client.get("/courses/etag-c2", headers={"If-None-Match": first})
+    assert changed.status_code == 200 and changed.headers["etag"] != first
+
+
+def test_quest_map_is_built_once_per_syllabus_version(monkeypatch):
+    store = _seed("etag-c3")
+    calls = []
+    real = quests.build_quest_map
+    monkeypatch.setattr("backend.app.main.build_quest_map", lambda s, course_id=None: calls.append(1) or real(s, course_id=course_id))
+
+    resp = client.get("/courses/etag-c3/quest-map")
+    assert resp.status_code == 200
+    assert resp.json()["weeks"][0]["quests"][0]["type"] == "read"
+    etag = resp.headers["etag"]
+    assert client.get("/courses/etag-c3/quest-map", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/courses/etag-c3/quest-map").content == resp.content
+    assert len(calls) == 1
+
+    store.create_syllabus("etag-c3", {"course_id": "etag-c3", "weeks": [{"week": 1, "topics": ["Graphs", "Trees"]}]})
+    fresh = client.get("/courses/etag-c3/quest-map", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and len(fresh.json()["weeks"][0]["quests"]) == 6
+    assert len(calls) == 2
+    assert client.get("/courses/missing/quest-map").status_code == 404
@@ -0,0 +1,99 @@
+import random
+
+from backend.app.dedup import NearDuplicateIndex, dedup_chunks, shingles
+from backend.app.indexer import doc_id_for
+from backend.app.ingest import StubEmbeddings, chunk_pages
+from backend.app.vectorstore import LocalSearchClient, LocalVectorIndex
+
+SLIDE = (
+    "Dijkstra's algorithm computes single-source shortest paths on graphs with non-negative edge weights. "
+    "It repeatedly extracts the closest unvisited vertex from a priority queue and relaxes its outgoing edges. "
+    "With a binary heap the running time is O((V + E) log V)."
+)
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(["alpha", "beta", "gamma", "delta", "eps", "zeta", "eta", "theta", "iota", "kappa",
+                                "lambda", "mu", "nu", "xi", "omicron", "pi", "rho", "sigma", "tau", "phi"])
+                    + str(rng.randrange(50)) for _ in range(n))
+
+
+def test_anchors_and_case_do_not_affect_shingles():
+    a = chunk_pages([SLIDE], course_id="CS101")[0]["text"]
+    b = chunk_pages(["", "", SLIDE.upper()], course_id="CS101")[0]["text"]
+    assert a != b
+    assert shingles(a) == shingles(b)
+
+
+def test_near_duplicate_slides_across_decks_become_references():
+    deck1 = chunk_pages(["WEEK 1\nIntro to graphs and notation.", SLIDE], course_id="CS101")
+    deck2 = chunk_pages(["Course logistics and grading policy for the term.", "", SLIDE.replace("binary heap", "binary  heap (min-heap)")],
+                        course_id="CS101")
+    for c in deck1:
+        c["source"] = "lecture5.pdf"
+    for c in deck2:
+        c["source"] = "review.pdf"
+
+    index = NearDuplicateIndex()
+    first = dedup_chunks(deck1, index=index)
+    second = dedup_chunks(deck2, index=index)
+
+    assert len(first.unique) == 2 and not first.references
+    assert len(second.unique) == 1
+    [ref] = second.references
+    assert ref["page"] == 3 and ref["source"] == "review.pdf"
+    assert ref["duplicate_of"] == doc_id_for(deck1[1])
+    assert ref["similarity"] >= index.threshold
+    assert second.duplicate_ratio == 0.5
+
+    # the reference is kept against the canonical chunk of the earlier call
+    canonical_id = doc_id_for(deck1[1])
+    assert index.references[canonical_id] == [ref]
+    assert "duplicates" not in deck1[1]["metadata"]
+    index.attach(first.unique)
+    assert [d["source"] for d in deck1[1]["metadata"]["duplicates"]] == ["review.pdf"]
+
+
+def test_discarded_chunks_no_longer_match():
+    chunks = chunk_pages([SLIDE], course_id="CS101")
+    index = NearDuplicateIndex()
+    assert len(dedup_chunks(chunks, index=index).unique) == 1
+    assert len(dedup_chunks(chunks, index=index).unique) == 1  # same chunk again stays canonical
+    copy = chunk_pages(["", SLIDE], course_id="CS101")
+    assert dedup_chunks(copy, index=index).references
+    index.discard([doc_id_for(chunks[0])])
+    assert len(index) == 0 and not index.references
+    assert len(dedup_chunks(copy, index=index).unique) == 1
+
+
+def test_in_batch_duplicates_are_recorded_on_canonical_chunk():
+    chunks = chunk_pages([SLIDE, "Unrelated page about hashing and load factors in open addressing.", SLIDE], course_id="CS101")
+    result = dedup_chunks(chunks)
+    assert [c["page"] for c in result.unique] == [1, 2]
+    dups = result.unique[0]["metadata"]["duplicates"]
+    assert [d["page"] for d in dups] == [3]
+
+    # references survive into the local index and search results
+    emb = StubEmbeddings(dims=8)
+    idx = LocalVectorIndex(8)
+    idx.add_chunks(result.unique, emb.embed([c["text"] for c in result.unique]))
+    hits = LocalSearchClient(idx, emb).search(result.unique[0]["text"], top_k=1, course_id="CS101")
+    assert hits[0]["duplicates"][0]["page"] == 3
+
+
+def test_duplicates_are_scoped_per_course():
+    result = dedup_chunks(chunk_pages([SLIDE], course_id="CS101") + chunk_pages([SLIDE], course_id="CS202"))
+    assert len(result.unique) == 2 and not result.references
+
+
+def test_lsh_lookup_is_sublinear():
+    rng = random.Random(7)
+    index = NearDuplicateIndex()
+    n = 400
+    for i in range(n):
+        assert index.check(f"d{i}", _words(rng, 60)) is None
+    assert index.stats.candidates < n  # across all 400 inserts, far below the n^2/2 pairwise comparisons
+
+    before = index.stats.candidates
+    assert index.check("fresh", _words(rng, 60)) is None
+    assert index.stats.candidates - before < n // 10
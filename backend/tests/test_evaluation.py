@@ -0,0 +1,95 @@
+import json
+
+from backend.app.evaluation import (
+    GoldenItem,
+    LexicalIndex,
+    format_report,
+    load_golden,
+    main,
+    opensearch_retriever,
+    percentile,
+    recall_at_k,
+    reciprocal_rank,
+    run_evaluation,
+    standard_variants,
+)
+from backend.app.ingest import StubEmbeddings
+from backend.app.snapshot import save_snapshot, set_snapshot_alias
+from backend.app.vectorstore import LocalVectorIndex
+
+DOCS = [
+    {"id": "g1", "course_id": "CS101", "text": "Dijkstra computes shortest paths in weighted graphs"},
+    {"id": "g2", "course_id": "CS101", "text": "Breadth first search explores a graph level by level"},
+    {"id": "h1", "course_id": "CS101", "text": "A binary heap supports priority queue operations"},
+    {"id": "s1", "course_id": "CS202", "text": "Shortest paths in road networks use contraction hierarchies"},
+]
+GOLDEN = [
+    GoldenItem("shortest paths dijkstra", "CS101", ["g1"]),
+    GoldenItem("binary heap priority queue", "CS101", ["h1"]),
+    GoldenItem("graph search level by level", "CS101", ["g2", "g1"]),
+]
+
+
+def _index():
+    emb = StubEmbeddings(dims=8)
+    index = LocalVectorIndex(dim=8)
+    for d in DOCS:
+        index.add(d["id"], emb.embed([d["text"]])[0], d)
+    return index, emb
+
+
+def test_metrics():
+    assert recall_at_k(["a", "b", "c"], ["c", "d"], 2) == 0.0
+    assert recall_at_k(["a", "b", "c"], ["c", "d"], 3) == 0.5
+    assert reciprocal_rank(["a", "b", "c"], ["c"]) == 1 / 3
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile([float(i) for i in range(1, 101)], 95) == 95.0
+
+
+def test_lexical_index_is_course_scoped():
+    lex = LexicalIndex(DOCS)
+    assert lex.search("shortest paths", k=2, course_id="CS101") == ["g1"]
+    assert lex.search("shortest paths", k=2)[0] in {"g1", "s1"}
+
+
+def test_run_evaluation_reports_each_variant_side_by_side():
+    index, emb = _index()
+    variants = standard_variants({"float32": index}, emb, ks=(1, 3))
+    names = {(v.name, v.k) for v in variants}
+    assert ("lexical", 1) in names and ("hybrid[float32]+term-rerank", 3) in names
+    reports = run_evaluation(GOLDEN, variants)
+    by = {(r.variant, r.k): r for r in reports}
+    assert by[("lexical", 1)].recall == (1 + 1 + 0.5) / 3
+    assert by[("lexical", 3)].mrr == 1.0
+    assert all(r.queries == 3 and r.p95_ms >= r.p50_ms >= 0 for r in reports)
+    table = format_report(reports)
+    assert "recall@k" in table and "knn[float32]+term-rerank" in table
+
+
+def test_opensearch_retriever_uses_hit_ids():
+    class FakeOS:
+        def search(self, index, body):
+            self.body = body
+            return {"hits": {"hits": [{"_id": "g1", "_source": {"text": "t"}, "_score": 1.0}]}}
+
+    client = FakeOS()
+    r = opensearch_retriever(client, StubEmbeddings(dims=4), index="idx")
+    assert r("q", "CS101", 3) == ["g1"]
+    assert client.body["query"]["knn"]["embedding"]["filter"]["bool"]["filter"] == [{"term": {"course_id": "CS101"}}]
+
+
+def test_cli_prints_report(tmp_path, capsys):
+    index, _ = _index()
+    save_snapshot(index, tmp_path / "snap")
+    golden = tmp_path / "golden.jsonl"
+    golden.write_text("\n".join(json.dumps(g.__dict__) for g in GOLDEN), encoding="utf-8")
+    assert len(load_golden(golden)) == 3
+    assert main([str(golden), "--snapshot", str(tmp_path / "snap"), "--k", "2"]) == 0
+    out = capsys.readouterr().out
+    assert "lexical" in out and "hybrid[float32]" in out
+
+    # a snapshot root behind a CURRENT alias (INDEX_SNAPSHOT_PATH) works too
+    save_snapshot(index, tmp_path / "root" / "v0001")
+    set_snapshot_alias(tmp_path / "root", "v0001")
+    assert main([str(golden), "--snapshot", str(tmp_path / "root"), "--k", "2"]) == 0
+    assert "lexical" in capsys.readouterr().out
@@ -0,0 +1,55 @@
+from backend.app.evidence import select_evidence, split_sentences
+from backend.app.rag import answer_query
+
+
+class BowEmbeddings:
+    """Tiny bag-of-words embedder so sentence scores are meaningful in tests."""
+
+    VOCAB = ["graph", "edge", "vertex", "dijkstra", "shortest", "path", "heap", "sort", "tree", "week"]
+
+    def embed(self, texts):
+        return [[float(t.lower().count(w)) for w in self.VOCAB] for t in texts]
+
+
+CHUNK = (
+    "[page=4] [section=GRAPHS] Graphs are made of vertices and edges. "
+    "Heaps support fast priority queues. "
+    "Dijkstra finds the shortest path in a graph with non-negative edge weights.\n"
+    "Trees are acyclic graphs. Sorting is covered in week 3."
+)
+
+
+def test_split_sentences_skips_anchors_and_returns_offsets():
+    spans = split_sentences(CHUNK)
+    assert CHUNK[spans[0][0]:spans[0][1]] == "Graphs are made of vertices and edges."
+    assert CHUNK[spans[-1][0]:spans[-1][1]] == "Sorting is covered in week 3."
+    assert len(spans) == 5
+
+
+def test_select_evidence_keeps_best_sentences_with_offsets():
+    docs = [{"title": "Doc", "page": 4, "snippet": CHUNK, "score": 0.9}, {"title": "Short", "snippet": "One line.", "score": 0.5}]
+    out = select_evidence("shortest path with dijkstra", docs, BowEmbeddings(), max_sentences=1)
+    assert out[0]["snippet"].startswith("Dijkstra finds the shortest path")
+    span = out[0]["spans"][0]
+    assert CHUNK[span["start"]:span["end"]] == out[0]["snippet"]
+    assert out[0]["snippet_chars"] == len(CHUNK)
+    assert out[1] == docs[1]
+
+
+def test_answer_query_ships_only_spans_to_prompt_and_citations():
+    class Search:
+        def search(self, q, top_k=5, rerank=False):
+            return [{"title": "Doc", "page": 4, "snippet": CHUNK, "score": 0.9}]
+
+    class LLM:
+        def generate(self, prompt):
+            self.prompt = prompt
+            return "stubbed answer"
+
+    llm = LLM()
+    res = answer_query("shortest path dijkstra", search_client=Search(), llm_client=llm, evidence_embedder=BowEmbeddings(), max_evidence_sentences=1)
+    assert "Heaps support" not in llm.prompt
+    assert "Dijkstra finds" in llm.prompt
+    cite = res["citations"][0]
+    assert len(cite["snippet"]) < len(CHUNK) // 2
+    assert cite["spans"][0]["start"] > 0
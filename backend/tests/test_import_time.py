@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from backend.app.lazy import HEAVY_MODULES, optional_import, require
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Cold-import budgets in milliseconds; override on slow CI runners.
+TOTAL_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "3000"))
+APP_BUDGET_MS = float(os.environ.get("APP_IMPORT_TIME_BUDGET_MS", "300"))
+
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import backend.app.main
+elapsed = (time.perf_counter() - start) * 1000.0
+print(json.dumps({"ms": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _import_main():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ROOT), str(ROOT / "backend")]))
+    env.pop("INDEX_SNAPSHOT_PATH", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60, check=True,
+    )
+    # -X importtime lines: "import time: self [us] | cumulative | name"
+    app_us = 0
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[2].strip().startswith("backend.app"):
+            try:
+                app_us += int(parts[0].split(":")[1])
+            except ValueError:
+                pass
+    return json.loads(proc.stdout.strip().splitlines()[-1]), app_us / 1000.0
+
+
+def test_import_main_within_budget_and_without_heavy_modules():
+    result, app_ms = _import_main()
+    loaded = set(result["modules"])
+
+    assert not loaded & set(HEAVY_MODULES), f"heavy modules imported eagerly: {sorted(loaded & set(HEAVY_MODULES))}"
+    assert "backend.app.vectorstore" not in loaded
+    assert result["ms"] < TOTAL_BUDGET_MS, f"import backend.app.main took {result['ms']:.0f} ms"
+    assert app_ms < APP_BUDGET_MS, f"app modules' own import time {app_ms:.0f} ms"
+
+
+def test_optional_import_is_cached():
+    assert optional_import("json") is optional_import("json")
+    assert optional_import("surely_not_installed_module") is None
+    try:
+        require("surely_not_installed_module", "pip install it")
+    except ImportError as exc:
+        assert "pip install it" in str(exc)
+    else:
+        raise AssertionError("require() should raise for a missing module")
@@ -0,0 +1,151 @@
+import json
+import threading
+import time
+
+import pytest
+
+from backend.app.indexer import BulkIndexer, bulk_index_chunks
+from backend.app.ingest import chunk_pages
+
+
+class FakeBulkClient:
+    """Local stand-in for OpenSearch `_bulk` that can fail chosen ids once."""
+
+    def __init__(self, fail_once=(), fail_always=(), delay=0.0):
+        self.stored = {}
+        self.calls = []
+        self.fail_once = set(fail_once)
+        self.fail_always = set(fail_always)
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def bulk(self, body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        lines = body.strip().split("\n")
+        items, errors = [], False
+        with self._lock:
+            self.calls.append(len(lines) // 2)
+            for action_line, source_line in zip(lines[::2], lines[1::2]):
+                doc_id = json.loads(action_line)["index"]["_id"]
+                source = json.loads(source_line)
+                if doc_id in self.fail_always or source.get("text") in self.fail_always:
+                    items.append({"index": {"_id": doc_id, "status": 400, "error": {"type": "mapper_parsing_exception"}}})
+                    errors = True
+                elif source.get("text") in self.fail_once:
+                    self.fail_once.discard(source.get("text"))
+                    items.append({"index": {"_id": doc_id, "status": 429}})
+                    errors = True
+                else:
+                    self.stored[doc_id] = source
+                    items.append({"index": {"_id": doc_id, "status": 201}})
+            self.in_flight -= 1
+        return {"errors": errors, "items": items}
+
+
+def _docs(n):
+    return [{"text": f"chunk {i}", "course_id": "CS101", "page": i} for i in range(n)]
+
+
+def test_batches_split_by_count_and_bytes():
+    indexer = BulkIndexer(FakeBulkClient(), index="idx", max_docs=4, max_bytes=10_000)
+    assert [len(b) for b in indexer.batches(_docs(10))] == [4, 4, 2]
+
+    one = len(indexer._encode(_docs(1)[0]))
+    indexer = BulkIndexer(FakeBulkClient(), index="idx", max_docs=100, max_bytes=one * 3)
+    assert [len(b) for b in indexer.batches(_docs(7))] == [3, 3, 1]
+
+
+def test_partial_failure_retries_only_failed_items():
+    client = FakeBulkClient(fail_once={"chunk 1", "chunk 3"}, fail_always={"chunk 5"})
+    sleeps = []
+    indexer = BulkIndexer(client, index="idx", max_docs=10, sleep=sleeps.append, backoff=0.1)
+    stats = indexer.index_all(_docs(6))
+
+    assert stats.indexed == 5
+    assert stats.failed == 1 and stats.errors[0]["status"] == 400
+    assert stats.retried == 2
+    # first request carries all six docs, the retry only the two throttled ones
+    assert client.calls == [6, 2]
+    assert sleeps == [0.1]
+    assert stats.docs_per_sec > 0
+
+
+def test_items_missing_from_an_errors_response_count_as_failed():
+    class TruncatedClient(FakeBulkClient):
+        def bulk(self, body):
+            resp = super().bulk(body)
+            resp["items"] = resp["items"][:2]  # a truncated response
+            return resp
+
+    stats = BulkIndexer(TruncatedClient(fail_always={"chunk 0"}), index="idx", max_docs=10).index_all(_docs(5))
+    assert (stats.indexed, stats.failed) == (1, 4)
+    assert [e.get("error") for e in stats.errors].count("missing from the bulk response") == 3
+
+
+def test_in_flight_requests_are_bounded():
+    client = FakeBulkClient(delay=0.01)
+    stats = BulkIndexer(client, index="idx", max_docs=2, max_in_flight=2).index_all(_docs(20))
+    assert stats.indexed == 20 and stats.requests == 10
+    assert client.max_in_flight <= 2
+
+
+def test_bulk_index_chunks_is_idempotent_for_chunk_pages_output():
+    chunks = chunk_pages(["INTRO\nline one\nline two", "METHODS\nstep"], course_id="CS101", max_chars=20)
+    client = FakeBulkClient()
+    bulk_index_chunks(client, chunks, index="idx")
+    bulk_index_chunks(client, chunks, index="idx")
+    assert len(client.stored) == len(chunks)
+
+
+class FlakyTransport(FakeBulkClient):
+    """Fails whole requests first: `failures` is a list of exceptions or error responses."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = list(failures)
+
+    def bulk(self, body):
+        if self.failures:
+            self.calls.append(0)
+            failure = self.failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+        return super().bulk(body)
+
+
+class TransportError(Exception):
+    """Shaped like opensearchpy.TransportError: status_code is args[0]."""
+
+    @property
+    def status_code(self):
+        return self.args[0]
+
+
+def test_whole_request_failures_are_retried_with_backoff():
+    slept = []
+    client = FlakyTransport([
+        ConnectionError("reset by peer"),
+        TransportError("N/A", "timed out"),
+        {"error": {"type": "es_rejected_execution_exception"}, "status": 429},
+    ])
+    stats = BulkIndexer(client, index="idx", max_retries=3, backoff=0.1, sleep=slept.append).index_all(_docs(5))
+    assert (stats.indexed, stats.failed, stats.requests) == (5, 0, 4)
+    assert slept == [0.1, 0.2, 0.4] and len(client.stored) == 5
+
+
+def test_whole_request_failures_give_up_or_raise():
+    client = FlakyTransport([TransportError(503, "unavailable")] * 3)
+    stats = BulkIndexer(client, index="idx", max_retries=2, sleep=lambda s: None).index_all(_docs(4))
+    assert (stats.indexed, stats.failed, stats.requests) == (0, 4, 3)
+    assert stats.errors[0]["status"] == 503
+
+    client = FlakyTransport([TransportError(400, "bad request")])
+    with pytest.raises(TransportError):
+        BulkIndexer(client, index="idx", sleep=lambda s: None).index_all(_docs(1))
+    assert client.calls == [0]
@@ -60,10 +60,51 @@ def test_create_opensearch_index_invokes_client(monkeypatch):
 
     assert "create_called_with" in created
     body = created["create_called_with"]["body"]
-    # mapping should contain our vector and metadata fields
+    # mapping should contain a single canonical vector field and metadata fields
     props = body["mappings"]["properties"]
-    assert "vector" in props and props["vector"]["dims"] == 16
+    assert props["embedding"]["type"] == "knn_vector" and props["embedding"]["dimension"] == 16
+    assert "vector" not in props
     assert "course_id" in props and props["page"]["type"] == "integer"
+    # default profile keeps the single-shard dev layout
+    assert body["settings"]["index"]["number_of_shards"] == 1
+    assert body["settings"]["index"]["number_of_replicas"] == 0
+
+
+def test_index_profiles_shape_hnsw_and_quantization():
+    mapping = ingest.build_index_mapping(8, "high_recall")
+    vec = mapping["mappings"]["properties"]["embedding"]
+    assert vec["method"]["parameters"] == {"m": 32, "ef_construction": 512}
+    assert mapping["settings"]["index"]["knn.algo_param.ef_search"] == 256
+
+    fp16 = ingest.build_index_mapping(8, "compact")["mappings"]["properties"]["embedding"]
+    assert fp16["method"]["parameters"]["encoder"]["parameters"]["type"] == "fp16"
+    byte = ingest.build_index_mapping(8, "compact_byte")["mappings"]["properties"]["embedding"]
+    assert byte["data_type"] == "byte" and byte["method"]["engine"] == "lucene"
+
+    custom = ingest.IndexProfile(name="custom", shards=3, replicas=2, engine="nmslib")
+    settings = ingest.build_index_mapping(8, custom)["settings"]["index"]
+    assert (settings["number_of_shards"], settings["number_of_replicas"]) == (3, 2)
+
+    with pytest.raises(ValueError):
+        ingest.get_index_profile("nope")
+
+
+def test_bulk_load_mode_disables_then_restores_refresh():
+    calls = []
+
+    class FakeIndices:
+        def put_settings(self, index, body):
+            calls.append(("put", body["index"]["refresh_interval"], body["index"]["number_of_replicas"]))
+
+        def refresh(self, index):
+            calls.append(("refresh",))
+
+    class FakeClient:
+        indices = FakeIndices()
+
+    with ingest.bulk_load_mode(FakeClient(), "idx", "balanced"):
+        calls.append(("load",))
+    assert calls == [("put", "-1", 0), ("load",), ("put", "1s", 1), ("refresh",)]
 
 
 def test_stub_embeddings_repeatable():
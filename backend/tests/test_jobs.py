@@ -0,0 +1,245 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import jobs, snapshot
+from backend.app.db import CourseSyllabusStore
+from backend.app.ingest import StubEmbeddings
+from backend.app.jobs import JobManager
+from backend.app.reindex import LocalSnapshotTarget, LiveSnapshotWriter
+from backend.app.vectorstore import LocalVectorIndex
+
+
+class GatedEmbeddings(StubEmbeddings):
+    """Blocks every embed() call for jobs whose chunks mention `hold` until released."""
+
+    def __init__(self, hold="TEXTBOOK"):
+        super().__init__(dims=8)
+        self.hold = hold
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+    def embed(self, texts):
+        if any(self.hold in t for t in texts):
+            self.entered.set()
+            assert self.release.wait(5)
+        return super().embed(texts)
+
+
+def _manager(tmp_path, embedder=None, **kw):
+    return JobManager(
+        index=LocalVectorIndex(8), embedder=embedder or StubEmbeddings(dims=8),
+        spool_dir=tmp_path / "spool", **kw,
+    )
+
+
+def _pdf(lines):
+    """Tiny uncompressed single-font PDF, one text line per page."""
+    n = len(lines)
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>",
+            ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{3 + 2 * i} 0 R" for i in range(n)), n)).encode()]
+    for i, line in enumerate(lines):
+        content = f"BT /F1 12 Tf 72 720 Td ({line}) Tj ET".encode()
+        objs.append(f"<< /Type /Page /Parent 2 0 R /Contents {4 + 2 * i} 0 R "
+                    f"/Resources << /Font << /F1 {3 + 2 * n} 0 R >> >> >>".encode())
+        objs.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    for num, body in enumerate(objs, start=1):
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    return out + b"trailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+
+def test_pdf_job_reports_progress_and_persists_state(tmp_path):
+    mgr = _manager(tmp_path)
+    job = mgr.submit("CS101", _pdf(["INTRO graphs", "TREES and heaps", "HASHING"]), source="notes.pdf")
+    assert mgr.wait(job.id, 5)
+    job = mgr.get(job.id)
+    assert job.status == "succeeded" and job.stage is None
+    assert (job.pages_total, job.pages_done, job.chunks, job.vectors_written) == (3, 3, 3, 3)
+    assert len(mgr.index) == 3
+    hit = mgr.index.search(StubEmbeddings(dims=8).embed(["x"])[0], k=1, course_id="CS101")[0]
+    assert hit["course_id"] == "CS101"
+
+    stored = mgr.journal.load()[job.id]
+    assert stored.status == "succeeded" and stored.vectors_written == 3
+    assert [p.name for p in (tmp_path / "spool").iterdir()] == ["jobs.jsonl"]  # spooled document cleaned up
+    mgr.shutdown()
+
+
+def test_small_upload_is_not_stuck_behind_large_jobs(tmp_path):
+    emb = GatedEmbeddings()
+    mgr = _manager(tmp_path, emb, workers=2, small_bytes=100)
+    big = [mgr.submit("CS101", ("TEXTBOOK chapter\f" * 20).encode(), source=f"book{i}.txt", kind="text") for i in range(2)]
+    assert emb.entered.wait(5)
+    small = mgr.submit("CS101", b"one page handout", source="handout.txt", kind="text")
+    assert small.priority < big[0].priority
+    # the second large job waits, the spare worker takes the handout
+    assert mgr.wait(small.id, 5)
+    assert mgr.get(small.id).status == "succeeded"
+    assert [mgr.get(j.id).status for j in big] == ["running", "queued"]
+    emb.release.set()
+    assert all(mgr.wait(j.id, 5) for j in big)
+    assert mgr.stats()["jobs"] == {"succeeded": 3}
+    mgr.shutdown()
+
+
+def test_cancel_queued_and_running_jobs(tmp_path):
+    emb = GatedEmbeddings()
+    mgr = _manager(tmp_path, emb, workers=1)
+    running = mgr.submit("CS101", b"TEXTBOOK\fmore", source="a.txt", kind="text")
+    queued = mgr.submit("CS101", b"later", source="b.txt", kind="text")
+    assert emb.entered.wait(5)
+
+    assert mgr.cancel(queued.id).status == "cancelled"
+    mgr.cancel(running.id)
+    emb.release.set()
+    assert mgr.wait(running.id, 5)
+    assert mgr.get(running.id).status == "cancelled"
+    assert mgr.get(running.id).vectors_written == 0 and len(mgr.index) == 0
+    mgr.shutdown()
+
+
+def test_recover_requeues_interrupted_jobs(tmp_path):
+    first = _manager(tmp_path)
+    first.shutdown()
+    first.start = lambda: None  # no workers: the job stays queued, as if the process died
+    job = first.submit("CS101", b"page one\fpage two", source="a.txt", kind="text")
+    done = first.submit("CS101", b"x", source="b.txt", kind="text")
+    first._finish(first.get(done.id), "cancelled")
+
+    # a fresh process: only the journal on disk survives
+    second = _manager(tmp_path)
+    assert second.get(job.id) is None
+    assert second.recover() == 1
+    assert second.wait(job.id, 5)
+    assert second.get(job.id).status == "succeeded" and len(second.index) == 2
+    assert second.get(done.id).status == "cancelled"
+    assert len((tmp_path / "spool" / "jobs.jsonl").read_text().splitlines()) >= 2
+    second.shutdown()
+
+    third = _manager(tmp_path, retention=0)
+    assert third.recover() == 0 and third.list() == []
+
+
+SLIDE = ("Dijkstra's algorithm computes single-source shortest paths on graphs with non-negative edge weights "
+         "by repeatedly relaxing the edges of the closest unvisited vertex.")
+
+
+def test_repeated_slides_are_indexed_once_per_course(tmp_path):
+    emb = GatedEmbeddings()
+    mgr = _manager(tmp_path, emb, workers=1)
+    cancelled = mgr.submit("CS101", f"TEXTBOOK\f{SLIDE}".encode(), source="draft.txt", kind="text")
+    assert emb.entered.wait(5)
+    mgr.cancel(cancelled.id)
+    emb.release.set()
+    assert mgr.wait(cancelled.id, 5) and mgr.get(cancelled.id).status == "cancelled"
+
+    # the cancelled job's chunks were never indexed, so they do not shadow this upload
+    first = mgr.submit("CS101", f"Week one logistics\f{SLIDE}".encode(), source="lecture.txt", kind="text")
+    again = mgr.submit("CS101", f"Review of graphs\f\f{SLIDE}".encode(), source="review.txt", kind="text")
+    other = mgr.submit("MATH200", SLIDE.encode(), source="copy.txt", kind="text")
+    assert all(mgr.wait(j.id, 5) for j in (first, again, other))
+    assert [mgr.get(j.id).chunks for j in (first, again, other)] == [2, 1, 1]
+    assert len(mgr.index) == 4
+    mgr.shutdown()
+
+
+def test_finished_jobs_are_pruned_after_retention(tmp_path):
+    mgr = _manager(tmp_path, retention=0.05)
+    old = mgr.submit("CS101", b"page", source="a.txt", kind="text")
+    assert mgr.wait(old.id, 5)
+    time.sleep(0.1)
+    new = mgr.submit("CS101", b"other page", source="b.txt", kind="text")
+    assert mgr.wait(new.id, 5)
+    assert mgr.get(old.id) is None and [j.id for j in mgr.list()] == [new.id]
+    assert old.id not in mgr._done and old.id not in mgr._cancel and old.id not in mgr._persisted_at
+    mgr.shutdown()
+
+
+def test_live_snapshot_writer_follows_the_alias_and_persists(tmp_path, monkeypatch):
+    root = tmp_path / "index"
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(root))
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    writer = LiveSnapshotWriter(root, dim=8)
+    mgr = JobManager(index=writer, embedder=StubEmbeddings(dims=writer.dim), spool_dir=tmp_path / "spool")
+
+    first = mgr.submit("CS101", b"INTRO graphs\fTREES", source="a.txt", kind="text")
+    assert mgr.wait(first.id, 5) and mgr.get(first.id).vectors_written == 2
+    assert len(snapshot.get_snapshot_index()) == 2  # what retrieval reads
+
+    # re-uploading the same pages upserts instead of duplicating
+    again = mgr.submit("CS101", b"INTRO graphs\fHEAPS", source="a.txt", kind="text")
+    assert mgr.wait(again.id, 5)
+    served = snapshot.get_snapshot_index()
+    assert len(served) == 3 and LocalSnapshotTarget(root, dim=8).versions() == ["v0001", "v0002"]
+    assert (root / "CURRENT").read_text().strip() == "v0002"
+    mgr.shutdown()
+    snapshot._snapshot_index = None
+
+
+PROF = {"Authorization": "Bearer prof_token"}
+
+
+def test_ingest_job_api(tmp_path, monkeypatch):
+    from backend.app import main
+    from backend.app.main import app
+
+    mgr = _manager(tmp_path)
+    monkeypatch.setattr(jobs, "_job_manager", mgr)
+    store = CourseSyllabusStore()
+    store.create_course("JOBS101", {"id": "JOBS101", "owner": "mock-prof-1"})
+    store.create_course("JOBS202", {"id": "JOBS202", "owner": "mock-someone-else"})
+    client = TestClient(app)
+
+    resp = client.post("/ingest/jobs?course_id=JOBS101&filename=notes.txt", content=b"INTRO\fMETHODS",
+                       headers={"content-type": "text/plain", **PROF})
+    assert resp.status_code == 202
+    job_id = resp.json()["id"]
+    assert "path" not in resp.json()
+    assert mgr.wait(job_id, 5)
+    body = client.get(f"/ingest/jobs/{job_id}", headers=PROF).json()
+    assert body["status"] == "succeeded" and body["pages_done"] == 2
+    assert job_id in [j["id"] for j in client.get("/ingest/jobs?course_id=JOBS101", headers=PROF).json()]
+    assert client.delete(f"/ingest/jobs/{job_id}", headers=PROF).status_code == 409
+
+    assert client.get("/ingest/jobs/nope", headers=PROF).status_code == 404
+    text = {"content-type": "text/plain"}
+    assert client.post("/ingest/jobs?course_id=JOBS101", content=b"x", headers={"content-type": "image/png", **PROF}).status_code == 415
+    assert client.post("/ingest/jobs?course_id=JOBS101", content=b"", headers={**text, **PROF}).status_code == 400
+
+    # without a Content-Length the streamed body is still capped
+    monkeypatch.setattr(main, "INGEST_MAX_BYTES", 10)
+    chunked = client.post("/ingest/jobs?course_id=JOBS101", content=iter([b"INTRO\f", b"METHODS\f", b"RESULTS"]),
+                          headers={**text, **PROF})
+    assert chunked.status_code == 413
+    assert not list((tmp_path / "spool").glob("upload-*"))
+    monkeypatch.setattr(main, "INGEST_MAX_BYTES", 100)
+    chunked = client.post("/ingest/jobs?course_id=JOBS101", content=iter([b"INTRO\f", b"METHODS"]), headers={**text, **PROF})
+    assert chunked.status_code == 202 and mgr.wait(chunked.json()["id"], 5)
+    assert mgr.get(chunked.json()["id"]).size == 13
+
+    # authentication, role and course ownership
+    assert client.post("/ingest/jobs?course_id=JOBS101", content=b"x", headers=text).status_code == 401
+    student = {"Authorization": "Bearer student_token"}
+    assert client.post("/ingest/jobs?course_id=JOBS101", content=b"x", headers={**text, **student}).status_code == 403
+    assert client.post("/ingest/jobs?course_id=JOBS202", content=b"x", headers={**text, **PROF}).status_code == 403
+    assert client.post("/ingest/jobs?course_id=NOPE", content=b"x", headers={**text, **PROF}).status_code == 404
+    other = {"Authorization": "Bearer mock:eve|professor"}
+    assert client.get(f"/ingest/jobs/{job_id}", headers=other).status_code == 404
+    assert client.delete(f"/ingest/jobs/{job_id}", headers=other).status_code == 404
+    assert client.get("/ingest/jobs", headers=other).json() == []
+    mgr.shutdown()
+
+
+def test_ingest_jobs_need_a_served_index(monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(jobs, "_job_manager", None)
+    monkeypatch.delenv("INDEX_SNAPSHOT_PATH", raising=False)
+    CourseSyllabusStore().create_course("JOBS101", {"id": "JOBS101", "owner": "mock-prof-1"})
+    resp = TestClient(app).post("/ingest/jobs?course_id=JOBS101", content=b"x",
+                                headers={"content-type": "text/plain", **PROF})
+    assert resp.status_code == 503
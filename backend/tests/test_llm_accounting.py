@@ -0,0 +1,145 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app.llm.accounting import (
+    CharRatioTokenizer,
+    MeteredLLM,
+    UsageLedger,
+    get_tokenizer,
+    usage_context,
+)
+from backend.app.ratelimit import Limit, Limits, LocalBackend, RateLimiter
+
+
+class _Echo:
+    def generate(self, prompt, context=None):
+        return {"text": "x" * 8}
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_char_ratio_tokenizer_and_spec():
+    assert CharRatioTokenizer().count("") == 0
+    assert CharRatioTokenizer().count("abcde") == 2
+    assert isinstance(get_tokenizer("chars:2"), CharRatioTokenizer)
+    assert get_tokenizer("chars:2").count("abcd") == 2
+
+
+def test_tiktoken_spec_falls_back_when_missing():
+    tok = get_tokenizer("tiktoken")
+    assert tok.count("hello world") > 0
+
+
+def test_metered_llm_attributes_usage_and_cost():
+    ledger = UsageLedger(flush_interval=3600, input_price_per_1k=1.0, output_price_per_1k=2.0)
+    llm = MeteredLLM(_Echo(), ledger, CharRatioTokenizer())
+
+    with usage_context(route="/rag/answer", course_id="CS101", user="u1") as usage:
+        llm.generate("q" * 40, [{"content": "c" * 40}])
+    llm.generate("q" * 4)  # unattributed
+
+    assert usage.calls == 1
+    assert usage.prompt_tokens == 20 and usage.completion_tokens == 2
+    assert usage.cost_usd == pytest.approx((20 * 1.0 + 2 * 2.0) / 1000)
+
+    by_course = ledger.totals("course_id")
+    assert by_course["CS101"]["total_tokens"] == 22
+    assert by_course["None"]["calls"] == 1
+    assert ledger.totals("user")["u1"]["calls"] == 1
+
+
+def test_ledger_flushes_window_to_sink_on_interval():
+    clock = _Clock()
+    sink = []
+    ledger = UsageLedger(sink=sink.append, flush_interval=10, clock=clock)
+    with usage_context(route="/r"):
+        ledger.record(5, 1)
+        assert sink == []
+        clock.t = 11
+        ledger.record(5, 1)
+
+    assert len(sink) == 1
+    assert sink[0]["event"] == "llm_usage"
+    assert sink[0]["route"] == "/r" and sink[0]["calls"] == 2
+    assert ledger.flush() == []
+    assert ledger.totals()["/r"]["prompt_tokens"] == 10
+
+
+def test_ledger_timer_flushes_without_traffic_and_close_flushes_the_rest():
+    import time
+
+    sink = []
+    ledger = UsageLedger(sink=sink.append, flush_interval=0.02)
+    ledger.start()
+    with usage_context(route="/quiet"):
+        ledger.record(3, 1)
+    for _ in range(100):  # no further record() call: the timer flushes it
+        if sink:
+            break
+        time.sleep(0.01)
+    assert [e["route"] for e in sink] == ["/quiet"]
+    ledger.close()
+
+    ledger = UsageLedger(sink=sink.append, flush_interval=3600)
+    ledger.start()
+    with usage_context(route="/late"):
+        ledger.record(1, 1)
+    assert [e["route"] for e in ledger.close()] == ["/late"]
+    assert len(sink) == 2
+
+
+def test_process_ledger_keeps_its_sink_and_totals_across_close(monkeypatch):
+    from backend.app.llm import accounting
+
+    monkeypatch.setattr(accounting, "_ledger", None)
+    monkeypatch.setattr(accounting, "_sink", None)
+    monkeypatch.setenv("LLM_USAGE_FLUSH_SECONDS", "3600")
+    sink = []
+    accounting.set_ledger_sink(sink.append)
+    assert accounting._ledger is None  # nothing built until first use
+
+    ledger = accounting.get_ledger()
+    ledger.record(3, 1)
+    accounting.close_ledger()
+    assert [e["total_tokens"] for e in sink] == [4] and ledger._thread is None
+
+    assert accounting.get_ledger() is ledger and ledger._thread is not None
+    ledger.record(1, 1)
+    accounting.close_ledger()
+    assert [e["total_tokens"] for e in sink] == [4, 2]
+    assert ledger.totals()["None"]["total_tokens"] == 6
+
+
+def test_rate_limiter_charge_reconciles_token_bucket():
+    clock = _Clock()
+    limiter = RateLimiter(LocalBackend(), per_user=Limits(tokens=Limit(100, 60)), clock=clock)
+    limiter.check("u1", tokens=50)
+    limiter.charge("u1", tokens=60)  # actual usage exceeded the estimate: bucket goes into debt
+    with pytest.raises(Exception) as exc:
+        limiter.check("u1", tokens=1)
+    assert exc.value.status_code == 429
+
+    limiter.charge("u1", tokens=-100)  # refund
+    limiter.check("u1", tokens=50)
+
+
+def test_rag_answer_records_usage_in_metrics(monkeypatch, tmp_path):
+    import backend.app.llm.accounting as accounting
+    import backend.app.main as main
+
+    monkeypatch.setattr(accounting, "_ledger", UsageLedger(flush_interval=3600))
+    monkeypatch.setattr(main, "LOG_PATH", tmp_path / "app.json")
+    client = TestClient(main.app)
+
+    r = client.post("/rag/answer", json={"question": "What is an algorithm?", "course_id": "CS101"})
+    assert r.status_code == 200
+
+    usage = client.get("/metrics").json()["llm_usage"]
+    assert usage["by_route"]["/rag/answer"]["calls"] == 1
+    assert usage["by_course"]["CS101"]["total_tokens"] > 0
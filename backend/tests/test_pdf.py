@@ -0,0 +1,177 @@
+import zlib
+
+import pytest
+
+from backend.app import pdf
+from backend.app.pdf import PdfDocument, StreamTooLargeError, extract_pages, parse_cmap, pdf_to_chunks
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _content(lines):
+    ops = ["BT", "/F1 12 Tf", "72 720 Td"]
+    for i, line in enumerate(lines):
+        if i:
+            ops.append("0 -14 Td")
+        ops.append(f"({_escape(line)}) Tj")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_pdf(pages, *, compress=True, extra_objects=None, fonts=None):
+    """Minimal PDF writer: one content stream per page (page = list of lines or raw bytes)."""
+    objects = {}
+    n_pages = len(pages)
+    font_num = 3 + 2 * n_pages
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n_pages))
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} /Resources << /Font << /F1 {font_num} 0 R >> >> >>".encode()
+    for i, page in enumerate(pages):
+        body = page if isinstance(page, bytes) else _content(page)
+        flt = b""
+        if compress:
+            body, flt = zlib.compress(body), b" /Filter /FlateDecode"
+        objects[3 + 2 * i] = f"<< /Type /Page /Parent 2 0 R /Contents {4 + 2 * i} 0 R >>".encode()
+        objects[4 + 2 * i] = b"<< /Length %d%s >>\nstream\n" % (len(body), flt) + body + b"\nendstream"
+    objects[font_num] = fonts or b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    objects.update(extra_objects or {})
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n" % num + objects[num] + b"\nendobj\n"
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for num in range(1, size):
+        out += b"%010d 00000 n \n" % offsets.get(num, 0)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+def test_extracts_pages_in_order_with_worker_processes(tmp_path):
+    path = tmp_path / "deck.pdf"
+    path.write_bytes(make_pdf([[f"WEEK {i}", f"Topic {i} (part a)", "Greedy algorithms"] for i in range(1, 7)]))
+
+    pages = list(extract_pages(path, workers=3))
+
+    assert [p.number for p in pages] == [1, 2, 3, 4, 5, 6]
+    assert pages[2].text == "WEEK 3\nTopic 3 (part a)\nGreedy algorithms"
+    assert not any(p.reused for p in pages)
+
+
+def test_tj_arrays_hex_strings_and_tounicode_cmap(tmp_path):
+    cmap = (
+        b"begincmap\n1 begincodespacerange <0000> <FFFF> endcodespacerange\n"
+        b"2 beginbfchar <0001> <0048> <0002> <0069> endbfchar\n"
+        b"1 beginbfrange <0010> <0012> <0061> endbfrange\nendcmap"
+    )
+    font = b"<< /Type /Font /Subtype /Type0 /BaseFont /Custom /ToUnicode 20 0 R >>"
+    content = b"BT /F1 10 Tf 50 700 Td <00010002> Tj 0 -12 Td [<0010> -400 <00110012>] TJ ET"
+    path = tmp_path / "cid.pdf"
+    path.write_bytes(make_pdf(
+        [content],
+        fonts=font,
+        extra_objects={20: b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream"},
+    ))
+
+    assert [p.text for p in extract_pages(path, workers=0)] == ["Hi\na bc"]
+    mapping, width = parse_cmap(cmap)
+    assert width == 2 and mapping[0x12] == "c"
+
+
+def test_object_streams_are_resolved():
+    page_stream = zlib.compress(b"BT (Inside objstm) Tj ET")
+    pages_obj = b"<< /Type /Pages /Kids [3 0 R] /Count 1 >> "
+    inner = pages_obj + b"<< /Type /Page /Parent 2 0 R /Contents 4 0 R >>"
+    header = b"2 0 3 %d " % len(pages_obj)
+    objstm = zlib.compress(header + inner)
+    data = b"".join([
+        b"%PDF-1.5\n1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n",
+        b"4 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(page_stream),
+        page_stream,
+        b"\nendstream\nendobj\n",
+        b"5 0 obj\n<< /Type /ObjStm /N 2 /First %d /Length %d /Filter /FlateDecode >>\nstream\n" % (len(header), len(objstm)),
+        objstm,
+        b"\nendstream\nendobj\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n",
+    ])
+    doc = PdfDocument(data)
+    assert len(doc.pages()) == 1
+    assert pdf.extract_page_text(doc, doc.pages()[0]) == "Inside objstm"
+
+
+def test_checkpoint_resumes_and_skips_unchanged_pages(tmp_path, monkeypatch):
+    path = tmp_path / "notes.pdf"
+    ckpt = tmp_path / "notes.pages.jsonl"
+    pages = [["Intro to graphs"], ["BFS and DFS"], ["Shortest paths"]]
+    path.write_bytes(make_pdf(pages))
+
+    calls = []
+    real = pdf.extract_page_text
+    monkeypatch.setattr(pdf, "extract_page_text", lambda doc, page: calls.append(1) or real(doc, page))
+
+    # interrupted run: only the first page gets checkpointed
+    it = extract_pages(path, workers=0, checkpoint=ckpt)
+    assert next(it).text == "Intro to graphs"
+    it.close()
+    with ckpt.open("a", encoding="utf-8") as f:
+        f.write('{"page": 2, "hash"')  # torn write
+
+    calls.clear()
+    resumed = list(extract_pages(path, workers=0, checkpoint=ckpt))
+    assert [p.reused for p in resumed] == [True, False, False]
+    assert len(calls) == 2
+
+    # revise page 2 only: the others are reused, numbering is preserved
+    pages[1] = ["BFS, DFS and topological sort"]
+    path.write_bytes(make_pdf(pages))
+    calls.clear()
+    chunks = pdf_to_chunks(path, course_id="CS101", workers=0, checkpoint=ckpt, skip_reused=True)
+    assert len(calls) == 1
+    assert [c["page"] for c in chunks] == [2]
+    assert "topological sort" in chunks[0]["text"]
+    assert len(ckpt.read_text().splitlines()) == 3
+
+
+def test_cli_writes_chunks_jsonl(tmp_path, capsysbinary):
+    import json
+
+    path = tmp_path / "w1.pdf"
+    path.write_bytes(make_pdf([["WEEK 1", "Sorting"]], compress=False))
+    assert pdf.main([str(path), "--course", "CS101", "--workers", "0"]) == 0
+    rows = [json.loads(line) for line in capsysbinary.readouterr().out.splitlines()]
+    assert rows[0]["course_id"] == "CS101" and rows[0]["page"] == 1
+    assert (tmp_path / "w1.pdf.pages.jsonl").exists()
+
+
+def test_cli_dedup_records_later_copies_on_the_earlier_pdf(tmp_path, capsysbinary):
+    import json
+
+    slide = ["HEAPS", "A binary heap is a complete binary tree stored in an array where every parent",
+             "is no larger than its children so the minimum sits at the root and insert is log n"]
+    first, second = tmp_path / "lecture.pdf", tmp_path / "review.pdf"
+    first.write_bytes(make_pdf([slide], compress=False))
+    second.write_bytes(make_pdf([["Course logistics and grading policy for the term."], slide], compress=False))
+    assert pdf.main([str(first), str(second), "--course", "CS101", "--workers", "0", "--dedup"]) == 0
+    rows = [json.loads(line) for line in capsysbinary.readouterr().out.splitlines()]
+    assert [(r["source"], r["page"]) for r in rows] == [("lecture.pdf", 1), ("review.pdf", 1)]
+    assert rows[0]["metadata"]["duplicates"][0]["source"] == "review.pdf"
+
+
+def test_inflate_is_capped_and_fails_the_page(tmp_path, monkeypatch):
+    bomb = zlib.compress(b"\0" * 100_000)
+    assert pdf._inflate(bomb, 100_000) == b"\0" * 100_000
+    with pytest.raises(StreamTooLargeError):
+        pdf._inflate(bomb, 1000)
+    assert pdf._inflate(zlib.compress(b"BT (ok) Tj ET")[:-4]) == b"BT (ok) Tj ET"  # truncated checksum
+
+    path = tmp_path / "bomb.pdf"
+    path.write_bytes(make_pdf([["fine"], b"BT (x) Tj ET" + b" " * 50_000]))
+    monkeypatch.setattr(pdf, "MAX_INFLATED_BYTES", 10_000)
+    pages = extract_pages(path, workers=0)
+    assert next(pages).text == "fine"
+    with pytest.raises(StreamTooLargeError, match="page 2"):
+        next(pages)
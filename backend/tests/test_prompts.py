@@ -0,0 +1,62 @@
+from backend.app.llm.adapter import BedrockLLM, StubLLM
+from backend.app.llm.prompts import ANSWER_TEMPLATE, Prompt, register_course_preamble
+from backend.app.rag import answer_query
+
+
+def test_prefix_is_byte_identical_and_precedes_question():
+    a = ANSWER_TEMPLATE.render("What is a heap?", ["Heaps are trees."])
+    b = ANSWER_TEMPLATE.render("Define recursion", ["Recursion calls itself."])
+
+    bp = a.cache_breakpoints[0]
+    assert a.cache_breakpoints == b.cache_breakpoints
+    assert a[:bp] == b[:bp] == ANSWER_TEMPLATE.prefix
+    assert a.index("Sources:") < a.index("Question: What is a heap?")
+    assert "Heaps are trees." not in a[:bp]
+
+
+def test_course_preamble_adds_second_breakpoint():
+    p = ANSWER_TEMPLATE.render("q", ["c"], preamble="CS101 uses Python 3.")
+    assert len(p.cache_breakpoints) == 2
+    first, second = p.cache_breakpoints
+    assert p[first:second].startswith("CS101 uses Python 3.")
+    assert [cacheable for _, cacheable in p.segments()] == [True, True, False]
+    assert "".join(text for text, _ in p.segments()) == p
+
+
+def test_stub_llm_simulates_prefix_cache_hits():
+    llm = StubLLM()
+    llm.generate(ANSWER_TEMPLATE.render("first question", ["ctx"]))
+    assert (llm.cache_hits, llm.cache_misses, llm.last_cached_chars) == (0, 1, 0)
+
+    llm.generate(ANSWER_TEMPLATE.render("second question", ["other ctx"]))
+    assert llm.cache_hits == 1
+    assert llm.last_cached_chars == len(ANSWER_TEMPLATE.prefix)
+
+    # a new preamble still reuses the shared instructions prefix
+    p = ANSWER_TEMPLATE.render("third", ["ctx"], preamble="MATH200 notation guide")
+    llm.generate(p)
+    assert llm.last_cached_chars == p.cache_breakpoints[0]
+
+    # plain strings carry no breakpoints and are not counted
+    llm.generate("plain prompt")
+    assert (llm.cache_hits, llm.cache_misses) == (2, 1)
+
+
+def test_answer_query_uses_course_preamble():
+    register_course_preamble("CS999", "Answers for CS999 must use big-O notation.")
+
+    class Search:
+        def search(self, query):
+            return [{"title": "T", "page": 1, "snippet": "Sorting is O(n log n).", "score": 0.9, "course_id": "CS999"}]
+
+    llm = StubLLM()
+    answer_query("How fast is sorting?", search_client=Search(), llm_client=llm, course_id="CS999")
+    answer_query("How fast is merging?", search_client=Search(), llm_client=llm, course_id="CS999")
+    assert llm.cache_hits == 1
+    assert llm.last_cached_chars > len(ANSWER_TEMPLATE.prefix)
+
+
+def test_bedrock_messages_mark_cache_points():
+    p = Prompt("SYSTEM\n\nQ", [8])
+    content = BedrockLLM(model_id="m", region="us-east-1").build_messages(p)[0]["content"]
+    assert content == [{"text": "SYSTEM\n\n"}, {"cachePoint": {"type": "default"}}, {"text": "Q"}]
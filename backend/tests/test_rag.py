@@ -72,3 +72,242 @@ def test_guardrail_insufficient_similarity():
     assert res["answer"] == GUARDRAIL_NEED_MORE_SOURCES
     assert res["citations"] == []
     assert res["confidence"] == 0.0
+
+
+def test_build_knn_query_pushes_course_filter_into_knn_clause():
+    from app.rag import build_knn_query
+
+    body = build_knn_query(vector=[0.1, 0.2], k=4, course_id="CS101", pages=(2, 7))
+    knn = body["query"]["knn"]["embedding"]
+    assert knn["k"] == 4
+    clauses = knn["filter"]["bool"]["filter"]
+    assert {"term": {"course_id": "CS101"}} in clauses
+    assert {"range": {"page": {"gte": 2, "lte": 7}}} in clauses
+    assert "filter" not in build_knn_query(vector=[0.1], k=1)["query"]["knn"]["embedding"]
+
+
+def test_answer_query_passes_course_id_to_scoped_clients():
+    seen = {}
+
+    class ScopedSearch:
+        def search(self, q, top_k=5, rerank=False, course_id=None):
+            seen["course_id"] = course_id
+            return [{"title": "Doc", "page": 1, "snippet": "S", "score": 0.9}]
+
+    res = answer_query("q", search_client=ScopedSearch(), llm_client=FakeLLM(), course_id="CS101")
+    assert seen["course_id"] == "CS101"
+    assert res["answer"].startswith("ANSWER based on")
+
+
+def test_decompose_question_splits_compound_questions():
+    from app.rag import decompose_question
+
+    q = "Compare dynamic programming in week 2 with greedy algorithms in week 5"
+    assert decompose_question(q) == [q, "dynamic programming in week 2", "greedy algorithms in week 5"]
+    q2 = "What is a heap? How does heapsort work?"
+    assert decompose_question(q2)[1:] == ["What is a heap", "How does heapsort work"]
+    assert decompose_question("What is a binary tree?") == ["What is a binary tree?"]
+
+
+def test_decomposed_retrieval_runs_concurrently_and_merges_hits():
+    import threading
+    import time
+
+    class SlowSearch:
+        def __init__(self):
+            self.queries = []
+            self.lock = threading.Lock()
+
+        def search(self, q, top_k=5, rerank=False):
+            time.sleep(0.1)
+            with self.lock:
+                self.queries.append(q)
+            shared = {"id": "shared", "title": "Shared", "page": 1, "snippet": "common", "score": 0.6}
+            own = {"id": q, "title": q, "page": 2, "snippet": q, "score": 0.9 if q == "greedy algorithms" else 0.7}
+            return [shared, own]
+
+    search = SlowSearch()
+    llm = FakeLLM()
+    start = time.perf_counter()
+    res = answer_query(
+        "compare dynamic programming with greedy algorithms",
+        search_client=search, llm_client=llm, top_k=10, decompose=True,
+    )
+    elapsed = time.perf_counter() - start
+    assert len(search.queries) == 3
+    assert elapsed < 0.25  # three 0.1s retrievals ran in parallel
+    ids = [c["title"] for c in res["citations"]]
+    assert ids.count("Shared") == 1  # deduplicated
+    assert ids[0] == "greedy algorithms"  # each round-robin round is score-ordered
+    assert "dynamic programming" in llm.last_prompt
+
+
+def test_decomposed_retrieval_drops_subqueries_past_deadline():
+    import time
+
+    class Search:
+        def search(self, q, top_k=5, rerank=False):
+            if "slow" in q:
+                time.sleep(0.5)
+            return [{"id": q, "title": q, "page": 1, "snippet": q, "score": 0.9}]
+
+    res = answer_query(
+        "compare fast things with slow things",
+        search_client=Search(), llm_client=FakeLLM(), top_k=10, decompose=True, deadline=0.2,
+    )
+    titles = {c["title"] for c in res["citations"]}
+    assert "fast things" in titles and "slow things" not in titles
+
+
+
+def test_decomposed_hits_are_interleaved_and_capped_like_the_prompt():
+    class Search:
+        def search(self, q, top_k=5, rerank=False):
+            if q.startswith("compare"):
+                return []
+            if "heaps" in q:  # a broad sub-query with many strong hits
+                return [{"id": f"h{i}", "title": f"heap {i}", "snippet": f"heap {i}", "score": 0.95 - i / 100} for i in range(top_k)]
+            return [{"id": "t0", "title": "trie 0", "snippet": "trie 0", "score": 0.6}]
+
+    llm = FakeLLM()
+    res = answer_query(
+        "compare heaps with tries", search_client=Search(), llm_client=llm, top_k=3, decompose=True,
+    )
+    titles = [c["title"] for c in res["citations"]]
+    assert titles == ["heap 0", "trie 0", "heap 1"]  # the narrow sub-query keeps a slot
+    # the prompt holds exactly the cited snippets
+    assert "heap 1" in llm.last_prompt and "heap 2" not in llm.last_prompt
+
+
+def test_decomposed_retrieval_all_late_needs_more_sources():
+    import threading
+
+    release = threading.Event()
+
+    class Stuck:
+        def search(self, q, top_k=5, rerank=False):
+            release.wait(2)
+            return [{"id": q, "title": q, "snippet": q, "score": 0.9}]
+
+    class NeverLLM:
+        def generate(self, prompt):
+            raise AssertionError("no LLM call without evidence")
+
+    res = answer_query(
+        "compare heaps with tries", search_client=Stuck(), llm_client=NeverLLM(), top_k=3, decompose=True, deadline=0.05,
+    )
+    release.set()
+    assert res["answer"] == GUARDRAIL_NEED_MORE_SOURCES and res["citations"] == []
+
+
+def test_late_subqueries_are_cancelled(monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app import rag
+
+    release = threading.Event()
+    calls = []
+
+    class Stuck:
+        def search(self, q, top_k=5, rerank=False):
+            calls.append(q)
+            release.wait(2)
+            return []
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(rag, "_retrieval_pool", pool)
+    docs, obtained, missed = rag._fetch_many(Stuck(), ["a", "b", "c"], top_k=3, rerank=False, course_id=None, deadline=0.05)
+    release.set()
+    pool.shutdown(wait=True)
+    assert (docs, obtained, missed) == ([], False, 3)
+    assert calls == ["a"]  # the queued retrievals never ran
+
+class _RankedSearch:
+    """Returns the first top_k of a fixed, score-sorted corpus and records each k."""
+
+    def __init__(self, scores):
+        self.docs = [{"id": f"d{i}", "title": f"Doc {i}", "page": i, "snippet": f"S{i}", "score": s} for i, s in enumerate(scores)]
+        self.ks = []
+
+    def search(self, q, top_k=5, rerank=False):
+        self.ks.append(top_k)
+        return self.docs[:top_k]
+
+
+def test_adaptive_stops_after_probe_when_clear_winner():
+    search = _RankedSearch([0.95, 0.6, 0.55, 0.5, 0.5, 0.5])
+    res = answer_query("q", search_client=search, llm_client=FakeLLM(), top_k=8, adaptive=True, min_similarity=0.5)
+    assert search.ks == [2]
+    assert res["k_used"] == 2 and len(res["citations"]) == 2
+
+
+def test_adaptive_widens_while_scores_are_ambiguous():
+    search = _RankedSearch([0.9, 0.88, 0.86, 0.85, 0.6, 0.3, 0.2, 0.1])
+    res = answer_query("q", search_client=search, llm_client=FakeLLM(), top_k=8, adaptive=True, min_similarity=0.5)
+    assert search.ks == [2, 4, 8]
+    assert res["k_used"] == 8
+
+
+def test_adaptive_guardrail_rejects_after_first_probe():
+    search = _RankedSearch([0.2, 0.19, 0.18, 0.17])
+
+    class NeverLLM(LLMAdapterInterface):
+        def generate(self, prompt: str):
+            raise AssertionError("LLM must not be called")
+
+    res = answer_query("q", search_client=search, llm_client=NeverLLM(), top_k=8, adaptive=True, min_similarity=0.5)
+    assert res["answer"] == GUARDRAIL_NEED_MORE_SOURCES
+    assert search.ks == [2]
+
+
+def test_scoped_search_failure_never_falls_back_to_unscoped():
+    from app.rag import _fetch_docs
+
+    class FlakySearch:
+        def __init__(self):
+            self.calls = []
+
+        def search(self, q, top_k=5, rerank=False, course_id=None):
+            self.calls.append(course_id)
+            if course_id is not None:
+                raise RuntimeError("timeout")
+            return [{"id": "other", "course_id": "CS202", "snippet": "secret", "score": 0.9}]
+
+    search = FlakySearch()
+    assert _fetch_docs(search, "q", top_k=5, rerank=False, course_id="CS101") == ([], False)
+    assert search.calls == ["CS101"]
+
+
+def test_unscoped_client_hits_are_filtered_to_the_course():
+    from app.rag import _fetch_docs
+
+    class UnscopedSearch:
+        def search(self, q, top_k=5, rerank=False):
+            return [
+                {"id": "mine", "course_id": "CS101", "snippet": "a", "score": 0.9},
+                {"id": "other", "course_id": "CS202", "snippet": "b", "score": 0.8},
+            ]
+
+    docs, obtained = _fetch_docs(UnscopedSearch(), "q", top_k=5, rerank=False, course_id="CS101")
+    assert obtained and [d["id"] for d in docs] == ["mine"]
+    docs, _ = _fetch_docs(UnscopedSearch(), "q", top_k=5, rerank=False)
+    assert len(docs) == 2
+
+
+def test_scoped_query_without_course_docs_needs_more_sources():
+    class NeverLLM:
+        def generate(self, prompt):
+            raise AssertionError("LLM must not be called")
+
+    class OtherCourseOnly:
+        def search(self, q, top_k=5, rerank=False):
+            return [{"id": "other", "course_id": "CS202", "snippet": "secret", "score": 0.9}]
+
+    class Down:
+        def search(self, q, top_k=5, rerank=False, course_id=None):
+            raise RuntimeError("timeout")
+
+    for search in (OtherCourseOnly(), Down()):
+        res = answer_query("q", search_client=search, llm_client=NeverLLM(), course_id="CS101")
+        assert res["answer"] == GUARDRAIL_NEED_MORE_SOURCES and res["citations"] == []
@@ -0,0 +1,110 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from backend.app import ratelimit
+from backend.app.main import app
+from backend.app.ratelimit import InMemoryKV, Limit, Limits, LocalBackend, RateLimiter, SharedBackend
+
+client = TestClient(app)
+
+
+class Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_token_bucket_refills_over_time():
+    clock = Clock()
+    rl = RateLimiter(LocalBackend(), per_user=Limits(requests=Limit(2, 60)), clock=clock)
+    rl.check("u1")
+    rl.check("u1")
+    with pytest.raises(HTTPException) as exc:
+        rl.check("u1")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "30"
+    rl.check("u2")  # other users are unaffected
+    clock.t += 30
+    rl.check("u1")
+
+
+def test_course_token_budget_is_shared_and_refunds_on_reject():
+    clock = Clock()
+    backend = LocalBackend()
+    rl = RateLimiter(
+        backend,
+        per_user=Limits(requests=Limit(100, 60), tokens=Limit(1000, 60)),
+        per_course=Limits(tokens=Limit(1500, 60)),
+        clock=clock,
+    )
+    rl.check("alice", "CS101", tokens=900)
+    with pytest.raises(HTTPException) as exc:
+        rl.check("bob", "CS101", tokens=900)  # course budget, not bob's, is exhausted
+    assert "course:CS101" in exc.value.detail and "tokens" in exc.value.detail
+    # bob's request/token units were refunded, so he can still use another course
+    rl.check("bob", "CS202", tokens=1000)
+
+
+@pytest.mark.parametrize("make_backend", [LocalBackend, lambda: SharedBackend(InMemoryKV())])
+def test_backends_share_the_same_semantics(make_backend):
+    backend = make_backend()
+    clock = Clock()
+    workers = [RateLimiter(backend, per_course=Limits(requests=Limit(3, 60)), clock=clock) for _ in range(2)]
+    for i in range(3):
+        workers[i % 2].check(f"user{i}", "CS101")
+    with pytest.raises(HTTPException):
+        workers[1].check("user9", "CS101")
+
+
+def test_clock_defaults_to_wall_time_for_shared_buckets():
+    import time
+
+    assert RateLimiter(LocalBackend())._clock is time.monotonic
+    assert RateLimiter(SharedBackend(InMemoryKV()))._clock is time.time
+
+
+def test_request_larger_than_the_bucket_is_413_not_429():
+    backend = LocalBackend()
+    rl = RateLimiter(backend, per_user=Limits(requests=Limit(5, 60), tokens=Limit(1000, 60)), clock=Clock())
+    with pytest.raises(HTTPException) as exc:
+        rl.check("u1", tokens=1001)
+    assert exc.value.status_code == 413 and not exc.value.headers
+    rl.check("u1", tokens=1000)  # nothing was taken by the rejected request
+
+
+def test_shared_backend_retries_on_cas_conflict():
+    class FlakyKV(InMemoryKV):
+        def __init__(self):
+            super().__init__()
+            self.conflicts = 2
+
+        def compare_and_set(self, key, expected, value, ttl):
+            if self.conflicts:
+                self.conflicts -= 1
+                return False
+            return super().compare_and_set(key, expected, value, ttl)
+
+    ok, _ = SharedBackend(FlakyKV()).take("k", 1, Limit(1, 60), now=0.0)
+    assert ok
+
+
+def test_rag_answer_returns_429_per_authenticated_user(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_rate_limiter", RateLimiter(per_user=Limits(requests=Limit(1, 60))))
+    headers = {"Authorization": "Bearer mock:ratelimited"}
+    assert client.post("/rag/answer", json={"query": "q", "course_id": "c"}, headers=headers).status_code == 200
+    resp = client.post("/rag/answer", json={"query": "q", "course_id": "c"}, headers=headers)
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+    # a different user still gets through
+    other = {"Authorization": "Bearer mock:someone_else"}
+    assert client.post("/rag/answer", json={"query": "q"}, headers=other).status_code == 200
+
+
+def test_large_top_k_is_clamped_before_the_token_estimate(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_rate_limiter", RateLimiter(per_user=Limits(tokens=Limit(40000, 60))))
+    resp = client.post("/rag/answer", json={"query": "q", "top_k": 1000}, headers={"Authorization": "Bearer mock:bigk"})
+    assert resp.status_code == 200
+    assert resp.json()["metadata"]["top_k"] == 20
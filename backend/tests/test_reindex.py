@@ -0,0 +1,223 @@
+import json
+import math
+
+import pytest
+
+from backend.app import snapshot
+from backend.app.ingest import StubEmbeddings, chunk_pages
+from backend.app.reindex import (
+    LiveSnapshotWriter,
+    LocalSnapshotTarget,
+    OpenSearchTarget,
+    ReindexValidationError,
+    Throttle,
+    blue_green_reindex,
+    main,
+    rollback,
+)
+
+
+def _chunks(n=40):
+    return chunk_pages([f"TOPIC {i}\nNotes on topic {i} for the course." for i in range(n)], course_id="CS101")
+
+
+class ConstantEmbeddings:
+    """A broken embedding model: every text maps to the same vector."""
+
+    def embed(self, texts):
+        return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+
+def test_local_blue_green_swap_prune_and_rollback(tmp_path, monkeypatch):
+    root = tmp_path / "index"
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(root))
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    chunks = _chunks()
+
+    first = blue_green_reindex(LocalSnapshotTarget(root, dim=8), chunks, StubEmbeddings(dims=8))
+    assert (first.version, first.previous, first.docs, first.swapped) == ("v0001", None, 40, True)
+    assert first.recall == 1.0
+    live = snapshot.get_snapshot_index()
+    assert live.dim == 8 and snapshot.get_snapshot_index() is live
+
+    # "new embedding model": different dimension, rebuilt next to the live version
+    target = LocalSnapshotTarget(root, dim=12, encoding="fp16")
+    second = blue_green_reindex(target, chunks, StubEmbeddings(dims=12))
+    assert (second.version, second.previous) == ("v0002", "v0001")
+    swapped = snapshot.get_snapshot_index()
+    assert swapped is not live and swapped.dim == 12 and swapped.encoding == "fp16"
+    # requests that still hold the old index keep working
+    assert live.search(StubEmbeddings(dims=8).embed(["x"])[0], k=1)
+
+    blue_green_reindex(target, chunks, StubEmbeddings(dims=12), keep=2)
+    assert target.versions() == ["v0002", "v0003"] and target.current() == "v0003"
+    assert rollback(target) == "v0002"
+    assert snapshot.get_snapshot_index().dim == 12 and target.current() == "v0002"
+    snapshot._snapshot_index = None
+
+
+def test_failed_validation_keeps_serving_the_old_version(tmp_path):
+    root = tmp_path / "index"
+    good = LocalSnapshotTarget(root, dim=8)
+    blue_green_reindex(good, _chunks(), StubEmbeddings(dims=8))
+
+    with pytest.raises(ReindexValidationError) as err:
+        blue_green_reindex(LocalSnapshotTarget(root, dim=4), _chunks(), ConstantEmbeddings(), min_recall=0.9)
+    report = err.value.report
+    assert report.version == "v0002" and not report.swapped
+    assert report.docs == 40 and report.recall < 0.9
+    assert "recall" in report.problems[0]
+    assert good.current() == "v0001" and good.versions() == ["v0001"]
+
+
+def test_throttle_paces_build():
+    now = [0.0]
+    slept = []
+
+    def sleep(s):
+        slept.append(s)
+        now[0] += s
+
+    throttle = Throttle(100, clock=lambda: now[0], sleep=sleep)
+    throttle.wait(50)
+    throttle.wait(50)
+    assert slept == [pytest.approx(0.5), pytest.approx(0.5)]
+    Throttle(None, sleep=sleep).wait(10**6)
+    assert len(slept) == 2
+
+
+class FakeOpenSearch:
+    """Enough of the OpenSearch client for versioned indices and aliases."""
+
+    def __init__(self):
+        self.docs = {}
+        self.aliases = {}
+        self.alias_calls = []
+        self.indices = self
+
+    # indices API
+    def create(self, index, body):
+        self.docs[index] = {}
+
+    def get(self, index):
+        prefix = index.rstrip("*")
+        return {name: {} for name in self.docs if name.startswith(prefix)}
+
+    def get_alias(self, name):
+        if name not in self.aliases:
+            raise KeyError(name)
+        return {self.aliases[name]: {"aliases": {name: {}}}}
+
+    def update_aliases(self, body):
+        self.alias_calls.append(body["actions"])
+        for action in body["actions"]:
+            if "add" in action:
+                self.aliases[action["add"]["alias"]] = action["add"]["index"]
+
+    def delete(self, index):
+        del self.docs[index]
+
+    def put_settings(self, index, body):
+        pass
+
+    def refresh(self, index):
+        pass
+
+    # document API
+    def bulk(self, body):
+        lines = body.strip().split("\n")
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            meta = json.loads(action)["index"]
+            self.docs[meta["_index"]][meta["_id"]] = json.loads(source)
+            items.append({"index": {"_id": meta["_id"], "status": 201}})
+        return {"errors": False, "items": items}
+
+    def count(self, index):
+        return {"count": len(self.docs[self.aliases.get(index, index)])}
+
+    def search(self, index, body):
+        knn = body["query"]["knn"]["embedding"]
+        q = knn["vector"]
+        docs = self.docs[self.aliases.get(index, index)]
+
+        def cos(v):
+            return sum(a * b for a, b in zip(q, v)) / (math.sqrt(sum(a * a for a in v)) * math.sqrt(sum(a * a for a in q)) or 1)
+
+        ranked = sorted(docs.items(), key=lambda kv: -cos(kv[1]["embedding"]))[: knn["k"]]
+        return {"hits": {"hits": [{"_id": i, "_score": cos(d["embedding"]), "_source": d} for i, d in ranked]}}
+
+
+def test_opensearch_alias_swap_is_one_atomic_request():
+    client = FakeOpenSearch()
+    target = OpenSearchTarget(client, "docs", dim=8)
+    blue_green_reindex(target, _chunks(), StubEmbeddings(dims=8))
+    report = blue_green_reindex(target, _chunks(), StubEmbeddings(dims=8))
+
+    assert (report.version, report.previous) == ("docs-v2", "docs-v1")
+    assert client.aliases["docs"] == "docs-v2"
+    assert client.alias_calls[-1] == [
+        {"remove": {"index": "docs-v1", "alias": "docs"}},
+        {"add": {"index": "docs-v2", "alias": "docs"}},
+    ]
+    assert client.count("docs")["count"] == 40
+    assert next(iter(client.docs["docs-v2"].values()))["course_id"] == "CS101"
+
+
+def test_reindex_cli(tmp_path, capsys):
+    chunks_path = tmp_path / "chunks.jsonl"
+    chunks_path.write_text("".join(json.dumps(c) + "\n" for c in _chunks(10)), encoding="utf-8")
+    assert main([str(tmp_path / "index"), str(chunks_path), "--dims", "8"]) == 0
+    assert json.loads(capsys.readouterr().out)["version"] == "v0001"
+    assert main([str(tmp_path / "index"), "--rollback", str(chunks_path)]) == 1  # nothing older
+
+
+def test_identical_chunks_are_indexed_once(tmp_path):
+    chunks = _chunks(2)
+    report = blue_green_reindex(LocalSnapshotTarget(tmp_path / "index", dim=8), [chunks[0], dict(chunks[0]), chunks[1]], StubEmbeddings(dims=8))
+    assert report.expected == report.docs == 2 and report.swapped
+
+
+def test_live_writer_dedupes_ids_and_is_not_discarded_by_a_rebuild(tmp_path):
+    root = tmp_path / "index"
+    target = LocalSnapshotTarget(root, dim=8)
+    blue_green_reindex(target, _chunks(3), StubEmbeddings(dims=8))
+    writer = LiveSnapshotWriter(root, dim=8)
+    job = chunk_pages(["NEW lecture on heaps"], course_id="CS101")
+    vectors = StubEmbeddings(dims=8).embed([job[0]["text"]] * 2)
+    assert writer.add_chunks([job[0], dict(job[0])], vectors) == 1
+
+    class PublishingEmbeddings(StubEmbeddings):
+        """An ingestion job publishes while the rebuild is embedding."""
+
+        def embed(self, texts):
+            if not getattr(self, "published", False):
+                self.published = True
+                writer.add_chunks(job, vectors[:1])
+            return super().embed(texts)
+
+    with pytest.raises(ReindexValidationError) as exc:
+        blue_green_reindex(target, _chunks(3), PublishingEmbeddings(dims=8))
+    assert "live version changed" in exc.value.report.problems[0]
+    assert exc.value.report.version == "v0003" and "v0003" not in target.versions()
+    assert target.current() == "v0004" and target.count("v0004") == 4  # the job's documents are still served
+
+
+def test_serving_picks_up_external_swaps_off_the_request_path(tmp_path, monkeypatch):
+    root = tmp_path / "index"
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(root))
+    monkeypatch.setenv("SNAPSHOT_POLL_SECONDS", "0")
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    target = LocalSnapshotTarget(root, dim=8)
+    blue_green_reindex(target, _chunks(), StubEmbeddings(dims=8))
+    blue_green_reindex(target, _chunks(5), StubEmbeddings(dims=8))
+    live = snapshot.get_snapshot_index()
+    assert len(live) == 5
+
+    # another process moves the alias back: requests keep the loaded index...
+    (root / "CURRENT").write_text("v0001\n")
+    assert snapshot.get_snapshot_index() is live
+    # ...until the background refresh has loaded the new version
+    assert len(snapshot.refresh_snapshot()) == 40
+    assert len(snapshot.get_snapshot_index()) == 40
+    snapshot._snapshot_index = None
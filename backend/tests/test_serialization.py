@@ -0,0 +1,44 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.app import serialization
+from backend.app.serialization import dumps, dumps_line
+
+
+def test_dumps_matches_stdlib_and_falls_back(monkeypatch):
+    obj = {"q": "naïve Bayes", "n": [1, 2.5, None], "ok": True}
+    assert json.loads(dumps(obj)) == obj
+    assert dumps_line(obj).endswith(b"\n") and dumps_line(obj).count(b"\n") == 1
+
+    monkeypatch.setattr(serialization, "optional_import", lambda name: None)
+    assert json.loads(dumps(obj)) == obj
+
+
+def test_rag_answer_response_is_typed_and_compact(monkeypatch, tmp_path):
+    import backend.app.main as main
+
+    monkeypatch.setattr(main, "LOG_PATH", tmp_path / "app.json")
+    client = TestClient(main.app)
+    r = client.post("/rag/answer", json={"question": "What is dynamic programming?", "top_k": 2})
+    assert r.status_code == 200
+    body = r.json()
+    assert set(body) == {"answer", "citations", "metadata"}
+    assert body["metadata"]["course_id"] is None
+    # unset optional citation fields are omitted rather than sent as null
+    assert all("spans" not in c for c in body["citations"])
+    assert b", " not in r.content  # compact encoder
+
+    lines = (tmp_path / "app.json").read_bytes().splitlines()
+    assert json.loads(lines[-1])["event"] == "rag_answer"
+
+    schema = client.get("/openapi.json").json()["components"]["schemas"]
+    assert {"RagAnswerResponse", "Citation", "QuizGenerateResponse"} <= set(schema)
+
+
+def test_quiz_generate_uses_response_model():
+    from backend.app.main import app
+
+    r = TestClient(app).post("/quiz/generate", json={"query": "graphs", "num_questions": 2})
+    assert r.status_code == 200
+    assert [q["id"] for q in r.json()["questions"]] == ["q1", "q2"]
@@ -0,0 +1,124 @@
+from fastapi.testclient import TestClient
+
+from backend.app import main, sessions
+from backend.app.ratelimit import estimate_tokens
+from backend.app.sessions import SessionStore
+
+DOCS = [
+    {"id": "d1", "title": "Graphs", "page": 4, "snippet": "Dijkstra's algorithm finds shortest paths with a priority queue.", "score": 0.9},
+    {"id": "d2", "title": "Graphs", "page": 5, "snippet": "Relaxation updates tentative distances of neighbours.", "score": 0.8},
+]
+
+
+def test_history_stays_within_token_budget():
+    store = SessionStore(max_tokens=200, summary_share=0.25)
+    s = store.get("s1")
+    for i in range(30):
+        store.record(s, f"Question number {i} about heaps?", f"ANSWER based on retrieved docs: Answer {i}. " + "filler " * 40)
+        assert s.tokens <= 200
+        assert sum(estimate_tokens(line) for line in s.summary) <= 50
+    assert s.turn_count == 30
+    assert s.turns[-1].question == "Question number 29 about heaps?"  # newest turn verbatim
+    history = store.history(s)
+    assert history.startswith("Summary of earlier turns:")
+    assert "Asked: Question number 2" in history and "Answer 2" in history  # folded recent-ish turn survives
+    assert "Question number 0 " not in history  # oldest summary lines rolled off
+    assert "ANSWER based on" not in history
+
+
+def test_follow_ups_reuse_previous_retrieval():
+    store = SessionStore()
+    s = store.get("s1")
+    assert store.reusable_docs(s, "What is Dijkstra's algorithm?") is None  # nothing yet
+    store.record(s, "What is Dijkstra's algorithm?", "It finds shortest paths.", DOCS, course_id="CS101")
+
+    assert store.reusable_docs(s, "Why is that?", course_id="CS101") is DOCS
+    assert store.reusable_docs(s, "Why does it need a priority queue?", course_id="CS101") is DOCS
+    assert store.reusable_docs(s, "How does relaxation update distances?", course_id="CS101") is DOCS
+    assert store.reusable_docs(s, "Explain B-tree node splits on disk pages", course_id="CS101") is None
+    # a lead word alone is not enough when the question brings a new topic
+    assert store.reusable_docs(s, "Explain heapsort", course_id="CS101") is None
+    assert store.reusable_docs(s, "What about quicksort?", course_id="CS101") is None
+    # another course's material is never reused
+    assert store.reusable_docs(s, "Why is that?", course_id="CS202") is None
+
+    # only the last `reuse_turns` turns keep their docs
+    for i in range(3):
+        store.record(s, f"Unrelated topic {i}", "ok", [{"snippet": f"topic {i}", "score": 0.5}], course_id="CS101")
+    assert store.reusable_docs(s, "How does relaxation update distances?", course_id="CS101") is None
+
+
+def test_sessions_are_owned_expire_and_are_bounded():
+    now = [0.0]
+    store = SessionStore(ttl=60, max_sessions=2, clock=lambda: now[0])
+    s = store.get("a", owner="alice")
+    assert store.get("a", owner="mallory") is None
+    assert store.drop("a", owner="mallory") is False
+    assert store.get("a", owner="alice") is s
+
+    now[0] = 61.0
+    assert store.get("a", owner="alice", create=False) is None  # idle too long
+
+    store.get("x", owner="alice")
+    store.get("y", owner="alice")
+    store.get("z", owner="alice")
+    assert len(store) == 2 and store.get("x", owner="alice", create=False) is None
+
+
+class _CountingSearch:
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query, top_k=5, rerank=False, course_id=None):
+        self.calls += 1
+        return [dict(d) for d in DOCS]
+
+
+class _RecordingLLM:
+    prompts = []
+
+    def generate(self, prompt, *, system=None):
+        self.prompts.append(str(prompt))
+        return "Dijkstra picks the closest vertex first."
+
+
+def test_rag_answer_session_reuses_retrieval_and_carries_history(monkeypatch):
+    search = _CountingSearch()
+    monkeypatch.setattr(main, "_search_client", lambda: search)
+    monkeypatch.setattr(main, "_FakeLLM", _RecordingLLM)
+    monkeypatch.setattr(sessions, "_session_store", SessionStore())
+    monkeypatch.setattr(_RecordingLLM, "prompts", [])
+    client = TestClient(main.app)
+    student = {"Authorization": "Bearer student_token"}
+
+    first = client.post("/rag/answer", json={"query": "What is Dijkstra's algorithm?", "course_id": "CS101", "session_id": "chat-1"},
+                        headers=student)
+    assert first.status_code == 200
+    assert first.json()["metadata"] == {
+        "top_k": 5, "course_id": "CS101", "confidence": 0.9, "k_used": 5,
+        "session_id": "chat-1", "turn": 1, "reused_retrieval": False,
+    }
+
+    # anonymous callers cannot use sessions; another user cannot read this one
+    anon = client.post("/rag/answer", json={"query": "Why?", "course_id": "CS101", "session_id": "chat-1"})
+    assert anon.status_code == 401
+    other = {"Authorization": "Bearer mock:mallory|student"}
+    assert client.post("/rag/answer", json={"query": "Why?", "course_id": "CS101", "session_id": "chat-1"},
+                       headers=other).status_code == 404
+
+    second = client.post("/rag/answer", json={"query": "Why does it need a priority queue?", "course_id": "CS101", "session_id": "chat-1"},
+                         headers=student)
+    meta = second.json()["metadata"]
+    assert meta["turn"] == 2 and meta["reused_retrieval"] is True
+    assert search.calls == 1
+    assert [c["page"] for c in second.json()["citations"]] == [4, 5]
+    assert "Conversation so far:\nStudent: What is Dijkstra's algorithm?" in _RecordingLLM.prompts[-1]
+
+    # single-turn requests are unchanged
+    plain = client.post("/rag/answer", json={"query": "Why is it greedy?", "course_id": "CS101"})
+    assert "session_id" not in plain.json()["metadata"] and search.calls == 2
+
+    assert client.delete("/rag/sessions/chat-1").status_code == 401
+    assert client.delete("/rag/sessions/chat-1", headers=other).status_code == 404
+    assert client.delete("/rag/sessions/chat-1", headers=student).status_code == 200
+    assert client.delete("/rag/sessions/chat-1", headers=student).status_code == 404
@@ -0,0 +1,138 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.app import snapshot
+from backend.app.ingest import EmbedderMismatchError, StubEmbeddings, chunk_pages
+from backend.app.snapshot import build_snapshot, embedder_for, load_snapshot, save_snapshot
+from backend.app.vectorstore import LocalVectorIndex, ProductQuantizer
+
+
+def _chunks():
+    out = []
+    for course in ("CS101", "CS202"):
+        pages = [f"WEEK {w}\nTopic {w} for {course}.\nMore {course} notes on topic {w}." for w in range(1, 6)]
+        out.extend(chunk_pages(pages, course_id=course))
+    return out
+
+
+@pytest.mark.parametrize("encoding", ["float32", "fp16", "int8"])
+def test_snapshot_roundtrip_is_memory_mapped(tmp_path, encoding):
+    emb = StubEmbeddings(dims=8)
+    chunks = _chunks()
+    original = build_snapshot(chunks, emb, tmp_path / "snap", encoding=encoding)
+    loaded = load_snapshot(tmp_path / "snap")
+
+    assert len(loaded) == len(original) == len(chunks)
+    assert loaded.courses() == ["CS101", "CS202"]
+    part = loaded._partitions["CS101"]
+    assert isinstance(part.vectors.codes, memoryview)
+    assert part.vectors.codes.readonly
+
+    q = emb.embed(["Topic 3 for CS202"])[0]
+    want = original.search(q, k=3, course_id="CS202")
+    got = loaded.search(q, k=3, course_id="CS202", pages=(1, 5))
+    assert [h["id"] for h in got] == [h["id"] for h in want]
+    assert got[0]["section"] == want[0]["section"]
+
+    # the loaded index stays writable (copy-on-first-append)
+    loaded.add("extra", q, {"course_id": "CS202", "page": 9, "text": "extra"})
+    assert loaded.search(q, k=1, course_id="CS202")[0]["id"] == "extra"
+
+
+def test_snapshot_with_pq_and_fast_cold_start(tmp_path):
+    emb = StubEmbeddings(dims=16)
+    texts = [f"chunk number {i}" for i in range(2000)]
+    vecs = emb.embed(texts)
+    index = LocalVectorIndex(dim=16, encoding="int8", pq=ProductQuantizer.fit(vecs[:200], m=4, ks=16, iters=2))
+    for i, (t, v) in enumerate(zip(texts, vecs)):
+        index.add(f"d{i}", v, {"course_id": f"C{i % 4}", "text": t, "page": i})
+    save_snapshot(index, tmp_path / "snap")
+
+    start = time.perf_counter()
+    loaded = load_snapshot(tmp_path / "snap")
+    assert time.perf_counter() - start < 0.5
+    assert loaded.pq is not None and len(loaded) == 2000
+    assert loaded.search(vecs[17], k=1, course_id="C1")[0]["id"] == "d17"
+
+
+def test_save_swaps_a_symlink_and_records_the_embedder(tmp_path, monkeypatch):
+    path = tmp_path / "snap"
+    build_snapshot(_chunks(), StubEmbeddings(dims=8), path)
+    first = path.resolve()
+    held = load_snapshot(path)
+    assert path.is_symlink() and held.embedded_with == {"name": "stub", "dims": 8}
+
+    build_snapshot(_chunks()[:3], StubEmbeddings(dims=8), path)
+    assert path.resolve() != first and not first.exists()
+    assert len(load_snapshot(path)) == 3
+    assert held.search(StubEmbeddings(dims=8).embed(["x"])[0], k=1)  # mapped pages outlive the swap
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".")) == ["snap"]
+
+    # an old-style plain directory is replaced too
+    plain = tmp_path / "plain"
+    plain.mkdir()
+    (plain / "manifest.json").write_text("{}")
+    save_snapshot(held, plain)
+    assert plain.is_symlink() and len(load_snapshot(plain)) == len(held)
+
+
+def test_embedder_must_match_the_snapshot(tmp_path, monkeypatch):
+    index = build_snapshot(_chunks(), StubEmbeddings(dims=8), tmp_path / "snap")
+    assert embedder_for(index).dims == 8
+    monkeypatch.setenv("EMBEDDING_DIMS", "16")
+    with pytest.raises(EmbedderMismatchError):
+        embedder_for(index)
+    monkeypatch.delenv("EMBEDDING_DIMS")
+    index.embedded_with = {"name": "titan", "dims": 8}
+    with pytest.raises(EmbedderMismatchError):
+        embedder_for(index)
+
+
+def test_rag_answer_refuses_a_mismatched_embedder(tmp_path, monkeypatch):
+    from backend.app.main import app
+
+    build_snapshot(_chunks(), StubEmbeddings(dims=8), tmp_path / "snap")
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(tmp_path / "snap"))
+    monkeypatch.setenv("EMBEDDING_DIMS", "16")
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    try:
+        resp = TestClient(app).post("/rag/answer", json={"query": "Topic 2", "course_id": "CS101"})
+        assert resp.status_code == 503 and "embedder" in resp.json()["detail"]
+    finally:
+        snapshot._snapshot_index = None
+
+
+def test_rag_answer_serves_from_snapshot(tmp_path, monkeypatch):
+    from backend.app.main import app
+
+    build_snapshot(_chunks(), StubEmbeddings(dims=8), tmp_path / "snap")
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(tmp_path / "snap"))
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    try:
+        resp = TestClient(app).post("/rag/answer", json={"query": "Topic 2", "course_id": "CS101", "top_k": 2})
+        assert resp.status_code == 200
+        cites = resp.json()["citations"]
+        assert cites and all("CS101" in c["snippet"] for c in cites)
+    finally:
+        snapshot._snapshot_index = None
+
+
+def test_section_index_factory_wraps_snapshot(tmp_path, monkeypatch):
+    build_snapshot(_chunks(), StubEmbeddings(dims=8), tmp_path / "snap")
+    monkeypatch.setenv("INDEX_SNAPSHOT_PATH", str(tmp_path / "snap"))
+    monkeypatch.setattr(snapshot, "_snapshot_index", None)
+    monkeypatch.setattr(snapshot, "_section_index", None)
+    assert snapshot.get_section_index() is None  # SECTION_TOP_K unset: flat search
+
+    monkeypatch.setenv("SECTION_TOP_K", "2")
+    monkeypatch.setenv("SECTION_MAX_CANDIDATES", "50")
+    sections = snapshot.get_section_index()
+    assert sections is snapshot.get_section_index()
+    assert sections.index is snapshot.get_snapshot_index()
+    assert sections.top_sections == 2 and sections.max_candidates == 50
+    assert sections._sections is not None  # summaries are ready before the first search
+    assert sections.search(StubEmbeddings(dims=8).embed(["x"])[0], k=2, course_id="CS101")
+    snapshot._snapshot_index = None
+    snapshot._section_index = None
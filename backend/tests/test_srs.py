@@ -0,0 +1,138 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from backend.app.main import app
+from backend.app.srs import DAY_SECONDS, MAX_INTERVAL_DAYS, ReviewStore, SubmissionBuffer, sm2_update
+
+client = TestClient(app)
+
+
+def test_sm2_update_grows_interval_and_resets_on_fail():
+    ease, interval, reps = sm2_update(2.5, 0, 0, 5)
+    assert (interval, reps) == (1, 1)
+    ease, interval, reps = sm2_update(ease, interval, reps, 5)
+    assert (interval, reps) == (6, 2)
+    ease, interval, reps = sm2_update(ease, interval, reps, 4)
+    assert interval > 6 and reps == 3
+    _, interval, reps = sm2_update(ease, interval, reps, 1)
+    assert (interval, reps) == (1, 0)
+
+
+def test_review_store_due_ordered_by_due_date():
+    store = ReviewStore()
+    now = 1_000_000.0
+    store.review("u1", "q-easy", 5, now=now)
+    store.review("u1", "q-easy", 5, now=now)  # interval 6 days
+    store.review("u1", "q-hard", 1, now=now)  # interval 1 day
+    store.review("u2", "q-other", 1, now=now)
+
+    assert store.due("u1", now=now) == []
+    due = store.due("u1", now=now + 2 * DAY_SECONDS)
+    assert [r.question_id for r in due] == ["q-hard"]
+    due = store.due("u1", now=now + 7 * DAY_SECONDS)
+    assert [r.question_id for r in due] == ["q-hard", "q-easy"]
+
+
+def test_submission_buffer_batches_and_persists(tmp_path):
+    path = tmp_path / "srs.bin"
+    buf = SubmissionBuffer(ReviewStore(), max_batch=3, max_delay=60.0, path=path)
+    now = 5_000.0
+    assert buf.submit("u1", [{"question_id": "q1", "correct": True}, {"id": "q2", "correct": False}], now=now) == 2
+    assert buf.pending() == 2 and len(buf.store) == 0
+    buf.submit("u1", [{"question_id": "q3", "quality": 3}], now=now)
+    assert buf.pending() == 0 and buf.flushes == 1
+    assert path.exists()
+
+    reloaded = ReviewStore.load(path)
+    assert len(reloaded) == 3
+    assert reloaded.get("u1", "q2").interval == 1
+    assert [r.question_id for r in reloaded.due("u1", now=now + DAY_SECONDS)] == ["q1", "q2", "q3"]
+
+
+def test_quiz_submit_schedules_and_due_endpoint():
+    headers = {"Authorization": "Bearer mock:srs-api-user"}
+    payload = {"quiz_id": "demo-quiz", "results": [{"question_id": "q1", "correct": False}]}
+    resp = client.post("/quiz/submit", json=payload, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["scheduled"] == 1
+
+    resp = client.get("/quiz/due", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["user_id"] == "mock-srs-api-user"
+    # failed review is due again in one day, not now
+    assert resp.json()["due"] == []
+
+
+def test_quiz_endpoints_validate_and_require_auth():
+    bad = {"quiz_id": "demo-quiz", "results": [{"question_id": "q1", "quality": "great"}]}
+    assert client.post("/quiz/submit", json=bad).status_code == 422
+    bad["results"][0]["quality"] = 9
+    assert client.post("/quiz/submit", json=bad).status_code == 422
+
+    # anonymous attempts are scored but not scheduled for anyone
+    anon = {"quiz_id": "demo-quiz", "user_id": "victim", "results": [{"question_id": "q1", "correct": True}]}
+    assert client.post("/quiz/submit", json=anon).json()["scheduled"] == 0
+
+    assert client.get("/quiz/due", params={"user_id": "victim"}).status_code == 401
+    headers = {"Authorization": "Bearer mock:mallory"}
+    assert client.get("/quiz/due", params={"user_id": "victim"}, headers=headers).status_code == 403
+
+
+def test_reviews_are_keyed_by_quiz(tmp_path):
+    buf = SubmissionBuffer(ReviewStore(), max_batch=100, path=tmp_path / "srs.bin")
+    buf.submit("u1", [{"question_id": "q1", "correct": True}], quiz_id="heaps", now=0.0)
+    buf.submit("u1", [{"question_id": "q1", "correct": False}], quiz_id="graphs", now=0.0)
+    buf.flush()
+    reloaded = ReviewStore.load(tmp_path / "srs.bin")
+    assert reloaded.get("u1", "q1", quiz_id="heaps").reps == 1
+    assert reloaded.get("u1", "q1", quiz_id="graphs").reps == 0
+
+
+def test_background_flush_and_close_persist_off_the_request_thread(tmp_path):
+    path = tmp_path / "srs.bin"
+    buf = SubmissionBuffer(ReviewStore(), max_batch=2, max_delay=60.0, path=path)
+    buf.start()
+    buf.submit("u1", [{"question_id": "q1", "correct": True}, {"question_id": "q2", "correct": True}])
+    # the full batch wakes the flusher instead of saving inline
+    for _ in range(100):
+        if path.exists():
+            break
+        time.sleep(0.01)
+    assert path.exists() and len(ReviewStore.load(path)) == 2
+
+    buf.submit("u1", [{"question_id": "q3", "correct": True}])
+    assert buf.pending() == 1
+    assert buf.close() == 1
+    assert len(ReviewStore.load(path)) == 3
+
+
+def test_interval_is_capped_and_ids_survive_a_round_trip(tmp_path):
+    store = ReviewStore()
+    now = 0.0
+    for _ in range(40):  # far past where interval * ease overflows uint32
+        state = store.review("u1", "q1", 5, now=now)
+        now = state.due
+    assert state.interval == MAX_INTERVAL_DAYS
+
+    store.review("u1", "line\nbreak\ttab", 3, quiz_id="quiz\n2", now=0.0)
+    path = tmp_path / "srs.bin"
+    store.save(path)
+    reloaded = ReviewStore.load(path)
+    assert reloaded.get("u1", "line\nbreak\ttab", quiz_id="quiz\n2").reps == 1
+    assert reloaded.get("u1", "q1").interval == MAX_INTERVAL_DAYS
+
+
+def test_a_failing_review_does_not_drop_the_rest_of_the_batch(monkeypatch):
+    buf = SubmissionBuffer(ReviewStore(), max_batch=100)
+    real = buf.store.review
+
+    def review(user_id, question_id, quality, **kw):
+        if question_id == "bad":
+            raise OverflowError("boom")
+        return real(user_id, question_id, quality, **kw)
+
+    monkeypatch.setattr(buf.store, "review", review)
+    buf.submit("u1", [{"question_id": "bad", "correct": True}, {"question_id": "good", "correct": True}])
+    assert buf.flush() == 2
+    assert buf.store.get("u1", "good").reps == 1 and buf.store.get("u1", "bad") is None
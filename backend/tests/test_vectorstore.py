@@ -0,0 +1,151 @@
+from backend.app.ingest import StubEmbeddings, chunk_pages
+from backend.app.vectorstore import LocalSearchClient, LocalVectorIndex
+
+
+def _index():
+    idx = LocalVectorIndex(dim=2)
+    idx.add("a1", [1.0, 0.0], {"course_id": "A", "page": 1, "section": "INTRO", "text": "a1"})
+    idx.add("a2", [0.9, 0.1], {"course_id": "A", "page": 5, "section": "METHODS", "text": "a2"})
+    idx.add("b1", [1.0, 0.0], {"course_id": "B", "page": 1, "section": "INTRO", "text": "b1"})
+    idx.add("b2", [0.0, 1.0], {"course_id": "B", "page": 2, "section": "INTRO", "text": "b2"})
+    return idx
+
+
+def test_course_scoped_search_only_returns_that_course():
+    idx = _index()
+    assert idx.courses() == ["A", "B"]
+    hits = idx.search([1.0, 0.0], k=2, course_id="B")
+    assert [h["id"] for h in hits] == ["b1", "b2"]
+    assert all(h["course_id"] == "B" for h in hits)
+    assert idx.search([1.0, 0.0], k=2, course_id="missing") == []
+    # unscoped search spans partitions
+    assert {h["id"] for h in idx.search([1.0, 0.0], k=3)} == {"a1", "a2", "b1"}
+
+
+def test_page_and_section_prefilter_keeps_k_results():
+    idx = _index()
+    hits = idx.search([1.0, 0.0], k=1, course_id="A", pages=(2, 10))
+    assert [h["id"] for h in hits] == ["a2"]
+    hits = idx.search([1.0, 0.0], k=5, section="INTRO")
+    assert {h["id"] for h in hits} == {"a1", "b1", "b2"}
+
+
+def test_local_search_client_over_chunk_pages():
+    emb = StubEmbeddings(dims=8)
+    idx = LocalVectorIndex(dim=8)
+    for course in ("CS101", "CS202"):
+        chunks = chunk_pages(["INTRO\nGraphs and trees", "METHODS\nDijkstra"], course_id=course)
+        idx.add_chunks(chunks, emb.embed([c["text"] for c in chunks]))
+    client = LocalSearchClient(idx, emb)
+    docs = client.search("graphs", top_k=5, course_id="CS202")
+    assert len(docs) == 2
+    assert all(d["course_id"] == "CS202" and "snippet" in d for d in docs)
+
+
+def _corpus(n=200, dim=16, seed=7):
+    import random
+
+    rng = random.Random(seed)
+    return [[rng.uniform(-1, 1) for _ in range(dim)] for _ in range(n)]
+
+
+def test_compact_encodings_shrink_storage_and_keep_top_hit():
+    import pytest
+
+    vecs = _corpus()
+    sizes = {}
+    for enc in ("float32", "fp16", "int8"):
+        idx = LocalVectorIndex(dim=16, encoding=enc)
+        for i, v in enumerate(vecs):
+            idx.add(f"d{i}", v, {"course_id": "A"})
+        sizes[enc] = idx.nbytes
+        hits = idx.search(vecs[42], k=3, course_id="A")
+        assert hits[0]["id"] == "d42"
+        assert hits[0]["score"] == pytest.approx(1.0, abs=0.02)
+    assert sizes["float32"] == 200 * 16 * 4
+    assert sizes["fp16"] == sizes["float32"] // 2
+    assert sizes["int8"] < sizes["float32"] // 3
+
+    with pytest.raises(ValueError):
+        LocalVectorIndex(dim=16, encoding="int4")
+
+
+def test_product_quantizer_scan_with_exact_rescoring():
+    from backend.app.vectorstore import ProductQuantizer
+
+    vecs = _corpus()
+    pq = ProductQuantizer.fit(vecs, m=4, ks=16, iters=4)
+    idx = LocalVectorIndex(dim=16, encoding="int8", pq=pq, rescore_factor=5)
+    exact = LocalVectorIndex(dim=16)
+    for i, v in enumerate(vecs):
+        idx.add(f"d{i}", v, {"course_id": "A"})
+        exact.add(f"d{i}", v, {"course_id": "A"})
+    # PQ codes add one byte per sub-vector on top of the int8 column
+    assert idx.nbytes == 200 * (16 + 4) + 200 * 4
+
+    for q in (3, 99, 150):
+        got = [h["id"] for h in idx.search(vecs[q], k=5)]
+        want = [h["id"] for h in exact.search(vecs[q], k=5)]
+        assert got[0] == f"d{q}"
+        assert len(set(got) & set(want)) >= 3
+
+
+def _textbook(sections=20, pages=5, chunks=3, dim=16, seed=11):
+    """Chunks whose vectors cluster around a per-section topic direction."""
+    import random
+
+    rng = random.Random(seed)
+    idx = LocalVectorIndex(dim=dim)
+    vecs = {}
+    page = 0
+    for s in range(sections):
+        topic = [rng.gauss(0, 1) for _ in range(dim)]
+        for _ in range(pages):
+            page += 1
+            for c in range(chunks):
+                v = [t + rng.gauss(0, 0.3) for t in topic]
+                doc_id = f"s{s}-p{page}-c{c}"
+                vecs[doc_id] = v
+                idx.add(doc_id, v, {"course_id": "BOOK", "page": page, "section": f"CHAPTER {s}"})
+    return idx, vecs
+
+
+def test_section_index_two_stage_search_matches_flat_search():
+    from backend.app.vectorstore import SectionIndex
+
+    idx, vecs = _textbook()
+    two_stage = SectionIndex(idx, top_sections=2)
+    for doc_id in ("s0-p1-c0", "s7-p38-c2", "s19-p100-c1"):
+        want = [h["id"] for h in idx.search(vecs[doc_id], k=5, course_id="BOOK")]
+        got = [h["id"] for h in two_stage.search(vecs[doc_id], k=5, course_id="BOOK")]
+        assert got == want
+        # only two of twenty sections were scored
+        assert two_stage.last_candidates == 2 * 5 * 3
+
+    # page summaries cap stage two inside large sections
+    capped = SectionIndex(idx, top_sections=2, max_candidates=6)
+    hits = capped.search(vecs["s7-p38-c2"], k=3, course_id="BOOK")
+    assert hits[0]["id"] == "s7-p38-c2"
+    assert capped.last_candidates == 6
+
+    # filters fall back to the exact scan: a page outside the best sections is still found
+    hits = two_stage.search(vecs["s0-p1-c0"], k=3, pages=(2, 5))
+    assert hits and all(2 <= h["page"] <= 5 for h in hits)
+    hits = two_stage.search(vecs["s0-p1-c0"], k=3, course_id="BOOK", pages=(90, 90))
+    assert [h["page"] for h in hits] == [90, 90, 90]
+    assert two_stage.search(vecs["s0-p1-c0"], k=1, section="CHAPTER 3")[0]["section"] == "CHAPTER 3"
+
+
+def test_section_index_is_rebuilt_explicitly():
+    from backend.app.vectorstore import SectionIndex
+
+    idx = _index()
+    two_stage = SectionIndex(idx, top_sections=1)
+    assert two_stage.search([0.0, 1.0], k=1, course_id="B")[0]["id"] == "b2"
+    idx.add("b3", [-1.0, 0.0], {"course_id": "B", "page": 9, "section": "APPENDIX", "text": "b3"})
+    # searches never rebuild the summaries themselves
+    assert two_stage.search([-1.0, 0.0], k=1, course_id="B")[0]["id"] != "b3"
+    assert two_stage.build().search([-1.0, 0.0], k=1, course_id="B")[0]["id"] == "b3"
+    # usable wherever a LocalVectorIndex is
+    client = LocalSearchClient(two_stage, StubEmbeddings(dims=2))
+    assert client.search("anything", top_k=1, course_id="A")
@@ -0,0 +1,106 @@
+from fastapi.testclient import TestClient
+
+from backend.app.warmup import Warmup
+
+
+def test_warmup_reports_failed_required_check():
+    w = Warmup()
+    calls = []
+    w.add("ok", lambda: calls.append("ok"))
+    w.add("broken", lambda: 1 / 0)
+    w.add("optional", lambda: calls.append("optional"), required=False)
+
+    assert w.status()["status"] == "pending"
+    assert w.run() is False
+    assert calls == ["ok", "optional"]
+    status = w.status()
+    assert status["status"] == "failed"
+    assert status["checks"]["broken"]["ok"] is False
+    assert "ZeroDivisionError" in status["checks"]["broken"]["error"]
+
+
+def test_optional_failure_does_not_block_readiness():
+    w = Warmup()
+    w.add("ok", lambda: None)
+    w.add("queries", lambda: 1 / 0, required=False)
+    w.start().join(timeout=5)
+    assert w.ready
+    assert w.status()["status"] == "ready"
+
+
+def test_failed_required_check_is_retried_until_ready():
+    w = Warmup(initial_backoff=0.01, max_backoff=0.02)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("JWKS endpoint down")
+
+    w.add("auth_jwks", flaky)
+    thread = w.start()
+    assert w.wait(timeout=5)
+    thread.join(timeout=5)
+    assert w.ready and len(attempts) == 3
+    assert w.status()["status"] == "ready"
+
+    stuck = Warmup(initial_backoff=0.01)
+    stuck.add("broken", lambda: 1 / 0)
+    thread = stuck.start()
+    assert stuck.wait(timeout=5) and not stuck.ready
+    stuck.close()
+    thread.join(timeout=5)
+    assert not thread.is_alive() and stuck.status()["status"] == "failed"
+
+
+def test_ready_endpoint_flips_after_startup(monkeypatch):
+    import backend.app.main as main
+    import backend.app.warmup as warmup
+
+    fresh = Warmup()
+    for name, check, required in main._warmup._checks:
+        fresh.add(name, check, required=required)
+    monkeypatch.setattr(warmup, "_warmup", fresh)
+    monkeypatch.setattr(main, "get_warmup", lambda: fresh)
+    monkeypatch.setenv("WARMUP_QUERIES", "What is an algorithm?|Define recursion")
+
+    client = TestClient(main.app)
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+    with TestClient(main.app) as c:
+        assert fresh.wait(timeout=10)
+        r = c.get("/ready")
+        assert r.status_code == 200
+        body = r.json()
+        assert body["status"] == "ready"
+        assert set(body["checks"]) == {"llm", "auth_jwks", "search", "caches", "synthetic_queries"}
+        assert body["checks"]["synthetic_queries"]["ok"] is True
+
+
+def test_shutdown_flushes_background_state_without_creating_singletons(monkeypatch, tmp_path):
+    import backend.app.main as main
+    from backend.app import jobs
+    from backend.app.ingest import StubEmbeddings
+    from backend.app.llm import accounting
+    from backend.app.vectorstore import LocalVectorIndex
+
+    quiet = Warmup()  # no checks: nothing is built during startup
+    monkeypatch.setattr(main, "get_warmup", lambda: quiet)
+    sink = []
+    ledger = accounting.UsageLedger(sink=sink.append, flush_interval=3600)
+    mgr = jobs.JobManager(index=LocalVectorIndex(8), embedder=StubEmbeddings(dims=8), spool_dir=tmp_path / "spool")
+    monkeypatch.setattr(accounting, "_ledger", ledger)
+    monkeypatch.setattr(jobs, "_job_manager", mgr)
+
+    with TestClient(main.app):
+        ledger.record(4, 2)
+    assert [e["total_tokens"] for e in sink] == [6]
+    assert mgr._stopping and jobs._job_manager is None
+    assert accounting._ledger is ledger and ledger._thread is None  # stopped, totals kept
+    assert ledger.totals()["None"]["total_tokens"] == 6
+
+    monkeypatch.setattr(accounting, "_ledger", None)
+    with TestClient(main.app):
+        pass
+    assert accounting._ledger is None and jobs._job_manager is None